@@ -30,6 +30,7 @@ from greedy.model import activation_function as af
 from greedy.model import neuron_dictionary_2d as ndict
 from greedy.lossfunction import fnm_L2fitting_2d as loss
 from greedy.quadrature import gauss_legendre_quadrature as gq
+from greedy.algorithm import orthogonal_greedy as og
 
 # precision settings
 torch.set_printoptions(precision=25)
@@ -45,70 +46,13 @@ print(use_gpu)
 # training framework 
 def orthogonal_greedy(dictionary, energy, snn):
     
-    # iteration settings
-    num_epochs = snn.num_neurons
-    errl2_record = torch.zeros(num_epochs, 1).to(device)
-    
-    # iteration values
-    dim = dictionary.geo_dim
-    num_quadpts = energy.quadpts.shape[0]
-    core_mat = torch.zeros(num_epochs, num_quadpts).to(device)
-    inner_param = torch.zeros(num_epochs, dim+1).to(device) # inner parameters
-    outer_param = torch.zeros(1, num_epochs).to(device)   # outer parameters
-    
-    # iteration
-    for k in range(num_epochs):
-        
-        print("\n")
-        print("-----------------------------")
-        print('----the N = {:.0f}-th neuron----'.format(k+1))
-        print("-----------------------------")
-        
-        # display numerical errors in each step
-        errors = energy.energy_error()
-        errl2 = torch.sqrt(errors)
-        errl2_record[k] = errl2     
-        print("\n Current numerical errors:")
-        print(' L2-error: {:.6e}'.format(errl2.item()))
-        
-        # find the currently best direction to reduce the energy
-        optimal_element = dictionary.find_optimal_element(energy)
-        
-        # update parameter list
-        for d in range(dim+1):
-                inner_param[k][d] = optimal_element[d] 
-        
-        # stiffness matrix and load vector
-        start = time.time()
-        Ak = inner_param[k,:].reshape(1,-1) 
-        ones = torch.ones(num_quadpts,1).to(device)
-        Bk = torch.cat([energy.quadpts, ones], dim=1) 
-        Ck = torch.mm(Ak, Bk.t()) 
-        core_mat[k:k+1, :] = Ck
-        core = core_mat[0:k+1, :]
-        system = energy.get_stiffmat_and_rhs(inner_param[0:k+1,...], core)
-        
-        # Galerkin orthogonal projection
-        Gk, bk = system[0], system[1]
-        coef = torch.linalg.solve(Gk, bk)
-        outer_param[:, 0:k+1] = coef.reshape(1,-1).to(device)
-        
-        # clear 
-        del system, core, ones
-        del Ak, Bk, Ck, Gk, bk
-        
-        # update the shallow network 
-        w1 = inner_param[:,0:dim]
-        b1 = inner_param[:,dim:dim+1].flatten()
-        w2 = outer_param.clone()
-        parameters = (w2, w1, b1)
-        snn.update_neurons(parameters)
-        
-        # update the previous solution
-        energy.update_solution(snn.forward)
+    # the stiffness matrix and its Cholesky factor are cached 
+    # and bordered by the newest neuron in each iteration
+    oga = og.OrthogonalGreedy(dictionary, energy, snn, device)
+    errors, snn = oga.train()
     
     # return numerical results
-    return errl2_record, snn
+    return errors[:,0:1], snn
 
 
 if __name__ == "__main__":
@@ -36,6 +36,7 @@ from greedy.model import activation_function as af
 from greedy.model import neuron_dictionary_1d as ndict
 from greedy.lossfunction import fnm_poisson_1d_dbc as loss
 from greedy.quadrature import gauss_legendre_quadrature as gq
+from greedy.algorithm import orthogonal_greedy as og
 
 # precision settings
 torch.set_printoptions(precision=25)
@@ -51,77 +52,13 @@ print(use_gpu)
 # training framework 
 def orthogonal_greedy(dictionary, energy, snn):
     
-    # iteration settings
-    num_epochs = snn.num_neurons
-    
-    # iteration values
-    dim = dictionary.geo_dim
-    num_quadpts = energy.quadpts.shape[0]
-    num_bdnodes = energy.boundary.shape[0]
-    core_mat_in = torch.zeros(num_epochs, num_quadpts).to(device)
-    core_mat_bd = torch.zeros(num_epochs, num_bdnodes).to(device)
-    inner_param = torch.zeros(num_epochs, dim+1).to(device) # inner parameters
-    outer_param = torch.zeros(1, num_epochs).to(device)   # outer parameters
-    
-    # iteration
-    for k in range(num_epochs):
-        
-        print("\n")
-        print("-----------------------------")
-        print('----the N = {:.0f}-th neuron----'.format(k+1))
-        print("-----------------------------")
-        
-        # display numerical errors in each step
-        errors = energy.energy_error()
-        errl2, erra = torch.sqrt(errors[0]), torch.sqrt(errors[1]) 
-        print("\n Current numerical errors:")
-        print(' L2-error: {:.6e}'.format(errl2.item()))
-        print(' Hm-error: {:.6e}'.format(erra.item()))
-        
-        # find the currently best direction to reduce the energy
-        optimal_element = dictionary.find_optimal_element(energy)
-        
-        # update parameter list
-        for d in range(dim+1):
-            inner_param[k][d] = optimal_element[d]
-
-        # stiffness matrix and load vector
-        start = time.time()
-        Ak = inner_param[k,:].reshape(1,-1) 
-        ones = torch.ones(num_quadpts,1).to(device)
-        Bk_in = torch.cat([energy.quadpts, ones], dim=1) 
-        Ck_in = torch.mm(Ak, Bk_in.t()) 
-        ones = torch.ones(num_bdnodes,1).to(device)
-        Bk_bd = torch.cat([energy.boundary, ones], dim=1) 
-        Ck_bd = torch.mm(Ak, Bk_bd.t()) 
-        core_mat_in[k:k+1, :] = Ck_in
-        core_mat_bd[k:k+1, :] = Ck_bd
-        core_in = core_mat_in[0:k+1, :]
-        core_bd = core_mat_bd[0:k+1, :]
-        system = energy.get_stiffmat_and_rhs(inner_param[0:k+1,...], core_in, core_bd)
-        
-        # Galerkin orthogonal projection
-        Gk, bk = system[0], system[1]
-        coef = torch.linalg.solve(Gk, bk)
-        outer_param[:, 0:k+1] = coef.reshape(1,-1).to(device)
-        
-        # clear 
-        del system, core_in, core_bd, ones
-        del Ak, Bk_in, Bk_bd, Ck_in, Ck_bd, Gk, bk
-        
-        # update the shallow network 
-        w1 = inner_param[:,0:dim]
-        b1 = inner_param[:,dim:dim+1].flatten()
-        w2 = outer_param.clone()
-        parameters = (w2, w1, b1)
-        snn.update_neurons(parameters)
-        
-        # update the previous solution
-        energy.update_solution(snn.forward)
+    # the stiffness matrix and its Cholesky factor are cached 
+    # and bordered by the newest neuron in each iteration
+    oga = og.OrthogonalGreedy(dictionary, energy, snn, device)
+    errors, snn = oga.train()
     
     # return numerical results
-    return errl2, erra, snn
-
+    return errors[-1][0], errors[-1][1], snn
 
 
 if __name__ == "__main__":
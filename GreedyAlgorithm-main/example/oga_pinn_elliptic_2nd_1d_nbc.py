@@ -33,6 +33,7 @@ from greedy.model import neuron_dictionary_1d as ndict
 from greedy.lossfunction import pinn_elliptic_2nd_1d_nbc as loss
 from greedy.quadrature import gauss_legendre_quadrature as gq
 from greedy.quadrature import monte_carlo_quadrature as mc
+from greedy.algorithm import orthogonal_greedy as og
 
 # precision settings
 torch.set_printoptions(precision=25)
@@ -45,87 +46,32 @@ device = torch.device("cuda" if use_gpu else "cpu")
 print(use_gpu)
 
 
-# training framework 
-def orthogonal_greedy(dictionary, energy, snn):
-    
-    # iteration settings
-    num_epochs = snn.num_neurons
-    loss_record = torch.zeros(num_epochs, 1).to(device)
-    errl2_record = torch.zeros(num_epochs, 1).to(device)
-    errh2_record = torch.zeros(num_epochs, 1).to(device)
-    
-    # iteration values
-    dim = dictionary.geo_dim
-    num_quadpts = energy.quadpts.shape[0]
-    num_bdnodes = energy.boundary.shape[0]
-    core_mat_in = torch.zeros(num_epochs, num_quadpts).to(device)
-    core_mat_bd = torch.zeros(num_epochs, num_bdnodes).to(device)
-    inner_param = torch.zeros(num_epochs, dim+1).to(device) 
-    outer_param = torch.zeros(1, num_epochs).to(device)   
-    
-    # iteration
-    for k in range(num_epochs):
-        
-        print("\n")
-        print("-----------------------------")
-        print('----the N = {:.0f}-th neuron----'.format(k+1))
-        print("-----------------------------")
+class PINNOrthogonalGreedy(og.OrthogonalGreedy):
+    """
+        OGA which records the loss function before adding each neuron.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loss_record = torch.zeros(self.num_epochs, 1).to(self.device)
         
-        # display numerical errors in each step
-        loss = energy.loss()
-        errors = energy.energy_error()
-        errl2, errh2 = torch.sqrt(errors[0]), torch.sqrt(errors[1])
-        loss_record[k] = loss
-        errl2_record[k] = errl2
-        errh2_record[k] = errh2        
-        print("\n Current loss function and numerical errors:")
+    def update(self, k, optimal_element):
+        loss = self.energy.loss().detach()
+        self.loss_record[k] = loss
         print(' Loss: {:.6e}'.format(loss.item()))
-        print(' L2-error: {:.6e}'.format(errl2.item()))
-        print(' H2-error: {:.6e}'.format(errh2.item()))
-        
-        # find the currently best direction to reduce the energy
-        optimal_element = dictionary.find_optimal_element(energy)
+        super().update(k, optimal_element)
         
-        # update parameter list
-        for d in range(dim+1):
-            inner_param[k][d] = optimal_element[d] 
 
-        # stiffness matrix and load vector
-        start = time.time()
-        Ak = inner_param[k,:].reshape(1,-1) 
-        ones = torch.ones(num_quadpts,1).to(device)
-        Bk_in = torch.cat([energy.quadpts, ones], dim=1) 
-        Ck_in = torch.mm(Ak, Bk_in.t()) 
-        ones = torch.ones(num_bdnodes,1).to(device)
-        Bk_bd = torch.cat([energy.boundary, ones], dim=1) 
-        Ck_bd = torch.mm(Ak, Bk_bd.t()) 
-        core_mat_in[k:k+1, :] = Ck_in
-        core_mat_bd[k:k+1, :] = Ck_bd
-        core_in = core_mat_in[0:k+1, :]
-        core_bd = core_mat_bd[0:k+1, :]
-        system = energy.get_stiffmat_and_rhs(inner_param[0:k+1,...], core_in, core_bd)
-        
-        # Galerkin orthogonal projection
-        Gk, bk = system[0], system[1]
-        coef = torch.linalg.solve(Gk, bk)
-        outer_param[:, 0:k+1] = coef.reshape(1,-1).to(device)
-        
-        # clear 
-        del system, core_in, core_bd, ones
-        del Ak, Bk_in, Bk_bd, Ck_in, Ck_bd, Gk, bk
-        
-        # update the shallow network 
-        w1 = inner_param[:,0:dim]
-        b1 = inner_param[:,dim:dim+1].flatten()
-        w2 = outer_param.clone()
-        parameters = (w2, w1, b1)
-        snn.update_neurons(parameters)
-        
-        # update the previous solution
-        energy.update_solution(snn.forward)
+# training framework 
+def orthogonal_greedy(dictionary, energy, snn):
+    
+    # the stiffness matrix and its Cholesky factor are cached 
+    # and bordered by the newest neuron in each iteration
+    oga = PINNOrthogonalGreedy(dictionary, energy, snn, device)
+    errors, snn = oga.train()
     
     # return numerical results
-    return loss_record, errl2_record, errh2_record, snn
+    return oga.loss_record, errors[:,0:1], errors[:,1:2], snn
 
 
 if __name__ == "__main__":
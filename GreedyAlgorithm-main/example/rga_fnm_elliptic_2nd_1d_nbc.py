@@ -0,0 +1,133 @@
+"""
+Created on Sat Oct 17 22:40 2026
+
+@author: Jinpp (xianlincn@pku.edu.cn)
+@version: 1.0
+@brief: Training shallow neural network using the variational
+        loss (i.e., finite neuron method) and the relaxed 
+        greedy algorithm, to solve the following second-order 
+        elliptic equation in 1D:
+                    - u_xx + u = f, in Omega of R
+                    du/dx = g, on boundary of Omega
+        with g=0 as the homogeneous Neumann's boundary condition.
+        The training data and the testing data are produced by
+        piecewise Gauss-Legendre quadrature rule. For dictionary
+        settings:
+        (1) activation available for relu, bspline and sigmoid,
+        (2) optimizer available for pgd, fista and False.
+        Each step relaxes u_k = (1-alpha_k)*u_{k-1} + c_k*g_k with
+        c_k by the line search, without the Galerkin system, so the
+        convergence rate is O(n^-1/2) in the energy norm at most.
+@modifications: to be added
+"""
+
+import sys
+sys.path.append('../')
+
+import time
+import torch
+import numpy as np
+
+from greedy.pde import cos1d
+from greedy.tools import show_rate
+from greedy.model import shallownet
+from greedy.model import activation_function as af 
+from greedy.model import neuron_dictionary_1d as ndict
+from greedy.lossfunction import fnm_elliptic_2nd_1d_nbc as loss
+from greedy.quadrature import gauss_legendre_quadrature as gq
+from greedy.algorithm import relaxed_greedy as rg
+
+# precision settings
+torch.set_printoptions(precision=25)
+data_type = torch.float64
+torch.set_default_dtype(data_type)
+
+# device settings
+use_gpu = torch.cuda.is_available()
+device = torch.device("cuda" if use_gpu else "cpu")
+print(use_gpu)
+
+
+# training framework 
+def relaxed_greedy(dictionary, energy, snn):
+    
+    # the items of the solution on the quadrature points are
+    # relaxed in place, and the coefficient is line searched
+    rga = rg.RelaxedGreedy(dictionary, energy, snn, device, line_search=True)
+    errors, snn = rga.train()
+    
+    # return numerical results
+    return errors[:,0:1], errors[:,1:2], snn
+
+
+if __name__ == "__main__":
+    
+    # pde's exact solution
+    pde = cos1d.DataCos_2nd_1d_NBC()
+    
+    # neuron dictionary settings
+    ftype = "relu" 
+    degree = 3
+    activation = af.ActivationFunction(ftype, degree)
+    optimizer = False 
+    param_b_domain = torch.tensor([[-2., 2.]])
+    param_mesh_size = 1/200
+    dictionary = ndict.NeuronDictionary1D(activation,
+                                        optimizer,
+                                        param_b_domain,
+                                        param_mesh_size,
+                                        device)
+    
+    # training data settings
+    nquadpts = 2
+    index = nquadpts - 1
+    h = np.array([1/200])
+    interval = np.array([[-1.,1.]])
+    gl_quad = gq.GaussLegendreDomain(index, device)
+    quadrature = gl_quad.interval_quadpts(interval, h)
+    
+    # enery loss function settings
+    energy = loss.FNM_Elliptic_2nd_1d_NBC(dictionary.activation,
+                                    quadrature,
+                                    pde,
+                                    device)
+   
+    # rga training process
+    num_neurons = 2048
+    snn = shallownet.ShallowNN(sigma=activation.activate,
+                               in_dim=1,
+                               width=num_neurons
+                               )
+    start = time.time()
+    l2_err, a_err, snn = relaxed_greedy(dictionary, energy, snn)
+    end = time.time()
+    
+    # show error
+    atype = 'RGA'
+    total_time = end - start
+    show_rate.finite_neuron_method(num_neurons, l2_err, a_err, atype, ftype, degree, total_time)
+    
+    # example settings:
+    # h = np.array([1/200])     
+    # param_mesh_size = 1/200
+    # 
+    # theoretical convergence rates:
+    # O(n^-1/2) in H1, the relaxed steps do not reach the rates of OGA
+    # final results:
+    # +-------------------------------------------------------+
+    # |    RGA-FNM, relu_power = 3, total time = 119.3227s    |
+    # +------+-----------+---------+------------+-------------+
+    # |    N |   l2_err  | l2_rate | energy_err | energy_rate |
+    # +------+-----------+---------+------------+-------------+
+    # |    2 | 1.104e+00 |    -    | 3.152e+00  |      -      |
+    # |    4 | 1.155e+00 |  -0.07  | 3.049e+00  |     0.05    |
+    # |    8 | 1.309e+00 |  -0.18  | 2.936e+00  |     0.05    |
+    # |   16 | 1.254e+00 |   0.06  | 2.760e+00  |     0.09    |
+    # |   32 | 1.127e+00 |   0.15  | 2.628e+00  |     0.07    |
+    # |   64 | 9.897e-01 |   0.19  | 2.438e+00  |     0.11    |
+    # |  128 | 7.634e-01 |   0.37  | 2.213e+00  |     0.14    |
+    # |  256 | 5.839e-01 |   0.39  | 2.082e+00  |     0.09    |
+    # |  512 | 4.868e-01 |   0.26  | 2.032e+00  |     0.04    |
+    # | 1024 | 4.448e-01 |   0.13  | 2.017e+00  |     0.01    |
+    # | 2048 | 3.132e-01 |   0.51  | 1.426e+00  |     0.50    |
+    # +------+-----------+---------+------------+-------------+
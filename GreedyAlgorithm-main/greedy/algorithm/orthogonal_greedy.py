@@ -0,0 +1,316 @@
+"""
+Created on Sat Oct 17 10:26 2026
+
+@author: Jinpp (xianlincn@pku.edu.cn)
+@version: 1.0
+@brief: The orthogonal greedy algorithm (OGA) for training shallow
+        neural networks with a linear energy. The stiffness matrix
+        and its Cholesky factor are cached through the iterations,
+        each step only borders them with the newest element:
+                    G_k = [G_{k-1}, g  ],   L_k = [L_{k-1}, 0],
+                          [g^T,     g_kk]         [l^T,     d]
+        where L_{k-1}*l = g and d = sqrt(g_kk - l^T*l). So a step
+        costs O(k*Nq + k^2) instead of O(k^2*Nq + k^3). The phases
+        of each step are recorded by an active tools.profiler.GreedyProfiler.
+        The greedy state can be checkpointed periodically, and a run
+        resumes from its checkpoint, e.g., after a crash or with more
+        neurons.
+@modifications: to be added
+"""
+
+import os
+import random
+import torch
+import numpy as np
+
+from ..tools import profiler
+
+
+class OrthogonalGreedy():
+
+    def __init__(self,
+                dictionary,
+                energy,
+                snn,
+                device,
+                checkpoint=None,
+                checkpoint_interval=1):
+        """
+        INPUT:
+            dictionary: a neuron dictionary, which finds the optimal element.
+            energy: a linear energy, which assembles the Galerkin system.
+            snn: the shallow neural network to be trained, the number of
+                 its neurons is the number of greedy iterations.
+            device: cpu or cuda.
+            checkpoint: the file of checkpoints, or None. If it exists, 
+                        train() resumes from it, the network may have more 
+                        neurons than the checkpoint.
+            checkpoint_interval: the number of neurons between checkpoints,
+                                 the last neuron is always checkpointed.
+        """
+
+        self.dictionary = dictionary
+        self.energy = energy
+        self.snn = snn
+        self.device = device
+        self.checkpoint = checkpoint
+        self.checkpoint_interval = checkpoint_interval
+
+        # iteration settings
+        self.num_epochs = snn.num_neurons
+        self.dim = dictionary.geo_dim
+
+        # iteration values, the core matrices of all point sets
+        num_epochs = self.num_epochs
+        self.core_points = energy.get_core_points()
+        self.core_mat = [torch.zeros(num_epochs, p.shape[0]).to(device) for p in self.core_points]
+        self.inner_param = torch.zeros(num_epochs, self.dim+1).to(device) # inner parameters
+        self.outer_param = torch.zeros(1, num_epochs).to(device)   # outer parameters
+
+        # cached Galerkin system: stiffness matrix, load vector, the
+        # Cholesky factor and the forward substitution of load vector
+        self.stiffmat = torch.zeros(num_epochs, num_epochs).to(device)
+        self.rhs = torch.zeros(num_epochs, 1).to(device)
+        self.cholesky = torch.zeros(num_epochs, num_epochs).to(device)
+        self.forward_rhs = torch.zeros(num_epochs, 1).to(device)
+
+        # the Cholesky factor breaks down once G_k is numerically singular,
+        # e.g., an element is selected twice, then fall back to full solves
+        self.breakdown = False
+
+
+    def _get_core(self, param):
+
+        # core vectors (w, b)^T * (x, 1)^T on all point sets
+        core = []
+        for points in self.core_points:
+            ones = torch.ones(points.shape[0],1).to(self.device)
+            B = torch.cat([points, ones], dim=1)
+            core.append(torch.mm(param, B.t()))
+        return core
+
+
+    def _update_system(self, k):
+
+        # only the border between the newest element and all elements
+        core = [core_mat[0:k+1, :] for core_mat in self.core_mat]
+        Gk, bk = self.energy.get_stiffmat_border(self.inner_param[0:k+1,...], *core)
+        Gk = Gk.detach().reshape(-1,1)
+
+        # border the stiffness matrix and the load vector
+        self.stiffmat[0:k+1, k:k+1] = Gk
+        self.stiffmat[k:k+1, 0:k+1] = Gk.t()
+        self.rhs[k] = bk.detach().reshape(-1)
+
+
+    def _update_cholesky(self, k):
+
+        if self.breakdown:
+            return
+
+        # solve L_{k-1}*l = g, then d^2 = g_kk - l^T*l
+        L = self.cholesky[0:k, 0:k]
+        g = self.stiffmat[0:k, k:k+1]
+        l = torch.linalg.solve_triangular(L, g, upper=False)
+        d2 = self.stiffmat[k, k] - l.pow(2).sum()
+        if not d2 > 0:
+            self.breakdown = True
+            print(' Cholesky breakdown at N = {:.0f}, use full solves.'.format(k+1))
+            return
+
+        # border the Cholesky factor and the forward substitution
+        d = torch.sqrt(d2)
+        self.cholesky[k:k+1, 0:k] = l.t()
+        self.cholesky[k, k] = d
+        y = self.forward_rhs[0:k, :]
+        self.forward_rhs[k] = (self.rhs[k] - torch.mm(l.t(), y).reshape(-1)) / d
+
+
+    def _solve(self, k):
+
+        # Galerkin orthogonal projection
+        if not self.breakdown:
+            L = self.cholesky[0:k+1, 0:k+1]
+            y = self.forward_rhs[0:k+1, :]
+            coef = torch.linalg.solve_triangular(L.t(), y, upper=True)
+        else:
+            Gk = self.stiffmat[0:k+1, 0:k+1]
+            bk = self.rhs[0:k+1, :]
+            coef = torch.linalg.solve(Gk, bk)
+        return coef
+
+
+    def _update_network(self):
+
+        # update the shallow network
+        dim = self.dim
+        w1 = self.inner_param[:,0:dim]
+        b1 = self.inner_param[:,dim:dim+1].flatten()
+        w2 = self.outer_param.clone()
+        parameters = (w2, w1, b1)
+        self.snn.update_neurons(parameters)
+
+        # update the previous solution
+        self.energy.update_solution(self.snn.forward)
+
+
+    def save_checkpoint(self, path, num_neurons, errors_record):
+        """
+        Save the greedy state of the first num_neurons neurons, i.e., the
+        parameters, the cached Galerkin system and Cholesky factor, the
+        errors, the scan state of the dictionary, e.g., the last full scan of
+        the incremental scan, and the states of random generators. The core 
+        matrices are not saved, they are recomputed from the parameters. The file is 
+        written to a temporary file first, then renamed, so a crash never 
+        leaves a partial checkpoint.
+        """
+        n = num_neurons
+        state = {
+            'num_neurons': n,
+            'dim': self.dim,
+            'num_points': [p.shape[0] for p in self.core_points],
+            'inner_param': self.inner_param[0:n].cpu(),
+            'outer_param': self.outer_param[:,0:n].cpu(),
+            'stiffmat': self.stiffmat[0:n,0:n].cpu(),
+            'rhs': self.rhs[0:n].cpu(),
+            'cholesky': self.cholesky[0:n,0:n].cpu(),
+            'forward_rhs': self.forward_rhs[0:n].cpu(),
+            'breakdown': self.breakdown,
+            'errors': errors_record[0:n].cpu(),
+            'dictionary': self.dictionary.state_dict(),
+            'rng': {'torch': torch.get_rng_state(),
+                    'cuda': torch.cuda.get_rng_state_all() if torch.cuda.is_available() else None,
+                    'numpy': np.random.get_state(),
+                    'python': random.getstate()}
+        }
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        torch.save(state, temp)
+        os.replace(temp, path)
+
+
+    def load_checkpoint(self, path):
+        """
+        Restore the greedy state from a checkpoint.
+        OUTPUT:
+            num_neurons: the number of neurons in the checkpoint.
+            errors_record: the errors of these neurons, in the rows of a
+                           num_epochs-by-m tensor.
+        """
+        state = torch.load(path, weights_only=False)
+        n = state['num_neurons']
+        if state['dim'] != self.dim or state['num_points'] != [p.shape[0] for p in self.core_points]:
+            raise RuntimeError("The checkpoint does not match the dictionary or the energy.")
+        if n > self.num_epochs:
+            raise RuntimeError("The checkpoint has more neurons than the network.")
+
+        # the parameters, Galerkin system and Cholesky factor
+        device = self.device
+        self.inner_param[0:n] = state['inner_param'].to(device)
+        self.outer_param[:,0:n] = state['outer_param'].to(device)
+        self.stiffmat[0:n,0:n] = state['stiffmat'].to(device)
+        self.rhs[0:n] = state['rhs'].to(device)
+        self.cholesky[0:n,0:n] = state['cholesky'].to(device)
+        self.forward_rhs[0:n] = state['forward_rhs'].to(device)
+        self.breakdown = state['breakdown']
+        errors_record = torch.zeros(self.num_epochs, state['errors'].shape[1]).to(device)
+        errors_record[0:n] = state['errors'].to(device)
+        self.dictionary.load_state_dict(state['dictionary'])
+
+        # the core matrices, the network and the previous solution
+        for core_mat, Ck in zip(self.core_mat, self._get_core(self.inner_param[0:n])):
+            core_mat[0:n, :] = Ck
+        self._update_network()
+
+        # states of random generators
+        rng = state['rng']
+        torch.set_rng_state(rng['torch'])
+        if rng['cuda'] is not None and torch.cuda.is_available():
+            torch.cuda.set_rng_state_all(rng['cuda'])
+        np.random.set_state(rng['numpy'])
+        random.setstate(rng['python'])
+
+        return n, errors_record
+
+
+    def update(self, k, optimal_element):
+        """
+        Add the k-th element to the network, and project the target
+        onto the span of the first (k+1) elements.
+        """
+
+        # update parameter list
+        for d in range(self.dim+1):
+            self.inner_param[k][d] = optimal_element[d]
+
+        # append the core vectors of the newest element
+        with profiler.phase('assembly'):
+            Ak = self.inner_param[k,:].reshape(1,-1)
+            for core_mat, Ck in zip(self.core_mat, self._get_core(Ak)):
+                core_mat[k:k+1, :] = Ck
+
+            # bordered stiffness matrix
+            self._update_system(k)
+
+        # bordered Cholesky factor, and the Galerkin orthogonal projection
+        with profiler.phase('solve'):
+            self._update_cholesky(k)
+            coef = self._solve(k)
+            self.outer_param[:, 0:k+1] = coef.reshape(1,-1).to(self.device)
+
+        with profiler.phase('update'):
+            self._update_network()
+
+
+    def train(self):
+        """
+        OUTPUT:
+            errors: num_epochs-by-m, the numerical errors before adding
+                    each neuron, in square root of energy.energy_error().
+            snn: the trained shallow neural network.
+        """
+
+        # resume from the checkpoint, if any
+        start, errors_record = 0, None
+        if self.checkpoint is not None and os.path.exists(self.checkpoint):
+            start, errors_record = self.load_checkpoint(self.checkpoint)
+            print(' Resume from the checkpoint with {:.0f} neurons.'.format(start))
+        else:
+            self.dictionary.load_state_dict({})
+
+        for k in range(start, self.num_epochs):
+
+            print("\n")
+            print("-----------------------------")
+            print('----the N = {:.0f}-th neuron----'.format(k+1))
+            print("-----------------------------")
+
+            profiler.begin_step(k)
+
+            # display numerical errors in each step
+            with profiler.phase('error'):
+                errors = self.energy.energy_error()
+            if not isinstance(errors, (tuple, list)):
+                errors = (errors,)
+            if errors_record is None:
+                errors_record = torch.zeros(self.num_epochs, len(errors)).to(self.device)
+            for i, error in enumerate(errors):
+                errors_record[k][i] = torch.sqrt(error).detach()
+            print("\n Current numerical errors:")
+            print(' L2-error: {:.6e}'.format(errors_record[k][0].item()))
+            if len(errors) > 1:
+                print(' Energy-error: {:.6e}'.format(errors_record[k][1].item()))
+
+            # find the currently best direction to reduce the energy, the
+            # dictionary may bound the change of the scores by the solution
+            self.dictionary.set_galerkin_state(self.outer_param[:,0:k], self.stiffmat[0:k,0:k])
+            optimal_element = self.dictionary.find_optimal_element(self.energy)
+            self.update(k, optimal_element)
+            profiler.end_step(errors=errors_record[k].tolist())
+
+            # checkpoint the first (k+1) neurons
+            if self.checkpoint is not None and \
+                    ((k+1) % self.checkpoint_interval == 0 or k+1 == self.num_epochs):
+                self.save_checkpoint(self.checkpoint, k+1, errors_record)
+
+        # return numerical results
+        return errors_record, self.snn
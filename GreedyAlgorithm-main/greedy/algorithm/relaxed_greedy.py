@@ -0,0 +1,206 @@
+"""
+Created on Sat Oct 17 15:02 2026
+
+@author: Jinpp (xianlincn@pku.edu.cn)
+@version: 1.0
+@brief: The relaxed greedy algorithm (RGA) for training shallow neural
+        networks with a linear energy J(u) = (1/2)*a(u,u) - f(u). Each
+        step selects g_k by the dictionary scan, then relaxes
+                    u_k = (1-alpha_k)*u_{k-1} + c_k*g_k,
+        with alpha_k = min(1, 2/k) and c_k = -alpha_k*M*sign(<J'(u_{k-1}),g_k>),
+        M being the bound of the variation norm, or c_k minimizing
+        J(u_k) by a line search. The k-by-k Galerkin system is never
+        solved, and the items of u_k on the quadrature points, which the
+        scan evaluates, are updated in place. So a step costs one scan
+        plus O(Nq), whatever k is.
+@modifications: to be added
+"""
+
+import math
+import torch
+
+from ..tools import profiler
+
+
+class RelaxedGreedy():
+
+    def __init__(self,
+                dictionary,
+                energy,
+                snn,
+                device,
+                bound=None,
+                line_search=False,
+                step_size=None,
+                error_interval=1):
+        """
+        INPUT:
+            dictionary: a neuron dictionary, which finds the optimal element.
+            energy: a linear energy, whose pre_items are the items of the
+                    previous solution on the quadrature points.
+            snn: the shallow neural network to be trained, the number of
+                 its neurons is the number of greedy iterations.
+            device: cpu or cuda.
+            bound: the bound M of the variation norm of the solution, which
+                   scales the relaxed steps without line search.
+            line_search: option for the coefficients c_k minimizing J(u_k).
+            step_size: the relaxation alpha_k of the k-th step (from 1),
+                       min(1, 2/k) by default.
+            error_interval: the number of steps between error evaluations,
+                            which costs O(k*Nq), the others are nan.
+        """
+
+        if (not line_search) and (bound is None):
+            raise RuntimeError("The relaxed greedy algorithm needs the bound M of variation norm, "
+                               "or line_search=True.")
+        if getattr(energy, 'interval', None) is not None:
+            raise RuntimeError("The relaxed greedy algorithm updates the items on the quadrature points "
+                               "in place, which the closed-form integration (interval) does not use.")
+
+        self.dictionary = dictionary
+        self.energy = energy
+        self.snn = snn
+        self.device = device
+        self.bound = bound
+        self.line_search = line_search
+        self.step_size = step_size if step_size is not None else (lambda k: min(1., 2./k))
+        self.error_interval = error_interval
+
+        # iteration settings
+        self.num_epochs = snn.num_neurons
+        self.dim = dictionary.geo_dim
+
+        # iteration values
+        num_epochs = self.num_epochs
+        self.inner_param = torch.zeros(num_epochs, self.dim+1).to(device) # inner parameters
+        self.outer_param = torch.zeros(1, num_epochs).to(device)   # outer parameters
+
+
+    def _get_core(self, param):
+
+        # core vectors (w, b)^T * (x, 1)^T on all point sets
+        core = []
+        for points in self.energy.get_core_points():
+            ones = torch.ones(points.shape[0],1).to(self.device)
+            B = torch.cat([points, ones], dim=1)
+            core.append(torch.mm(param, B.t()))
+        return core
+
+
+    def _get_element_items(self, param):
+
+        # the items of the element g = sigma(w*x+b) on the quadrature points
+        w = param[0:self.dim].reshape(-1,1)
+        b = param[self.dim]
+        element = lambda p: self.energy.sigma(torch.mm(p, w) + b)
+        return self.energy._get_energy_items(element)
+
+
+    def _get_residual(self, param, items, element_items, a_gg):
+        """
+        <J'(v), g> = a(v,g) - f(g) of the element g, where items are the
+        items of v. The energy evaluates -(1/2)*<J'(v),g>^2, whose sign is
+        recovered by the polarization
+                    <J'(v+t*g),g> = <J'(v),g> + t*a(g,g),
+        with t*a(g,g) = |<J'(v),g>|, i.e., <J'(v+t*g),g> is 2*<J'(v),g> or 0.
+        """
+        element = torch.split(param.reshape(1,-1), 1, dim=1)
+        self.energy.pre_items = items
+        residual = math.sqrt(max(-2 * self.energy.evaluate(element).item(), 0.))
+        if residual == 0.:
+            return 0.
+        t = residual / a_gg
+        self.energy.pre_items = tuple(v + t*g for v, g in zip(items, element_items))
+        shifted = -2 * self.energy.evaluate(element).item()
+        return residual if shifted > 2 * residual**2 else -residual
+
+
+    def _update_network(self):
+
+        # update the shallow network, and the previous solution without
+        # recomputing its items on the quadrature points
+        dim = self.dim
+        w1 = self.inner_param[:,0:dim]
+        b1 = self.inner_param[:,dim:dim+1].flatten()
+        w2 = self.outer_param.clone()
+        parameters = (w2, w1, b1)
+        self.snn.update_neurons(parameters)
+        self.energy.pre_solution = self.snn.forward
+
+
+    def update(self, k, optimal_element):
+        """
+        Relax the network of k elements with the k-th element, i.e.,
+        u_{k+1} = (1-alpha)*u_k + c*g, in O(Nq) operations.
+        """
+
+        param = torch.cat([torch.as_tensor(p).reshape(-1) for p in optimal_element]).detach().to(self.device)
+        items = tuple(self.energy.pre_items)
+        alpha = self.step_size(k+1)
+
+        # items of the newest element, and a(g,g) of it alone
+        with profiler.phase('assembly'):
+            element_items = self._get_element_items(param)
+            Gk, _ = self.energy.get_stiffmat_border(param.reshape(1,-1), *self._get_core(param.reshape(1,-1)))
+            a_gg = Gk.reshape(-1)[-1].item()
+
+        # the coefficient of the relaxed step, where the residual of
+        # (1-alpha)*u_k is -c*a(g,g) with c minimizing J((1-alpha)*u_k + c*g)
+        with profiler.phase('solve'):
+            if self.line_search:
+                relaxed = tuple((1-alpha) * v for v in items)
+                c = -self._get_residual(param, relaxed, element_items, a_gg) / a_gg
+            else:
+                residual = self._get_residual(param, items, element_items, a_gg)
+                c = -alpha * self.bound * math.copysign(1., residual) if residual != 0. else 0.
+
+        # relax the coefficients and the items of the solution
+        with profiler.phase('update'):
+            self.inner_param[k] = param
+            self.outer_param[:, 0:k] *= (1-alpha)
+            self.outer_param[0, k] = c
+            self.energy.pre_items = tuple((1-alpha) * v + c * g for v, g in zip(items, element_items))
+            self._update_network()
+
+
+    def train(self):
+        """
+        OUTPUT:
+            errors: num_epochs-by-m, the numerical errors before adding
+                    each neuron, in square root of energy.energy_error(),
+                    nan if not evaluated.
+            snn: the trained shallow neural network.
+        """
+
+        errors_record = None
+        for k in range(self.num_epochs):
+
+            print("\n")
+            print("-----------------------------")
+            print('----the N = {:.0f}-th neuron----'.format(k+1))
+            print("-----------------------------")
+
+            profiler.begin_step(k)
+
+            # display numerical errors every error_interval steps
+            if k % self.error_interval == 0 or k == self.num_epochs-1:
+                with profiler.phase('error'):
+                    errors = self.energy.energy_error()
+                if not isinstance(errors, (tuple, list)):
+                    errors = (errors,)
+                if errors_record is None:
+                    errors_record = torch.full((self.num_epochs, len(errors)), float('nan')).to(self.device)
+                for i, error in enumerate(errors):
+                    errors_record[k][i] = torch.sqrt(error).detach()
+                print("\n Current numerical errors:")
+                print(' L2-error: {:.6e}'.format(errors_record[k][0].item()))
+                if len(errors) > 1:
+                    print(' Energy-error: {:.6e}'.format(errors_record[k][1].item()))
+
+            # find the currently best direction to reduce the energy
+            optimal_element = self.dictionary.find_optimal_element(self.energy)
+            self.update(k, optimal_element)
+            profiler.end_step(errors=errors_record[k].tolist())
+
+        # return numerical results
+        return errors_record, self.snn
@@ -10,8 +10,659 @@ Created on Mon May 15 17:34 2023
 @modifications: to be added
 """
 
+import os
+import math
+import torch
+import numpy as np
 from abc import ABC, abstractmethod
 
+
+def get_derivatives(obj_func, points, order):
+    """
+    The value, gradient (N-by-d) and Hessian (N-by-d-by-d) of obj_func on
+    points, up to the given order. If obj_func is a ShallowNN (or its 
+    forward), they are formed in closed form by evaluate_derivatives. 
+    Otherwise, e.g., the error function, autograd is used.
+    """
+    model = getattr(obj_func, '__self__', obj_func)
+    if hasattr(model, 'evaluate_derivatives') and (model.dF is not None):
+        return model.evaluate_derivatives(points, order)
+    
+    # value and gradient evaluated on all points
+    points = points.detach().requires_grad_()
+    obj_val = obj_func(points)
+    items = [obj_val.detach()]
+    if order >= 1:
+        f = obj_val.sum()
+        gradient = torch.autograd.grad(outputs=f, inputs=points, create_graph=(order>=2))
+        items.append(gradient[0].detach())
+    
+    # get second-order derivatives row by row
+    if order >= 2:
+        dim = points.shape[1]
+        hessian = []
+        for i in range(dim):
+            df = gradient[0][:,i].sum()
+            hessian_i = torch.autograd.grad(outputs=df, inputs=points, retain_graph=(i<dim-1))
+            hessian.append(hessian_i[0].detach())
+        items.append(torch.stack(hessian, dim=1))
+    
+    return items
+
+
+def activated_products(sigma, dsigma, A, points, items, sparse=False, bank=None, fft=None, dtype=None):
+    """
+    The products sigma^(m)(core) @ V for each (m, V) in items, where
+    core = A * [points, 1]^T, i.e., the rows of A are (w, b). If sparse,
+    the products are formed by _support_products when possible, which
+    never forms the dense core matrix. It is not differentiable, so the 
+    dense products are used when A requires grad, e.g., in the training.
+    If an ActivationBank is given, the activated core matrices stored in
+    it are reused. If fft is the dict of options of _fft_products, e.g.,
+    {'oversample': 8} of a dictionary scan, the products are formed by 
+    the FFT, which are approximate and only rank the candidates. If dtype
+    is given, e.g., torch.float32 of a dictionary scan, A, points and the
+    items are cast to it for the products, which are returned in the dtype
+    of A, so neither the energy nor the default dtype is changed.
+    """
+    if (dtype is not None) and (dtype != A.dtype) and (not A.requires_grad):
+        products = activated_products(sigma, dsigma, A.to(dtype), points.to(dtype), 
+                                      [(m, V.to(dtype)) for m, V in items], sparse, None, fft)
+        return [product.to(A.dtype) for product in products]
+    if (bank is not None) and (not A.requires_grad):
+        products = bank.products(sigma, dsigma, A, points, items)
+        if products is not None:
+            return products
+    if (fft is not None) and (not A.requires_grad):
+        return _fft_products(sigma, dsigma, A, points, items, **fft)
+    
+    activation = getattr(sigma, '__self__', None)
+    if sparse and (not A.requires_grad) and hasattr(activation, 'piecewise_polynomial') \
+            and (activation.piecewise_polynomial(0) is not None):
+        return _support_products(activation, A, points, items)
+
+    # dense core matrix
+    ones = torch.ones(points.shape[0],1).to(points)
+    B = torch.cat([points, ones], dim=1).t()
+    core = torch.mm(A, B)
+    return [torch.mm(sigma(core) if m == 0 else dsigma(core, m), V) for m, V in items]
+
+
+def _fft_products(sigma, dsigma, A, points, items, oversample=8, min_biases=16, max_numel=2**23):
+    """
+    FFT products of the neurons sharing a direction w, whose biases are
+    on a uniform grid b_k = b_0 + k*db, e.g., the param-mesh of a scan.
+    With s = w*x, the products of all the biases of w,
+                sum_i sigma^(m)(s_i + b_k) * V_i,
+    are a correlation of V binned on the line s and sigma^(m) sampled
+    on it, i.e., a Radon-type projection of V in 2D and 3D. V is binned
+    linearly on a grid of spacing db/oversample, so the products have 
+    an O((db/oversample)^2) error, and a direction costs O(Nq + Nb*log(Nb))
+    instead of O(Nq*Nb). The neurons of the other directions, e.g., with 
+    fewer than min_biases biases at the end of a chunk, are activated as 
+    in activated_products.
+    """
+    dim = points.shape[1]
+    weight, bias = A[:,0:dim], A[:,dim]
+    directions, inverse = torch.unique(weight, dim=0, return_inverse=True)
+    num_dirs = directions.shape[0]
+    values = torch.cat([V for _, V in items], dim=1)
+    results = values.new_zeros(A.shape[0], values.shape[1])
+
+    # the bias grid of each direction, sorted by direction then bias
+    _, order = torch.sort(bias, stable=True)
+    order = order[torch.sort(inverse[order], stable=True)[1]]
+    counts = torch.bincount(inverse, minlength=num_dirs)
+    first = torch.cumsum(counts, dim=0) - counts
+    b0 = bias[order[first]]
+    db = (bias[order[first+counts-1]] - b0) / (counts - 1).clamp(min=1)
+    
+    # only the uniform grids of enough biases use the FFT
+    gaps = torch.diff(bias[order])
+    group = inverse[order[1:]]
+    same = inverse[order[:-1]] == group
+    deviation = torch.zeros(num_dirs).to(bias).scatter_reduce(
+                    0, group[same], (gaps[same] - db[group[same]]).abs(), 'amax')
+    uniform = (counts >= min_biases) & (db > 0) & (deviation <= 1e-6 * db)
+    
+    # the others are activated densely
+    dense = (~uniform[inverse]).nonzero().flatten()
+    if len(dense) > 0:
+        ones = torch.ones(points.shape[0],1).to(points)
+        core = torch.mm(A[dense], torch.cat([points, ones], dim=1).t())
+        results[dense] = torch.cat([torch.mm(sigma(core) if m == 0 else dsigma(core, m), V) 
+                                        for m, V in items], dim=1)
+        del core
+    
+    # the directions in batches of at most max_numel binned values
+    fft_dirs = uniform.nonzero().flatten()
+    if len(fft_dirs) == 0:
+        return list(torch.split(results, [V.shape[1] for _, V in items], dim=1))
+    span = 2 * points.abs().sum(dim=1).max() * directions[fft_dirs].abs().sum(dim=1).max()
+    num_bins = int(span / (db[fft_dirs].min() / oversample)) + 2
+    length = num_bins + int(counts[fft_dirs].max()) * oversample
+    batch = max(1, max_numel // (values.shape[1] * max(points.shape[0], length)))
+    for start in range(0, len(fft_dirs), batch):
+        dirs = fft_dirs[start:start+batch]
+        
+        # the projections s = w*x, binned linearly on the grid s0 + j*delta
+        delta = (db[dirs] / oversample).reshape(-1,1)
+        s = torch.mm(directions[dirs], points.t())
+        s0 = s.min(dim=1, keepdim=True)[0]
+        u = (s - s0) / delta
+        j = u.floor()
+        frac = (u - j).unsqueeze(2)
+        j = j.long()
+        num_j = int(j.max()) + 2
+        H = values.new_zeros(len(dirs), num_j, values.shape[1])
+        index = j.unsqueeze(2).expand(-1, -1, values.shape[1])
+        H.scatter_add_(1, index, (1 - frac) * values.unsqueeze(0))
+        H.scatter_add_(1, index + 1, frac * values.unsqueeze(0))
+        
+        # sigma^(m) sampled at s0 + b0 + n*delta, for n = j + k*oversample 
+        rows = (uniform[inverse] & torch.isin(inverse, dirs)).nonzero().flatten()
+        position = torch.searchsorted(dirs, inverse[rows])
+        k = torch.round((bias[rows] - b0[inverse[rows]]) / db[inverse[rows]]).long()
+        num_k = int(k.max()) + 1
+        length = num_j + (num_k - 1) * oversample
+        n = torch.arange(length).to(s).reshape(1,-1)
+        p = s0 + b0[dirs].reshape(-1,1) + n * delta
+        
+        # the correlations sum_j H[j] * K[j+t] by the FFT, without wrapping
+        F_H = torch.fft.rfft(H, n=length, dim=1).conj()
+        column = 0
+        for m, V in items:
+            K = sigma(p) if m == 0 else dsigma(p, m)
+            F_K = torch.fft.rfft(K, n=length, dim=1).unsqueeze(2)
+            C = torch.fft.irfft(F_H[:,:,column:column+V.shape[1]] * F_K, n=length, dim=1)
+            results[rows, column:column+V.shape[1]] = C[position, k * oversample, :]
+            column += V.shape[1]
+    
+    return list(torch.split(results, [V.shape[1] for _, V in items], dim=1))
+
+
+def _support_products(activation, A, points, items, max_numel=2**25):
+    """
+    Sparse-support evaluation for piecewise polynomial activations,
+    e.g., relu^k and bspline. Each piece c*relu(side*(p-t))^j of
+    sigma^(m) is supported on a half space of p = w*x + b, which is a
+    prefix (side=-1) or a suffix (side=1) of the points sorted along w*x.
+    On it, with s = w*x and beta = b - t,
+                (s + beta)^j = sum_l C(j,l) * beta^(j-l) * s^l,
+    so each product only needs the prefix sums of s^l*V at the end of
+    its support, which are shared by all the neurons with the same w.
+    The directions are processed in batches of at most max_numel
+    entries in the prefix sums.
+    """
+    dim = points.shape[1]
+    num_points = points.shape[0]
+    weight, bias = A[:,0:dim], A[:,dim]
+    directions, inverse = torch.unique(weight, dim=0, return_inverse=True)
+    pieces = [activation.piecewise_polynomial(m) for m, _ in items]
+    results = [A.new_zeros(A.shape[0], V.shape[1]) for _, V in items]
+
+    # the number of directions in each batch
+    num_moments = max([max([piece[3] for piece in item_pieces], default=0) + 1 for item_pieces in pieces])
+    num_columns = max([V.shape[1] for _, V in items])
+    batch = max(1, max_numel // (num_moments * num_columns * (num_points+1)))
+    for start in range(0, directions.shape[0], batch):
+        end = min(start+batch, directions.shape[0])
+
+        # points sorted along each direction
+        s, order = torch.sort(torch.mm(directions[start:end], points.t()), dim=1)
+
+        # neurons of these directions, and their ranks in each direction
+        rows = ((inverse >= start) & (inverse < end)).nonzero().flatten()
+        u = inverse[rows] - start
+        u, index = torch.sort(u, stable=True)
+        rows = rows[index]
+        counts = torch.bincount(u, minlength=end-start)
+        first = torch.cumsum(counts, dim=0) - counts
+        rank = torch.arange(len(rows)).to(u) - first[u]
+
+        # the end of support of each piece, searched in the sorted points
+        def search(threshold, right):
+            table = torch.full((end-start, int(counts.max())), float('inf')).to(s)
+            table[u, rank] = threshold
+            position = torch.searchsorted(s.contiguous(), table, right=right)
+            return position[u, rank]
+
+        for result, (m, V), item_pieces in zip(results, items, pieces):
+            if len(item_pieces) == 0:
+                continue
+
+            # prefix sums of s^l*V in the sorted order, with a leading zero
+            Vs = V[order]
+            zeros = Vs.new_zeros(end-start, 1, V.shape[1])
+            moments = []
+            power = torch.ones_like(s)
+            for l in range(max([piece[3] for piece in item_pieces]) + 1):
+                moments.append(torch.cat([zeros, torch.cumsum(power.unsqueeze(2) * Vs, dim=1)], dim=1))
+                power = power * s
+
+            # sum the pieces over their supports
+            b = bias[rows].unsqueeze(1)
+            val = 0
+            for c, t, side, j in item_pieces:
+                position = search(t - b.flatten(), right=(side > 0))
+                beta = b - t
+                piece = 0
+                for l in range(j+1):
+                    if side > 0:
+                        moment = moments[l][u, -1] - moments[l][u, position]
+                    else:
+                        moment = moments[l][u, position]
+                    piece = piece + math.comb(j, l) * beta.pow(j-l) * moment
+                val = val + (c * side**j) * piece
+            result[rows] = val
+
+    return results
+
+
+def cached_products(cache, sigma, dsigma, A, points, items, sparse=False, bank=None, fft=None):
+    """
+    activated_products, whose results are kept in the dict cache for the
+    last A of each shape, e.g., the load vector f(g) of a param-mesh,
+    which is the same in every scan. A requiring grad, or the approximate
+    products of fft, are never cached.
+    """
+    if A.requires_grad or (fft is not None):
+        return activated_products(sigma, dsigma, A, points, items, sparse, bank, fft)
+    key = (A.dtype, tuple(A.shape))
+    entry = cache.get(key)
+    if (entry is None) or (not torch.equal(entry[0], A)):
+        entry = (A.clone(), activated_products(sigma, dsigma, A, points, items, sparse, bank))
+        cache[key] = entry
+    return entry[1]
+
+
+def network_parameters(obj_func):
+    """
+    The parameters (w,b) (n-by-(d+1)) of the neurons of a ShallowNN or its
+    forward, None if obj_func is not a shallow network.
+    """
+    model = getattr(obj_func, '__self__', obj_func)
+    layer = getattr(model, 'layer1', None)
+    if layer is None:
+        return None
+    return torch.cat([layer.weight, layer.bias.reshape(-1,1)], dim=1).detach()
+
+
+def neuron_derivatives(sigma, dsigma, param, orders):
+    """
+    The function x -> [w^m * sigma^(m)(w*x+b) for m in orders] of a 1D
+    neuron param = (w,b) (1-by-2), i.e., its derivatives in columns.
+    """
+    w, b = param[0,0], param[0,1]
+    def func(x):
+        core = x * w + b
+        return torch.cat([sigma(core) if m == 0 else dsigma(core, m) * w**m for m in orders], dim=1)
+    return func
+
+
+class PiecewisePolynomial1D():
+
+    def __init__(self, func, activation, interval, parameters, orders):
+        """
+        A function on an interval [a,b] with its derivatives, e.g., a relu^k
+        or bspline network, which are polynomials of degree at most p 
+        (the degree of the activation) between the kinks of its neurons. 
+        They are stored by their values at the p+1 Gauss-Legendre nodes of 
+        each subinterval, so their integrals against the neurons of the 
+        same activation are exact up to the round-off, without quadpts.
+        INPUT:
+            func: the derivatives (N-by-c) on points (N-by-1), the c-th 
+                  column is of the order orders[c].
+            activation: the piecewise polynomial activation.
+            interval: np.array object, 1-by-2, the interval [a,b].
+            parameters: n-by-2, the (w,b) of the neurons of func.
+            orders: the orders of derivatives in the columns of func.
+        """
+        pieces = activation.piecewise_polynomial(0)
+        if pieces is None:
+            raise RuntimeError("The closed-form integration needs a piecewise polynomial activation.")
+        self.activation = activation
+        self.orders = orders
+        degree = max([piece[3] for piece in pieces])
+        num_nodes = degree + 1
+        
+        # the coordinate y = (x-c)/H in [-1,1], with dx = H*dy
+        a, b = float(interval[0][0]), float(interval[0][1])
+        self.center = (a + b) / 2
+        self.half = (b - a) / 2
+        
+        # breakpoints at the kinks w*x + b = t inside the interval
+        parameters = parameters.detach()
+        w, bias = parameters[:,0], parameters[:,1]
+        w = w[w != 0].reshape(-1,1)
+        bias = bias[parameters[:,0] != 0].reshape(-1,1)
+        kinks = torch.tensor(activation.kinks()).to(parameters).reshape(1,-1)
+        y = (((kinks - bias) / w - self.center) / self.half).flatten()
+        y = y[(y > -1) & (y < 1)]
+        z = torch.unique(torch.cat([y, torch.tensor([-1., 1.]).to(y)]))
+        z = torch.cat([z[0:1], z[1:][torch.diff(z) > 1e-14]])
+        z[-1] = 1.
+        self.z = z
+        self.mid = (z[1:] + z[:-1]) / 2
+        self.length = (z[1:] - z[:-1]) / 2
+        
+        # Gauss-Legendre nodes and Legendre polynomials on them
+        tau, omega = np.polynomial.legendre.leggauss(num_nodes)
+        self.tau = torch.from_numpy(tau).to(z)
+        self.omega = torch.from_numpy(omega).to(z)
+        legendre = self._legendre(self.tau)
+        
+        # values on the nodes of each subinterval, J-by-n-by-c
+        yq = self.mid.reshape(-1,1) + self.length.reshape(-1,1) * self.tau.reshape(1,-1)
+        values = func(yq.reshape(-1,1) * self.half + self.center).detach()
+        values = values.reshape(yq.shape[0], num_nodes, -1)
+        
+        # Legendre coefficients of each piece, exact for degree <= p
+        scale = (2 * torch.arange(num_nodes).to(z) + 1) / 2
+        self.coef = torch.einsum('q,qr,jqc->jrc', self.omega, legendre, values) * scale.reshape(1,-1,1)
+        
+        # prefix sums of the moments int y^l * U dy over the subintervals
+        powers = yq.unsqueeze(2) ** torch.arange(num_nodes).to(z)
+        moments = torch.einsum('q,jql,jqc->jlc', self.omega, powers, values) * self.length.reshape(-1,1,1)
+        zeros = moments.new_zeros(1, *moments.shape[1:])
+        self.prefix = torch.cat([zeros, torch.cumsum(moments, dim=0)], dim=0)
+        
+    def _legendre(self, t):
+        # P_r(t) for r < n, in the last dimension
+        n = len(self.tau)
+        P = [torch.ones_like(t), t]
+        for r in range(1, n-1):
+            P.append(((2*r+1) * t * P[r] - r * P[r-1]) / (r+1))
+        return torch.stack(P[0:n], dim=-1)
+
+    def _cumulative(self, y):
+        
+        # the moments int_{-1}^{y} y'^l * U dy' (M-by-L-by-c) of points y (M)
+        num_pieces = len(self.mid)
+        index = (torch.searchsorted(self.z, y.contiguous(), right=True) - 1).clamp(0, num_pieces-1)
+        lower = self.z[index]
+        h = (y - lower) / 2
+        yq = (y + lower).unsqueeze(1) / 2 + h.unsqueeze(1) * self.tau
+        
+        # values on the Gauss nodes of [lower, y], from the Legendre coefficients
+        t = (yq - self.mid[index].unsqueeze(1)) / self.length[index].unsqueeze(1)
+        values = torch.einsum('mqr,mrc->mqc', self._legendre(t), self.coef[index])
+        powers = yq.unsqueeze(2) ** torch.arange(len(self.tau)).to(yq)
+        partial = torch.einsum('q,mql,mqc->mlc', self.omega, powers, values) * h.reshape(-1,1,1)
+        return self.prefix[index] + partial
+
+    def integrate(self, A, m):
+        """
+        OUTPUT:
+            int sigma^(m)(w*x+b) * U(x) dx over [a,b] (M-by-c) for each row 
+            (w,b) of A (M-by-2), where U are the columns of func.
+        """
+        A = A.to(self.z)
+        ones = torch.ones(A.shape[0]).to(A)
+        total = self.prefix[-1, 0]
+        
+        # w*x + b = wy*y + by in the coordinate y
+        wy = A[:,0] * self.half
+        by = A[:,0] * self.center + A[:,1]
+        nonzero = wy != 0
+        wy_safe = torch.where(nonzero, wy, ones)
+        
+        # each piece c*relu(side*(wy*y+by-t))^j = c*(side*wy)^j*(y-s)^j on
+        # its support y > s (side*wy > 0) or y < s, with s = (t-by)/wy
+        result = 0
+        for c, t, side, j in self.activation.piecewise_polynomial(m):
+            s = (t - by) / wy_safe
+            right = (side * wy > 0)
+            clamped = s.clamp(-1., 1.)
+            moments = self._cumulative(torch.where(right, ones, clamped)) \
+                        - self._cumulative(torch.where(right, clamped, -ones))
+            
+            # (y-s)^j = sum_l C(j,l) * (-s)^(j-l) * y^l
+            val = 0
+            for l in range(j+1):
+                val = val + math.comb(j, l) * (-s).pow(j-l).unsqueeze(1) * moments[:,l,:]
+            val = c * (side * wy).pow(j).unsqueeze(1) * val
+            
+            # the neurons with w = 0 are constants
+            p = side * (by - t)
+            const = torch.where(p > 0, p.pow(j), torch.zeros_like(p))
+            const = c * const.unsqueeze(1) * total.unsqueeze(0)
+            result = result + torch.where(nonzero.unsqueeze(1), val, const)
+        
+        if isinstance(result, int):
+            return A.new_zeros(A.shape[0], self.prefix.shape[2])
+        return result * self.half
+
+    def bilinear_forms(self, A):
+        """
+        OUTPUT:
+            sum_c int (w^m * sigma^(m)(w*x+b)) * U_c(x) dx (M-by-1), with m =
+            orders[c], for each row (w,b) of A, e.g., a(u, sigma(w*x+b)) 
+            if the columns U_c are the derivatives of u.
+        """
+        w = A[:,0:1].to(self.z)
+        forms = 0
+        for c, m in enumerate(self.orders):
+            forms = forms + self.integrate(A, m)[:,c:c+1] * w.pow(m)
+        return forms
+
+
+class ActivatedRows():
+
+    def __init__(self, sigma, dsigma, weights, orders):
+        """
+        A growing store of the activated rows of the greedy elements on
+        one point set, i.e., sigma^(j)(core) times the quadrature weights
+        for each j in orders. The rows are preallocated, the capacity is
+        doubled once it is full, and each step only activates the row of
+        the newest element.
+        INPUT:
+            sigma: activation function.
+            dsigma: derivatives of activation function, dsigma(x, j).
+            weights: quadrature weights (N-by-1) of the point set, a 
+                     function weighing N-by-m values, e.g., by the factored
+                     weights of a TensorProductQuadrature, or None for 
+                     unweighted rows, e.g., on boundary nodes.
+            orders: the orders j of derivatives to be stored.
+        """
+        self.sigma = sigma
+        self.dsigma = dsigma
+        self.weights = weights
+        self.orders = orders
+
+        # stored rows and the parameters they are activated by
+        self.num_rows = 0
+        self.param = None
+        self.rows = None
+
+    def __getstate__(self):
+        # the workers of the parallel search activate their own rows
+        state = self.__dict__.copy()
+        state['num_rows'] = 0
+        state['param'] = None
+        state['rows'] = None
+        return state
+
+    def _activate(self, core):
+        
+        # the fused evaluation of all the orders, if the activation has it
+        activation = getattr(self.dsigma, '__self__', None)
+        if hasattr(activation, 'derivatives'):
+            return activation.derivatives(core, self.orders)
+        return [self.sigma(core) if order == 0 else self.dsigma(core, order) 
+                    for order in self.orders]
+
+    def _reserve(self, num_rows, parameters, core):
+
+        # double the capacity until all rows fit
+        capacity = 0 if self.param is None else self.param.shape[0]
+        if num_rows <= capacity:
+            return
+        capacity = max(num_rows, 2*capacity)
+        param = parameters.new_zeros(capacity, parameters.shape[1])
+        rows = [core.new_zeros(capacity, core.shape[1]) for _ in self.orders]
+
+        # keep the stored rows
+        n = self.num_rows
+        if n > 0:
+            param[0:n] = self.param[0:n]
+            for row, old_row in zip(rows, self.rows):
+                row[0:n] = old_row[0:n]
+        self.param = param
+        self.rows = rows
+
+    def update(self, parameters, core):
+        """
+        Append the rows of the elements which are not stored yet.
+        INPUT:
+            parameters: (k+1)-by-(d+1), all the elements, the newest last.
+            core: (k+1)-by-N, their core matrix on the point set.
+        OUTPUT:
+            rows: the stored (weighted) rows of all elements, one
+                  (k+1)-by-N tensor for each order.
+            new_rows: the (unweighted) rows of the newest element, one
+                      1-by-N tensor for each order.
+        """
+        num_rows = parameters.shape[0]
+
+        # restart if the stored elements are not the leading ones, the
+        # newest row is always activated since it is returned unweighted
+        n = min(self.num_rows, num_rows-1)
+        if n > 0 and not torch.equal(self.param[0:n], parameters[0:n]):
+            n = 0
+
+        # only activate the missing rows
+        new_rows = self._activate(core[n:num_rows,:])
+        with torch.no_grad():
+            self.num_rows = n
+            self._reserve(num_rows, parameters, core)
+            self.param[n:num_rows] = parameters[n:num_rows]
+            for row, new_row in zip(self.rows, new_rows):
+                if self.weights is None:
+                    row[n:num_rows] = new_row
+                elif callable(self.weights):
+                    row[n:num_rows] = self.weights(new_row.t()).t()
+                else:
+                    row[n:num_rows] = new_row * self.weights.t()
+            self.num_rows = num_rows
+
+        rows = [row[0:num_rows] for row in self.rows]
+        new_rows = [new_row[-1:,:] for new_row in new_rows]
+        return rows, new_rows
+
+
+class ActivationBank():
+
+    def __init__(self, directory=None, max_bytes=2**31, min_rows=1024):
+        """
+        A bank of the activated core matrices sigma^(m)(core) of the
+        dictionary scan. The param-mesh and the quadrature points are the
+        same in every greedy step, only the items of the previous solution
+        change, so each parameter chunk is activated once, and its later
+        scans are the products of the stored matrices and the items, i.e.,
+        a few matrix-vector products without any activation.
+        INPUT:
+            directory: None to keep the matrices in memory, or a directory
+                       of memory-mapped .npy files, e.g., on a local disk
+                       for the param-meshes larger than the memory.
+            max_bytes: the budget of the stored matrices, the chunks beyond
+                       it are activated in every scan as before.
+            min_rows: the smallest parameter set to be stored, so the 
+                      few candidates rescored after the scan never are.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_rows = min_rows
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        
+        # stored chunks, keyed by their shapes and the first and last rows
+        self.entries = {}
+        self.num_bytes = 0
+        self.num_files = 0
+        self.full = False
+
+    def __getstate__(self):
+        # the workers of the parallel search only train the candidates
+        state = self.__dict__.copy()
+        state['entries'] = {}
+        state['num_bytes'] = 0
+        return state
+
+    def _key(self, A, points):
+        return (A.dtype, A.device, tuple(A.shape), tuple(points.shape),
+                tuple(A[0].tolist()), tuple(A[-1].tolist()))
+
+    def _find(self, A, points):
+        key = self._key(A, points)
+        entry = self.entries.get(key)
+        if entry is None:
+            return key, None
+        if torch.equal(entry['A'], A) and torch.equal(entry['points'], points):
+            return key, entry
+        return key, None
+
+    def _store(self, value):
+
+        # keep the matrix in memory, or write it to a memory-mapped file, 
+        # which numpy supports for the float types except bfloat16
+        if self.directory is None or value.dtype == torch.bfloat16 or value.is_cuda:
+            return value
+        path = os.path.join(self.directory, 'bank_{:d}.npy'.format(self.num_files))
+        self.num_files += 1
+        array = np.lib.format.open_memmap(path, mode='w+', shape=tuple(value.shape),
+                                          dtype=value.numpy().dtype)
+        array[...] = value.numpy()
+        array.flush()
+        return torch.from_numpy(array)
+
+    def products(self, sigma, dsigma, A, points, items):
+        """
+        OUTPUT:
+            products: sigma^(m)(core) @ V for each (m, V) in items, as in
+                      activated_products, or None if the parameter set is
+                      not stored, e.g., too small or beyond the budget.
+        """
+        if A.shape[0] < self.min_rows:
+            return None
+        key, entry = self._find(A, points)
+        orders = [m for m, _ in items]
+        missing = orders if entry is None else [m for m in orders if m not in entry['rows']]
+
+        # activate the missing orders once, if they fit in the budget
+        if len(missing) > 0:
+            num_bytes = len(missing) * A.shape[0] * points.shape[0] * A.element_size()
+            if self.num_bytes + num_bytes > self.max_bytes:
+                if not self.full:
+                    print(' The activation bank is full, the other chunks are activated in each scan.')
+                    self.full = True
+                return None
+            if entry is None:
+                entry = {'A': A.clone(), 'points': points, 'rows': {}}
+                self.entries[key] = entry
+            ones = torch.ones(points.shape[0],1).to(points)
+            B = torch.cat([points, ones], dim=1).t()
+            core = torch.mm(A, B)
+            for m in missing:
+                entry['rows'][m] = self._store(sigma(core) if m == 0 else dsigma(core, m))
+            self.num_bytes += num_bytes
+            del core
+        
+        return [torch.mm(entry['rows'][m].to(V.device), V) for m, V in items]
+
+    def clear(self):
+        """ Remove all the stored matrices, and their files. """
+        self.entries = {}
+        self.num_bytes = 0
+        self.full = False
+        if self.directory is not None:
+            for i in range(self.num_files):
+                path = os.path.join(self.directory, 'bank_{:d}.npy'.format(i))
+                if os.path.exists(path):
+                    os.remove(path)
+        self.num_files = 0
+
+
 ##=============================================##
 #            an abstract basic class            #
 ##=============================================##
@@ -35,6 +686,24 @@ class LinearEnergy(ABC):
     def get_stiffmat_and_rhs(self):
         pass
     
+    def get_stiffmat_border(self, parameters, *core):
+        """ 
+        mark_1: the last column of the stiffmatrix and the last entry of
+                the load vector, i.e., the bilinear forms between the newest
+                element (the last row of parameters) and all elements.
+        mark_2: this default slices the full system, override it to assemble
+                the border only, with O(k*Nq) instead of O(k^2*Nq) work.
+        """
+        Gk, bk = self.get_stiffmat_and_rhs(parameters, *core)
+        return (Gk[:,-1:], bk[-1:,:])
+    
+    def get_core_points(self):
+        """ 
+        mark: points on which the core matrices of get_stiffmat_and_rhs 
+              are generated, in the same order as its core arguments.
+        """
+        return (self.quadpts,)
+    
     @abstractmethod
     def evaluate(self): #, pre_solution): 
         """ mark: set pre_solution as an intilaization of energy,
@@ -52,6 +721,24 @@ class LinearEnergy(ABC):
         """
         pass
     
+    def evaluate_norms(self, param, chunk_size=64):
+        """ 
+        mark_1: the squared energy norms a(g,g) of the elements of param 
+                (given as in evaluate), in an m-by-1 tensor.
+        mark_2: this default takes the diagonal of get_stiffmat_and_rhs on
+                chunks of chunk_size elements, override it to evaluate the
+                diagonal only, with O(m*Nq) instead of O(m*chunk_size*Nq) work.
+        """
+        A = torch.cat(param, dim=1)
+        norms = []
+        for start in range(0, A.shape[0], chunk_size):
+            sub = A[start:start+chunk_size]
+            core = [torch.mm(sub, torch.cat([points, torch.ones(points.shape[0],1).to(points)], dim=1).t())
+                        for points in self.get_core_points()]
+            Gk, _ = self.get_stiffmat_and_rhs(sub, *core)
+            norms.append(torch.diagonal(Gk).reshape(-1,1))
+        return torch.cat(norms, dim=0)
+    
     
     
     
@@ -73,6 +760,13 @@ class NonlinearEnergy(ABC):
     def get_nonlinear_system(self):
         pass
     
+    def get_core_points(self):
+        """ 
+        mark: points on which the core matrices of get_nonlinear_system
+              are generated, in the same order as its core arguments.
+        """
+        return (self.quadpts,)
+    
     @abstractmethod
     def evaluate(self): #, pre_solution): 
         """ mark: set pre_solution as an intilaization of energy,
@@ -9,7 +9,10 @@ class FNM_L2fitting_1d(energy.LinearEnergy):
                 quadrature,
                 pde,
                 device,
-                parallel_evaluation=False): 
+                parallel_evaluation=False,
+                sparse_evaluation=False,
+                activation_bank=None,
+                interval=None): 
     
         """ 
         The discrete energy functional for the L2-fitting problem:
@@ -21,6 +24,15 @@ class FNM_L2fitting_1d(energy.LinearEnergy):
             pde: a PDE object used in energy evaluation.
             device: cpu or cuda.
             parallel_evaluation: option for evaluation with a large scale.     
+            sparse_evaluation: option for the sparse-support evaluation of 
+                        relu^k and bspline neurons in the dictionary scan.
+            activation_bank: an energy.ActivationBank, which stores the 
+                        activated core matrices of the dictionary scan.
+            interval: np.array object, 1-by-2, the interval [a,b] of the 
+                        domain, which enables the closed-form integration
+                        of the bilinear forms of relu^k (or bspline) neurons,
+                        only the load terms use the quadrature. None for the
+                        quadrature of all the terms.
         """
         super(FNM_L2fitting_1d, self).__init__()
         
@@ -33,13 +45,25 @@ class FNM_L2fitting_1d(energy.LinearEnergy):
         self.pde = pde
         
         self.device = device
+        self.activation = activation
+        self.interval = interval
+        self.load_cache = {}
         """
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            pre_polynomial: The piecewise polynomial pre_solution of the
+                            closed-form integration, if interval is given.
+            activated_rows: The activated rows of the selected elements, 
+                            which get_stiffmat_border appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.sparse_evaluation = sparse_evaluation
+        self.activation_bank = activation_bank
+        self.activated_rows = energy.ActivatedRows(self.sigma, self.dsigma, self.weights, (0,))
         
         
     def _get_energy_items(self, obj_func):
@@ -49,6 +73,29 @@ class FNM_L2fitting_1d(energy.LinearEnergy):
         return obj_val_data
     
     
+    def _get_polynomial_items(self, obj_func):
+        
+        # the value as piecewise polynomials, for the closed-form 
+        # integration, None if obj_func is not a shallow network
+        if self.interval is None:
+            return None
+        parameters = energy.network_parameters(obj_func)
+        if obj_func == self._zero:
+            parameters = torch.zeros(0, 2).to(self.device)
+        elif parameters is None:
+            return None
+        func = lambda x: energy.get_derivatives(obj_func, x, 0)[0]
+        return energy.PiecewisePolynomial1D(func, self.activation, self.interval, parameters, (0,))
+    
+    
+    def _get_polynomial_border(self, parameters, element):
+        
+        # the closed-form bilinear forms of all the elements and one element
+        func = energy.neuron_derivatives(self.sigma, self.dsigma, element, (0,))
+        polynomial = energy.PiecewisePolynomial1D(func, self.activation, self.interval, element, (0,))
+        return polynomial.bilinear_forms(parameters)
+    
+    
     def _get_error(self, p):
         return self.pde.solution(p) - self.pre_solution(p)
     
@@ -93,6 +140,13 @@ class FNM_L2fitting_1d(energy.LinearEnergy):
             core: a core matrix generated outside this energy class
         """
         
+        # closed-form stiffness matrix, column by column
+        if self.interval is not None:
+            Gk = torch.cat([self._get_polynomial_border(parameters, parameters[i:i+1,:]) 
+                                for i in range(parameters.shape[0])], dim=1)
+            bk = torch.mm(self.sigma(core), self.source_data * self.weights) * self.area
+            return (Gk, bk)
+        
         # core matrix and vectors used for vecterization
         g1 = self.sigma(core)
         g2 = g1 * self.weights.t()
@@ -108,23 +162,61 @@ class FNM_L2fitting_1d(energy.LinearEnergy):
         return (Gk, bk)
     
     
-    def evaluate(self, param):
+    def get_stiffmat_border(self, parameters, core):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core: a core matrix generated outside this energy class
+        """
+        
+        # closed-form border of stiffness matrix
+        if self.interval is not None:
+            Gk = self._get_polynomial_border(parameters, parameters[-1:,:])
+            bk = torch.mm(self.sigma(core[-1:,:]), self.source_data * self.weights) * self.area
+            return (Gk, bk)
+        
+        # stored rows of all elements, only the newest one is activated
+        (g2,), (g1,) = self.activated_rows.update(parameters, core)
+        
+        # assemble the border of stiffness matrix
+        Gk = torch.mm(g2, g1.t()) * self.area
+        
+        # assemble the newest entry of load vector
+        f = self.source_data * self.weights
+        bk = torch.mm(g1, f) * self.area 
+        
+        return (Gk, bk)
+    
+    
+    def evaluate(self, param, fft=None, dtype=None):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_val = items
                 
         # get components of theta
         w = param[0]
         A = torch.cat([param[0], param[1]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
         
-        # core matrix and vectors used for vecterization
-        core = torch.mm(A, B)
-        g = self.sigma(core)
-        fg = torch.mm(g, self.source_data * self.weights)
-        ug = torch.mm(g, u_val * self.weights)
+        # closed-form bilinear forms, and the load by the quadrature
+        if self.pre_polynomial is not None:
+            fg, = energy.cached_products(self.load_cache, self.sigma, self.dsigma, A, self.quadpts, 
+                                         [(0, self.source_data * self.weights)], 
+                                         self.sparse_evaluation, self.activation_bank, fft)
+            ag = self.pre_polynomial.bilinear_forms(A)
+            return -(1/2)*(ag - fg * self.area).pow(2)
+        
+        # products of the activated core matrix and the items
+        V = torch.cat([self.source_data, u_val], dim=1) * self.weights
+        gV, = energy.activated_products(self.sigma, self.dsigma, A, self.quadpts, 
+                                        [(0, V)], self.sparse_evaluation,
+                                        self.activation_bank, fft, dtype)
+        fg, ug = gV[:,0:1], gV[:,1:2]
         
         # assemble
         energy_eval = -(1/2)*((ug-fg) * self.area).pow(2)
@@ -132,12 +224,24 @@ class FNM_L2fitting_1d(energy.LinearEnergy):
         return energy_eval
     
     
-    def evaluate_large_scale(self, param):
+    def evaluate_large_scale(self, param, fft=None, dtype=None):
         """ 
         The large scale evaluation of 1D problem.
         """
-        return self.evaluate(param)
+        return self.evaluate(param, fft, dtype)
+    
+    
+    def with_quadrature(self, quadrature):
+        """
+        The same energy on another quadrature of the domain, e.g., a coarser
+        one for the sketch scan, with the options of this energy.
+        """
+        return type(self)(self.activation, quadrature, self.pde, self.device,
+                          self.parallel_evaluation, self.sparse_evaluation,
+                          self.activation_bank, self.interval)
     
     
     def update_solution(self, pre_solution):
-        self.pre_solution = pre_solution
\ No newline at end of file
+        self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
+        self.pre_polynomial = self._get_polynomial_items(pre_solution)
\ No newline at end of file
@@ -9,7 +9,9 @@ class FNM_L2fitting_2d(energy.LinearEnergy):
                 quadrature,
                 pde,
                 device,
-                parallel_evaluation=False): 
+                parallel_evaluation=False,
+                sparse_evaluation=False,
+                activation_bank=None): 
         """ 
         The discrete energy functional for the L2-fitting problem:
                         u = f, in Omega of R
@@ -20,6 +22,10 @@ class FNM_L2fitting_2d(energy.LinearEnergy):
             pde: a PDE object used in energy evaluation.
             device: cpu or cuda.
             parallel_evaluation: option for evaluation with a large scale.     
+            sparse_evaluation: option for the sparse-support evaluation of 
+                        relu^k and bspline neurons in the dictionary scan.
+            activation_bank: an energy.ActivationBank, which stores the 
+                        activated core matrices of the dictionary scan.
         """
         super(FNM_L2fitting_2d, self).__init__()
         
@@ -32,13 +38,21 @@ class FNM_L2fitting_2d(energy.LinearEnergy):
         self.pde = pde
         
         self.device = device
+        self.activation = activation
         """
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            activated_rows: The activated rows of the selected elements, 
+                            which get_stiffmat_border appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.sparse_evaluation = sparse_evaluation
+        self.activation_bank = activation_bank
+        self.activated_rows = energy.ActivatedRows(self.sigma, self.dsigma, self.weights, (0,))
     
         
     def _get_energy_items(self, obj_func):
@@ -57,11 +71,6 @@ class FNM_L2fitting_2d(energy.LinearEnergy):
         return self.pde.solution(p) - self.pre_solution(p)
     
 
-    def _partition(self, num_param, n):
-        division = len(num_param) / n
-        return [0]+[round(division * (i + 1)) for i in range(n)]
-    
-
     def _zero(self, p):
         return 0. * p[...,0:1]
     
@@ -116,22 +125,46 @@ class FNM_L2fitting_2d(energy.LinearEnergy):
         return (Gk, bk)
     
     
-    def evaluate(self, param):
+    def get_stiffmat_border(self, parameters, core):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core: a core matrix generated outside this energy class
+        """
+        
+        # stored rows of all elements, only the newest one is activated
+        (g2,), (g1,) = self.activated_rows.update(parameters, core)
+        
+        # assemble the border of stiffness matrix
+        Gk = torch.mm(g2, g1.t()) * self.area
+        
+        # assemble the newest entry of load vector
+        f = self.source_data * self.weights
+        bk = torch.mm(g1, f) * self.area 
+        
+        return (Gk, bk)
+    
+    
+    def evaluate(self, param, fft=None, dtype=None):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_val = items
                 
         # get components of theta
         A = torch.cat([param[0], param[1], param[2]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
         
-        # core matrix and vectors used for vecterization
-        core = torch.mm(A, B)
-        g = self.sigma(core)
-        fg = torch.mm(g, self.source_data * self.weights)
-        ug = torch.mm(g, u_val * self.weights)
+        # products of the activated core matrix and the items
+        V = torch.cat([self.source_data, u_val], dim=1) * self.weights
+        gV, = energy.activated_products(self.sigma, self.dsigma, A, self.quadpts, 
+                                        [(0, V)], self.sparse_evaluation,
+                                        self.activation_bank, fft, dtype)
+        fg, ug = gV[:,0:1], gV[:,1:2]
         
         # assemble
         energy_eval = -(1/2)*((ug-fg) * self.area).pow(2)
@@ -139,41 +172,26 @@ class FNM_L2fitting_2d(energy.LinearEnergy):
         return energy_eval
     
     
-    def evaluate_large_scale(self, param):
+    def evaluate_large_scale(self, param, fft=None, dtype=None):
         """
         The large scale evaluation of 2D problem, for evaluation
-        in the multiple-parameter situation.
+        in the multiple-parameter situation. The dictionaries scan
+        the param-mesh in chunks of their scan_memory, so all the
+        given parameters are evaluated at once.
         """
-        
-        # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
-        u_val = items 
-                
-        # get components of theta
-        A = torch.cat([param[0], param[1], param[2]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
-        
-        # core matrix and vectors used for vecterization
-        num_param = A.shape[0]
-        ug = torch.zeros(num_param,1)
-        fg = torch.zeros(num_param,1)     
-        
-        num_batch = 2
-        division = self._partition(range(num_param),num_batch)
-        for i in range(num_batch):
-            core = torch.mm(A[division[i]:division[i+1],:], B)
-            g = self.sigma(core)
-            del core
-            ug[division[i]:division[i+1]] = torch.mm(g, u_val * self.weights)
-            fg[division[i]:division[i+1]] = torch.mm(g, self.source_data * self.weights)
-            del g
-        
-        # assemble
-        energy_eval = -(1/2)*((ug-fg) * self.area).pow(2)   
-            
-        return energy_eval
+        return self.evaluate(param, fft, dtype)
+    
+    
+    def with_quadrature(self, quadrature):
+        """
+        The same energy on another quadrature of the domain, e.g., a coarser
+        one for the sketch scan, with the options of this energy.
+        """
+        return type(self)(self.activation, quadrature, self.pde, self.device,
+                          self.parallel_evaluation, self.sparse_evaluation,
+                          self.activation_bank)
     
     
     def update_solution(self, pre_solution):
-        self.pre_solution = pre_solution
\ No newline at end of file
+        self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
\ No newline at end of file
@@ -9,7 +9,10 @@ class FNM_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
                 quadrature,
                 pde,
                 device,
-                parallel_evaluation=False): 
+                parallel_evaluation=False,
+                sparse_evaluation=False,
+                activation_bank=None,
+                interval=None): 
     
         """ 
         The discrete energy functional for the second order elliptic PDE:
@@ -25,6 +28,15 @@ class FNM_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
             pde: a PDE object used in energy evaluation.
             device: cpu or cuda.
             parallel_evaluation: option for evaluation with a large scale.     
+            sparse_evaluation: option for the sparse-support evaluation of 
+                        relu^k and bspline neurons in the dictionary scan.
+            activation_bank: an energy.ActivationBank, which stores the 
+                        activated core matrices of the dictionary scan.
+            interval: np.array object, 1-by-2, the interval [a,b] of the 
+                        domain, which enables the closed-form integration
+                        of the bilinear forms of relu^k (or bspline) neurons,
+                        only the load terms use the quadrature. None for the
+                        quadrature of all the terms.
         """
         super(FNM_Elliptic_2nd_1d_NBC, self).__init__()
         
@@ -37,31 +49,58 @@ class FNM_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
         self.pde = pde
         
         self.device = device
+        self.activation = activation
+        self.interval = interval
+        self.load_cache = {}
         """
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            pre_polynomial: The piecewise polynomial pre_solution of the
+                            closed-form integration, if interval is given.
+            activated_rows: The activated rows of the selected elements, 
+                            which get_stiffmat_border appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.sparse_evaluation = sparse_evaluation
+        self.activation_bank = activation_bank
+        self.activated_rows = energy.ActivatedRows(self.sigma, self.dsigma, self.weights, (0,1))
         
         
     def _get_energy_items(self, obj_func):
+
+        # value and gradient evaluated on all quadpts
+        items = energy.get_derivatives(obj_func, self.quadpts, 1)
+        obj_val_data = items[0]
+        obj_grad_data = items[1]
         
-        # gradient evaluation on quadpts
-        quadpts = self.quadpts.requires_grad_()
-        obj_val = obj_func(quadpts)
-        obj_val_data = obj_val.detach()
-        
-        # get gradient evaluated on all quadpts
-        f = obj_val.sum()
-        gradient = torch.autograd.grad(outputs=f, inputs=quadpts) #, create_graph=True)
-        obj_grad_data = gradient[0].detach()
+        return (obj_val_data, obj_grad_data)
+    
+    
+    def _get_polynomial_items(self, obj_func):
         
-        # reset self.quadpts
-        self.quadpts = self.quadpts.detach()
+        # the value and gradient as piecewise polynomials, for the closed-form 
+        # integration, None if obj_func is not a shallow network
+        if self.interval is None:
+            return None
+        parameters = energy.network_parameters(obj_func)
+        if obj_func == self._zero:
+            parameters = torch.zeros(0, 2).to(self.device)
+        elif parameters is None:
+            return None
+        func = lambda x: torch.cat(energy.get_derivatives(obj_func, x, 1), dim=1)
+        return energy.PiecewisePolynomial1D(func, self.activation, self.interval, parameters, (0,1))
+    
+    
+    def _get_polynomial_border(self, parameters, element):
         
-        return (obj_val_data, obj_grad_data)
+        # the closed-form bilinear forms of all the elements and one element
+        func = energy.neuron_derivatives(self.sigma, self.dsigma, element, (0,1))
+        polynomial = energy.PiecewisePolynomial1D(func, self.activation, self.interval, element, (0,1))
+        return polynomial.bilinear_forms(parameters)
     
     
     def _get_error(self, p):
@@ -111,6 +150,13 @@ class FNM_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
             core: a core matrix generated outside this energy class
         """
         
+        # closed-form stiffness matrix, column by column
+        if self.interval is not None:
+            Gk = torch.cat([self._get_polynomial_border(parameters, parameters[i:i+1,:]) 
+                                for i in range(parameters.shape[0])], dim=1)
+            bk = torch.mm(self.sigma(core), self.source_data * self.weights) * self.area
+            return (Gk, bk)
+        
         # get components of parameters, in a column
         w = parameters[:,0:1]
         
@@ -132,26 +178,69 @@ class FNM_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
         return (Gk, bk)
     
     
-    def evaluate(self, param):
+    def get_stiffmat_border(self, parameters, core):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core: a core matrix generated outside this energy class
+        """
+        
+        # closed-form border of stiffness matrix
+        if self.interval is not None:
+            Gk = self._get_polynomial_border(parameters, parameters[-1:,:])
+            bk = torch.mm(self.sigma(core[-1:,:]), self.source_data * self.weights) * self.area
+            return (Gk, bk)
+        
+        # get components of parameters, in a column
+        w = parameters[:,0:1]
+        
+        # stored rows of all elements, only the newest one is activated
+        (g2, dg2), (g1, dg1) = self.activated_rows.update(parameters, core)
+        
+        # assemble the border of stiffness matrix
+        G = torch.mm(g2, g1.t()) * self.area
+        dG = torch.mm(dg2, dg1.t()) * w * w[-1:,:] * self.area
+        Gk = dG + G
+        
+        # assemble the newest entry of load vector
+        f = self.source_data * self.weights
+        bk = torch.mm(g1, f) * self.area 
+        
+        return (Gk, bk)
+    
+    
+    def evaluate(self, param, fft=None, dtype=None):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_val = items[0]
         u_grad = items[1]
                 
         # get components of theta
         w = param[0]
         A = torch.cat([param[0], param[1]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
         
-        # core matrix and vectors used for vecterization
-        core = torch.mm(A, B)
-        g = self.sigma(core)
-        dg = self.dsigma(core, 1)
-        fg = torch.mm(g, self.source_data * self.weights)
-        ug = torch.mm(g, u_val * self.weights)
-        dudg = torch.mm(dg, u_grad * self.weights) * w
+        # closed-form bilinear forms, and the load by the quadrature
+        if self.pre_polynomial is not None:
+            fg, = energy.cached_products(self.load_cache, self.sigma, self.dsigma, A, self.quadpts, 
+                                         [(0, self.source_data * self.weights)], 
+                                         self.sparse_evaluation, self.activation_bank, fft)
+            ag = self.pre_polynomial.bilinear_forms(A)
+            return -(1/2)*(ag - fg * self.area).pow(2)
+        
+        # products of the activated core matrix and the items
+        V = torch.cat([self.source_data, u_val], dim=1) * self.weights
+        dV = u_grad * self.weights
+        gV, dgV = energy.activated_products(self.sigma, self.dsigma, A, self.quadpts, 
+                                            [(0, V), (1, dV)], self.sparse_evaluation,
+                                            self.activation_bank, fft, dtype)
+        fg, ug = gV[:,0:1], gV[:,1:2]
+        dudg = dgV * w
         
         # assemble
         energy_eval = -(1/2)*((dudg+ug-fg) * self.area).pow(2)
@@ -159,12 +248,24 @@ class FNM_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
         return energy_eval
     
     
-    def evaluate_large_scale(self, param):
+    def evaluate_large_scale(self, param, fft=None, dtype=None):
         """ 
         The large scale evaluation of 1D problem.
         """
-        return self.evaluate(param)
+        return self.evaluate(param, fft, dtype)
+    
+    
+    def with_quadrature(self, quadrature):
+        """
+        The same energy on another quadrature of the domain, e.g., a coarser
+        one for the sketch scan, with the options of this energy.
+        """
+        return type(self)(self.activation, quadrature, self.pde, self.device,
+                          self.parallel_evaluation, self.sparse_evaluation,
+                          self.activation_bank, self.interval)
     
     
     def update_solution(self, pre_solution):
-        self.pre_solution = pre_solution
\ No newline at end of file
+        self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
+        self.pre_polynomial = self._get_polynomial_items(pre_solution)
\ No newline at end of file
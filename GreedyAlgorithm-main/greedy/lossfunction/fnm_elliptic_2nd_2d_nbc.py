@@ -9,7 +9,9 @@ class FNM_Elliptic_2nd_2d_NBC(energy.LinearEnergy):
                 quadrature,
                 pde,
                 device,
-                parallel_evaluation=False): 
+                parallel_evaluation=False,
+                sparse_evaluation=False,
+                activation_bank=None): 
         """ 
         The discrete energy functional for the second order elliptic PDE:
                         - Lap(u) + u = f, in Omega of R
@@ -20,62 +22,82 @@ class FNM_Elliptic_2nd_2d_NBC(energy.LinearEnergy):
             J(u) = (1/2)*(nabla_u,nabla_u) + (1/2)*(u,u) - (f,u) - (g,u).
         INPUT: 
             activation: nonlinear activation functions.
-            quadrature: full quadrature information.
+            quadrature: full quadrature information, or a lazy quadrature
+                        with factored weights, e.g., TensorProductQuadrature,
+                        which is never materialized.
             pde: a PDE object used in energy evaluation.
             device: cpu or cuda.
             parallel_evaluation: option for evaluation with a large scale.     
+            sparse_evaluation: option for the sparse-support evaluation of 
+                        relu^k and bspline neurons in the dictionary scan.
+            activation_bank: an energy.ActivationBank, which stores the 
+                        activated core matrices of the dictionary scan.
         """
         super(FNM_Elliptic_2nd_2d_NBC, self).__init__()
         
         self.sigma = activation.activate
         self.dsigma = activation.dactivate
-        self.quadpts = quadrature.quadpts
-        self.weights = quadrature.weights
+        self.quadrature = quadrature
         self.area = quadrature.area
+        if hasattr(quadrature, 'weigh'):
+            # the points are gathered tile by tile, and the weights stay factored
+            self.quadpts = torch.cat([tile[0] for tile in quadrature.tiles(2**20)], dim=0)
+            self.weights = None
+        else:
+            self.quadpts = quadrature.quadpts
+            self.weights = quadrature.weights
         self.source_data = pde.source(self.quadpts)
         self.pde = pde
         
         self.device = device
+        self.activation = activation
         """
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            activated_rows: The activated rows of the selected elements, 
+                            which get_stiffmat_border appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.sparse_evaluation = sparse_evaluation
+        self.activation_bank = activation_bank
+        self.activated_rows = energy.ActivatedRows(self.sigma, self.dsigma, self._weigh, (0,1))
         
         
     def _get_energy_items(self, obj_func):
+
+        # value and gradient evaluated on all quadpts
+        items = energy.get_derivatives(obj_func, self.quadpts, 1)
+        obj_val_data = items[0]
+        obj_grad_x_data = items[1][:,0:1]
+        obj_grad_y_data = items[1][:,1:2]
         
-        # gradient evaluation on quadpts
-        xpts = self.quadpts[...,0:1].requires_grad_()
-        ypts = self.quadpts[...,1:2].requires_grad_()
-        quadpts = torch.cat([xpts,ypts],dim=1)
-        obj_val = obj_func(quadpts)
-        obj_val_data = obj_val.detach()
-        
-        # get gradient evaluated on all quadpts
-        f = obj_val.sum()
-        gradient_x = torch.autograd.grad(outputs=f, inputs=xpts, retain_graph=True)
-        gradient_y = torch.autograd.grad(outputs=f, inputs=ypts)
-        obj_grad_x_data = gradient_x[0].detach()
-        obj_grad_y_data = gradient_y[0].detach()
+        return (obj_val_data, obj_grad_x_data, obj_grad_y_data)
+    
+    
+    def _weigh(self, values):
         
-        # reset self.quadpts
-        self.quadpts = self.quadpts.detach()
+        # values (N-by-m) times the quadrature weights
+        if self.weights is None:
+            return self.quadrature.weigh(values)
+        return values * self.weights
+    
+    
+    def _integrate(self, values):
         
-        return (obj_val_data, obj_grad_x_data, obj_grad_y_data)
+        # integrals of the rows of values (m-by-N), with the area
+        if self.weights is None:
+            return self.quadrature.reduce(values)
+        return torch.mm(values, self.weights) * self.area
     
     
     def _get_error(self, p):
         return self.pde.solution(p) - self.pre_solution(p)
     
     
-    def _partition(self, num_param, n):
-        division = len(num_param) / n
-        return [0]+[round(division * (i + 1)) for i in range(n)]
-    
-    
     def _zero(self, p):
         return 0. * p[...,0:1]
     
@@ -90,14 +112,12 @@ class FNM_Elliptic_2nd_2d_NBC(energy.LinearEnergy):
         items = self._get_energy_items(obj_func)
         
         # default L2 norm
-        l2 = items[0].pow(2) * self.weights
-        l2_norm = l2.sum() * self.area
+        l2_norm = self._integrate(items[0].pow(2).t()).sum()
         
         # assemble energy norm (not semi-norm)
         energy_norm = 0
         for item in items:
-            h = item.pow(2) * self.weights
-            energy_norm += h.sum() * self.area
+            energy_norm += self._integrate(item.pow(2).t()).sum()
         
         return (l2_norm, energy_norm)
     
@@ -127,8 +147,8 @@ class FNM_Elliptic_2nd_2d_NBC(energy.LinearEnergy):
         # core matrix and vectors used for vecterization
         g1 = self.sigma(core)
         dg1 = self.dsigma(core, 1)
-        g2 = g1 * self.weights.t()
-        dg2 = dg1 * self.weights.t()
+        g2 = self._weigh(g1.t()).t()
+        dg2 = self._weigh(dg1.t()).t()
         
         # assemble stiffness matrix
         G = torch.mm(g1, g2.t()) * self.area
@@ -137,16 +157,49 @@ class FNM_Elliptic_2nd_2d_NBC(energy.LinearEnergy):
         Gk = dxG + dyG + G
         
         # assemble load vector
-        f = self.source_data * self.weights
+        f = self._weigh(self.source_data)
+        bk = torch.mm(g1, f) * self.area 
+        
+        return (Gk, bk)
+    
+    
+    def get_stiffmat_border(self, parameters, core):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core: a core matrix generated outside this energy class
+        """
+        
+        # get components of parameters, in a column
+        w1 = parameters[:,0:1]
+        w2 = parameters[:,1:2]
+        
+        # stored rows of all elements, only the newest one is activated
+        (g2, dg2), (g1, dg1) = self.activated_rows.update(parameters, core)
+        
+        # assemble the border of stiffness matrix
+        G = torch.mm(g2, g1.t()) * self.area
+        dG = torch.mm(dg2, dg1.t()) * self.area
+        dxG = dG * w1 * w1[-1:,:]
+        dyG = dG * w2 * w2[-1:,:]
+        Gk = dxG + dyG + G
+        
+        # assemble the newest entry of load vector
+        f = self._weigh(self.source_data)
         bk = torch.mm(g1, f) * self.area 
         
         return (Gk, bk)
     
 
-    def evaluate(self, param):
+    def evaluate(self, param, fft=None, dtype=None):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_val = items[0]
         u_grad_x = items[1]
         u_grad_y = items[2]
@@ -155,17 +208,16 @@ class FNM_Elliptic_2nd_2d_NBC(energy.LinearEnergy):
         w1 = param[0]
         w2 = param[1]
         A = torch.cat([param[0], param[1], param[2]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
         
-        # core matrix and vectors used for vecterization
-        core = torch.mm(A, B)
-        g = self.sigma(core)
-        dg = self.dsigma(core, 1)
-        fg = torch.mm(g, self.source_data * self.weights)
-        ug = torch.mm(g, u_val * self.weights)
-        dxudg = torch.mm(dg, u_grad_x * self.weights) * w1
-        dyudg = torch.mm(dg, u_grad_y * self.weights) * w2
+        # products of the activated core matrix and the items
+        V = self._weigh(torch.cat([self.source_data, u_val], dim=1))
+        dV = self._weigh(torch.cat([u_grad_x, u_grad_y], dim=1))
+        gV, dgV = energy.activated_products(self.sigma, self.dsigma, A, self.quadpts, 
+                                            [(0, V), (1, dV)], self.sparse_evaluation,
+                                            self.activation_bank, fft, dtype)
+        fg, ug = gV[:,0:1], gV[:,1:2]
+        dxudg = dgV[:,0:1] * w1
+        dyudg = dgV[:,1:2] * w2
         
         # assemble
         energy_eval = -(1/2)*((dxudg+dyudg+ug-fg) * self.area).pow(2)
@@ -173,50 +225,39 @@ class FNM_Elliptic_2nd_2d_NBC(energy.LinearEnergy):
         return energy_eval
     
     
-    def evaluate_large_scale(self, param):
+    def evaluate_norms(self, param):
+        """
+        The squared energy norms a(g,g) of the elements of param, i.e., the
+        diagonal of the stiffness matrix without the products of its rows.
+        """
+        A = torch.cat(param, dim=1)
+        ones = torch.ones(self.quadpts.shape[0],1).to(self.quadpts)
+        core = torch.mm(A, torch.cat([self.quadpts, ones], dim=1).t())
+        g = self._integrate(self.sigma(core).pow(2))
+        dg = self._integrate(self.dsigma(core, 1).pow(2)) * (param[0].pow(2) + param[1].pow(2))
+        return g + dg
+    
+    
+    def evaluate_large_scale(self, param, fft=None, dtype=None):
         """
         The large scale evaluation of 2D problem, for evaluation
-        in the multiple-parameter situation.
+        in the multiple-parameter situation. The dictionaries scan
+        the param-mesh in chunks of their scan_memory, so all the
+        given parameters are evaluated at once.
         """
-        
-        # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
-        u_val = items[0]
-        u_grad_x = items[1]
-        u_grad_y = items[2]  
-                
-        # get components of theta
-        w1 = param[0]
-        w2 = param[1]
-        A = torch.cat([param[0], param[1], param[2]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
-        
-        # core matrix and vectors used for vecterization
-        num_param = A.shape[0]
-        ug = torch.zeros(num_param,1)
-        fg = torch.zeros(num_param,1)
-        dxudg = torch.zeros(num_param,1) 
-        dyudg = torch.zeros(num_param,1)        
-        
-        num_batch = 2
-        division = self._partition(range(num_param),num_batch)
-        for i in range(num_batch):
-            core = torch.mm(A[division[i]:division[i+1],:], B)
-            g = self.sigma(core)
-            dg = self.dsigma(core, 1)
-            del core
-            ug[division[i]:division[i+1]] = torch.mm(g, u_val * self.weights)
-            fg[division[i]:division[i+1]] = torch.mm(g, self.source_data * self.weights)
-            dxudg[division[i]:division[i+1]] = torch.mm(dg, u_grad_x * self.weights) * w1[division[i]:division[i+1],:]
-            dyudg[division[i]:division[i+1]] = torch.mm(dg, u_grad_y * self.weights) * w2[division[i]:division[i+1],:]
-            del g, dg
-        
-        # assemble
-        energy_eval = -(1/2)*((dxudg+dyudg+ug-fg) * self.area).pow(2)   
-            
-        return energy_eval
+        return self.evaluate(param, fft, dtype)
+    
+    
+    def with_quadrature(self, quadrature):
+        """
+        The same energy on another quadrature of the domain, e.g., a coarser
+        one for the sketch scan, with the options of this energy.
+        """
+        return type(self)(self.activation, quadrature, self.pde, self.device,
+                          self.parallel_evaluation, self.sparse_evaluation,
+                          self.activation_bank)
     
     
     def update_solution(self, pre_solution):
-        self.pre_solution = pre_solution
\ No newline at end of file
+        self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
\ No newline at end of file
@@ -10,7 +10,9 @@ class FNM_Elliptic_4th_1d_NBC(energy.LinearEnergy):
                 quadrature,
                 pde,
                 device,
-                parallel_evaluation=False): 
+                parallel_evaluation=False,
+                sparse_evaluation=False,
+                activation_bank=None): 
         
         """ 
         The discrete energy functional for the second order elliptic PDE:
@@ -27,6 +29,10 @@ class FNM_Elliptic_4th_1d_NBC(energy.LinearEnergy):
             pde: a PDE object used in energy evaluation.
             device: cpu or cuda.
             parallel_evaluation: option for evaluation with a large scale.     
+            sparse_evaluation: option for the sparse-support evaluation of 
+                        relu^k and bspline neurons in the dictionary scan.
+            activation_bank: an energy.ActivationBank, which stores the 
+                        activated core matrices of the dictionary scan.
         """
         super(FNM_Elliptic_4th_1d_NBC, self).__init__()
         
@@ -39,34 +45,30 @@ class FNM_Elliptic_4th_1d_NBC(energy.LinearEnergy):
         self.pde = pde
         
         self.device = device
+        self.activation = activation
         """
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            activated_rows: The activated rows of the selected elements, 
+                            which get_stiffmat_border appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.sparse_evaluation = sparse_evaluation
+        self.activation_bank = activation_bank
+        self.activated_rows = energy.ActivatedRows(self.sigma, self.dsigma, self.weights, (0,2))
         
 
     def _get_energy_items(self, obj_func):
-        
-        # gradient evaluation on quadpts
-        quadpts = self.quadpts.requires_grad_()
-        obj_val = obj_func(quadpts)
-        obj_val_data = obj_val.detach()
-        
-        # get gradient evaluated on all quadpts
-        f = obj_val.sum()
-        gradient = torch.autograd.grad(outputs=f, inputs=quadpts, create_graph=True)
-        obj_grad_data = gradient[0].detach()
 
-        # get second-order derivatives evaluated on all quadpts
-        df = gradient[0].sum()
-        hessian = torch.autograd.grad(outputs=df, inputs=quadpts)
-        obj_hess_data = hessian[0].detach()
-        
-        # reset self.quadpts
-        self.quadpts = self.quadpts.detach()
+        # value, gradient and second-order derivative on all quadpts
+        items = energy.get_derivatives(obj_func, self.quadpts, 2)
+        obj_val_data = items[0]
+        obj_grad_data = items[1]
+        obj_hess_data = items[2][:,0,0:1]
         
         return (obj_val_data, obj_grad_data, obj_hess_data)
     
@@ -140,10 +142,41 @@ class FNM_Elliptic_4th_1d_NBC(energy.LinearEnergy):
         return (Gk, bk)
     
     
-    def evaluate(self, param):
+    def get_stiffmat_border(self, parameters, core):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core: a core matrix generated outside this energy class
+        """
+        
+        # get components of parameters, in a column
+        w = parameters[:,0:1]
+        v = w * w
+        
+        # stored rows of all elements, only the newest one is activated
+        (g2, d2g2), (g1, d2g1) = self.activated_rows.update(parameters, core)
+        
+        # assemble the border of stiffness matrix
+        G = torch.mm(g2, g1.t()) * self.area
+        d2G = torch.mm(d2g2, d2g1.t()) * v * v[-1:,:] * self.area
+        Gk = d2G + G
+        
+        # assemble the newest entry of load vector
+        f = self.source_data * self.weights
+        bk = torch.mm(g1, f) * self.area 
+        
+        return (Gk, bk)
+    
+    
+    def evaluate(self, param, fft=None, dtype=None):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_val = items[0]
         u_grad = items[1]
         u_hess = items[2]
@@ -151,16 +184,15 @@ class FNM_Elliptic_4th_1d_NBC(energy.LinearEnergy):
         # get components of theta
         w = param[0]
         A = torch.cat([param[0], param[1]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
         
-        # core matrix and vectors used for vecterization
-        core = torch.mm(A, B)
-        g = self.sigma(core)
-        d2g = self.dsigma(core, 2)
-        fg = torch.mm(g, self.source_data * self.weights)
-        ug = torch.mm(g, u_val * self.weights)
-        d2ud2g = torch.mm(d2g, u_hess * self.weights) * w * w
+        # products of the activated core matrix and the items
+        V = torch.cat([self.source_data, u_val], dim=1) * self.weights
+        d2V = u_hess * self.weights
+        gV, d2gV = energy.activated_products(self.sigma, self.dsigma, A, self.quadpts, 
+                                             [(0, V), (2, d2V)], self.sparse_evaluation,
+                                             self.activation_bank, fft, dtype)
+        fg, ug = gV[:,0:1], gV[:,1:2]
+        d2ud2g = d2gV * w * w
         
         # assemble
         energy_eval = -(1/2)*((d2ud2g+ug-fg) * self.area).pow(2)
@@ -168,12 +200,23 @@ class FNM_Elliptic_4th_1d_NBC(energy.LinearEnergy):
         return energy_eval
     
     
-    def evaluate_large_scale(self, param):
+    def evaluate_large_scale(self, param, fft=None, dtype=None):
         """ 
         The large scale evaluation of 1D problem.
         """
-        return self.evaluate(param)
+        return self.evaluate(param, fft, dtype)
+    
+    
+    def with_quadrature(self, quadrature):
+        """
+        The same energy on another quadrature of the domain, e.g., a coarser
+        one for the sketch scan, with the options of this energy.
+        """
+        return type(self)(self.activation, quadrature, self.pde, self.device,
+                          self.parallel_evaluation, self.sparse_evaluation,
+                          self.activation_bank)
     
     
     def update_solution(self, pre_solution):
-        self.pre_solution = pre_solution
\ No newline at end of file
+        self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
\ No newline at end of file
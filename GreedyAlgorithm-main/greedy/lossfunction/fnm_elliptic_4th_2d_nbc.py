@@ -10,7 +10,9 @@ class FNM_Elliptic_4th_2d_NBC(energy.LinearEnergy):
                 quadrature,
                 pde,
                 device,
-                parallel_evaluation=False): 
+                parallel_evaluation=False,
+                sparse_evaluation=False,
+                activation_bank=None): 
         
         """ 
         The discrete energy functional for the second order elliptic PDE:
@@ -33,6 +35,10 @@ class FNM_Elliptic_4th_2d_NBC(energy.LinearEnergy):
             pde: a PDE object used in energy evaluation.
             device: cpu or cuda.
             parallel_evaluation: option for evaluation with a large scale.     
+            sparse_evaluation: option for the sparse-support evaluation of 
+                        relu^k and bspline neurons in the dictionary scan.
+            activation_bank: an energy.ActivationBank, which stores the 
+                        activated core matrices of the dictionary scan.
         """
         super(FNM_Elliptic_4th_2d_NBC, self).__init__()
         
@@ -45,48 +51,36 @@ class FNM_Elliptic_4th_2d_NBC(energy.LinearEnergy):
         self.pde = pde
         
         self.device = device
+        self.activation = activation
         """
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            activated_rows: The activated rows of the selected elements, 
+                            which get_stiffmat_border appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.sparse_evaluation = sparse_evaluation
+        self.activation_bank = activation_bank
+        self.activated_rows = energy.ActivatedRows(self.sigma, self.dsigma, self.weights, (0,2))
         
 
     def _get_energy_items(self, obj_func):
-        
-        # initialized enery-item
-        items = []
-        
-        # gradient evaluation on quadpts
-        xpts = self.quadpts[...,0:1].requires_grad_()
-        ypts = self.quadpts[...,1:2].requires_grad_()
-        quadpts = torch.cat([xpts,ypts],dim=1)
-        obj_val = obj_func(quadpts)
-        items.append(obj_val.detach())
-        
-        # get gradient evaluated on all quadpts
-        f = obj_val.sum()
-        gradient_x = torch.autograd.grad(outputs=f, inputs=xpts, create_graph=True)
-        gradient_y = torch.autograd.grad(outputs=f, inputs=ypts, create_graph=True)
-        items.append(gradient_x[0].detach())
-        items.append(gradient_y[0].detach())
 
-        # get second-order derivatives evaluated on all quadpts
-        dxf = gradient_x[0].sum()
-        dyf = gradient_y[0].sum()
-        hessian_xx = torch.autograd.grad(outputs=dxf, inputs=xpts, create_graph=True)
-        hessian_xy = torch.autograd.grad(outputs=dxf, inputs=ypts, create_graph=True)
-        hessian_yx = torch.autograd.grad(outputs=dyf, inputs=xpts, create_graph=True)
-        hessian_yy = torch.autograd.grad(outputs=dyf, inputs=ypts)
-        items.append(hessian_xx[0].detach())
-        items.append(hessian_xy[0].detach())
-        items.append(hessian_yx[0].detach())
-        items.append(hessian_yy[0].detach())
-        
-        # reset self.quadpts
-        self.quadpts = self.quadpts.detach()
+        # value, gradient and Hessian evaluated on all quadpts
+        obj_items = energy.get_derivatives(obj_func, self.quadpts, 2)
+        gradient = obj_items[1]
+        hessian = obj_items[2]
+        items = [obj_items[0]]
+        items.append(gradient[:,0:1])
+        items.append(gradient[:,1:2])
+        items.append(hessian[:,0,0:1])
+        items.append(hessian[:,0,1:2])
+        items.append(hessian[:,1,0:1])
+        items.append(hessian[:,1,1:2])
         
         return items
     
@@ -95,11 +89,6 @@ class FNM_Elliptic_4th_2d_NBC(energy.LinearEnergy):
         return self.pde.solution(p) - self.pre_solution(p)
     
     
-    def _partition(self, num_param, n):
-        division = len(num_param) / n
-        return [0]+[round(division * (i + 1)) for i in range(n)]
-    
-    
     def _zero(self, p):
         x = p[...,0:1]
         y = p[...,1:2]
@@ -173,48 +162,47 @@ class FNM_Elliptic_4th_2d_NBC(energy.LinearEnergy):
         return (Gk, bk)
     
     
-    def evaluate(self, param):
+    def get_stiffmat_border(self, parameters, core):
         
-        # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
-        u_val = items[0]
-        u_hess_xx = item[3]
-        u_hess_xy = item[4]
-        u_hess_yx = item[5]
-        u_hess_yy = item[6]
-                
-        # get components of theta
-        w1 = param[0]
-        w2 = param[1]
-        A = torch.cat([param[0], param[1], param[2]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core: a core matrix generated outside this energy class
+        """
         
-        # core matrix and vectors used for vecterization
-        core = torch.mm(A, B)
-        g = self.sigma(core)
-        d2g = self.dsigma(core, 2)
-        fg = torch.mm(g, self.source_data * self.weights)
-        ug = torch.mm(g, u_val * self.weights)
-        dxxudxxg = torch.mm(d2g, u_hess_xx * self.weights) * w1 * w1
-        dxyudxyg = torch.mm(d2g, u_hess_xy * self.weights) * w1 * w2
-        dyyudyyg = torch.mm(d2g, u_hess_yy * self.weights) * w2 * w2
-        d2ud2g = dxxudxxg + 2*dxyudxyg + dyyudyyg
+        # get components of parameters, in a column
+        w1 = parameters[:,0:1]
+        w2 = parameters[:,1:2]
+        v11 = w1 * w1
+        v12 = w1 * w2
+        v21 = w2 * w1
+        v22 = w2 * w2
         
-        # assemble
-        energy_eval = -(1/2)*((d2ud2g+ug-fg) * self.area).pow(2)
-            
-        return energy_eval
+        # stored rows of all elements, only the newest one is activated
+        (g2, d2g2), (g1, d2g1) = self.activated_rows.update(parameters, core)
+        
+        # assemble the border of stiffness matrix
+        G = torch.mm(g2, g1.t()) * self.area
+        coef = v11 * v11[-1:,:] + v12 * v12[-1:,:] + \
+                v21 * v21[-1:,:] + v22 * v22[-1:,:]
+        d2G = torch.mm(d2g2, d2g1.t()) * coef * self.area
+        Gk = d2G + G
+        
+        # assemble the newest entry of load vector
+        f = self.source_data * self.weights
+        bk = torch.mm(g1, f) * self.area 
+        
+        return (Gk, bk)
     
     
-    def evaluate_large_scale(self, param):
-        """
-        The large scale evaluation of 2D problem, for evaluation
-        in the multiple-parameter situation.
-        """
+    def evaluate(self, param, fft=None, dtype=None):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_val = items[0]
         u_hess_xx = items[3]
         u_hess_xy = items[4]
@@ -225,33 +213,17 @@ class FNM_Elliptic_4th_2d_NBC(energy.LinearEnergy):
         w1 = param[0]
         w2 = param[1]
         A = torch.cat([param[0], param[1], param[2]], dim=1)
-        ones = torch.ones(len(self.quadpts),1).to(self.device)
-        B = torch.cat([self.quadpts, ones], dim=1).t()  
-        
-        # core matrix and vectors used for vecterization
-        num_param = A.shape[0]
-        ug = torch.zeros(num_param,1)
-        fg = torch.zeros(num_param,1)
-        dxxudxxg = torch.zeros(num_param,1) 
-        dxyudxyg = torch.zeros(num_param,1)    
-        dyyudyyg = torch.zeros(num_param,1)
         
-        num_batch = 2
-        division = self._partition(range(num_param),num_batch)
-        for i in range(num_batch):
-            core = torch.mm(A[division[i]:division[i+1],:], B)
-            g = self.sigma(core)
-            d2g = self.dsigma(core, 2)
-            del core
-            ug[division[i]:division[i+1]] = torch.mm(g, u_val * self.weights)
-            fg[division[i]:division[i+1]] = torch.mm(g, self.source_data * self.weights)
-            dxxudxxg[division[i]:division[i+1]] = torch.mm(d2g, u_hess_xx * self.weights) * \
-                                        w1[division[i]:division[i+1],:] * w1[division[i]:division[i+1],:]
-            dxyudxyg[division[i]:division[i+1]] = torch.mm(d2g, u_hess_xy * self.weights) * \
-                                        w1[division[i]:division[i+1],:] * w2[division[i]:division[i+1],:]
-            dyyudyyg[division[i]:division[i+1]] = torch.mm(d2g, u_hess_yy * self.weights) * \
-                                        w2[division[i]:division[i+1],:] * w2[division[i]:division[i+1],:]
-            del g, d2g
+        # products of the activated core matrix and the items
+        V = torch.cat([self.source_data, u_val], dim=1) * self.weights
+        d2V = torch.cat([u_hess_xx, u_hess_xy, u_hess_yy], dim=1) * self.weights
+        gV, d2gV = energy.activated_products(self.sigma, self.dsigma, A, self.quadpts, 
+                                             [(0, V), (2, d2V)], self.sparse_evaluation,
+                                             self.activation_bank, fft, dtype)
+        fg, ug = gV[:,0:1], gV[:,1:2]
+        dxxudxxg = d2gV[:,0:1] * w1 * w1
+        dxyudxyg = d2gV[:,1:2] * w1 * w2
+        dyyudyyg = d2gV[:,2:3] * w2 * w2
         d2ud2g = dxxudxxg + 2*dxyudxyg + dyyudyyg
         
         # assemble
@@ -260,6 +232,27 @@ class FNM_Elliptic_4th_2d_NBC(energy.LinearEnergy):
         return energy_eval
     
     
+    def evaluate_large_scale(self, param, fft=None, dtype=None):
+        """
+        The large scale evaluation of 2D problem, for evaluation
+        in the multiple-parameter situation. The dictionaries scan
+        the param-mesh in chunks of their scan_memory, so all the
+        given parameters are evaluated at once.
+        """
+        return self.evaluate(param, fft, dtype)
+    
+    
+    def with_quadrature(self, quadrature):
+        """
+        The same energy on another quadrature of the domain, e.g., a coarser
+        one for the sketch scan, with the options of this energy.
+        """
+        return type(self)(self.activation, quadrature, self.pde, self.device,
+                          self.parallel_evaluation, self.sparse_evaluation,
+                          self.activation_bank)
+    
+    
     def update_solution(self, pre_solution):
         self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
     
\ No newline at end of file
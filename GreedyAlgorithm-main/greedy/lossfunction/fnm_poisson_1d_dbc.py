@@ -11,7 +11,8 @@ class FNM_Poisson_1d_DBC(energy.LinearEnergy):
                 penalty,
                 pde,
                 device,
-                parallel_evaluation=False): 
+                parallel_evaluation=False,
+                interval=None): 
         """ 
         The discrete energy functional for the Poisson's equation:
                         - u_xx = f, in Omega of R
@@ -31,6 +32,11 @@ class FNM_Poisson_1d_DBC(energy.LinearEnergy):
             pde: a PDE object used in energy evaluation.
             device: cpu or cuda.
             parallel_evaluation: option for evaluation with a large scale.     
+            interval: np.array object, 1-by-2, the interval [a,b] of the 
+                        domain, which enables the closed-form integration
+                        of the bilinear forms of relu^k (or bspline) neurons,
+                        only the load terms use the quadrature. None for the
+                        quadrature of all the terms.
         """
         super(FNM_Poisson_1d_DBC, self).__init__()
         
@@ -45,34 +51,62 @@ class FNM_Poisson_1d_DBC(energy.LinearEnergy):
         self.pde = pde
         
         self.device = device
+        self.activation = activation
+        self.interval = interval
+        self.load_cache = {}
         """
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            pre_polynomial: The piecewise polynomial gradient of pre_solution
+                            for the closed-form integration, if interval is 
+                            given.
+            activated_rows_in, activated_rows_bd: The activated rows of the 
+                            selected elements, which get_stiffmat_border 
+                            appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.activated_rows_in = energy.ActivatedRows(self.sigma, self.dsigma, self.weights, (1,))
+        self.activated_rows_bd = energy.ActivatedRows(self.sigma, self.dsigma, None, (0,))
         
         
     def _get_energy_items(self, obj_func):
-        
+
         # Dirichlet's trace evaluated on the boundary, with penalty scaling
-        obj_val_bdata = obj_func(self.boundary) * (1/self.penalty)
+        obj_val_bdata = obj_func(self.boundary).detach() * (1/self.penalty)
         
         # function value, gradient evaluation on quadpts
-        quadpts = self.quadpts.requires_grad_()
-        obj_val = obj_func(quadpts)
-        obj_val_data = obj_val.detach()
+        items = energy.get_derivatives(obj_func, self.quadpts, 1)
+        obj_val_data = items[0]
+        obj_grad_data = items[1]
         
-        # get gradient evaluated on all quadpts
-        f = obj_val.sum()
-        gradient = torch.autograd.grad(outputs=f, inputs=quadpts) #, create_graph=True)
-        obj_grad_data = gradient[0].detach()
+        return (obj_val_bdata, obj_val_data, obj_grad_data)
+    
+    
+    def _get_polynomial_items(self, obj_func):
         
-        # reset self.quadpts
-        self.quadpts = self.quadpts.detach()
+        # the gradient as piecewise polynomials, for the closed-form 
+        # integration, None if obj_func is not a shallow network
+        if self.interval is None:
+            return None
+        parameters = energy.network_parameters(obj_func)
+        if obj_func == self._zero:
+            parameters = torch.zeros(0, 2).to(self.device)
+        elif parameters is None:
+            return None
+        func = lambda x: energy.get_derivatives(obj_func, x, 1)[1]
+        return energy.PiecewisePolynomial1D(func, self.activation, self.interval, parameters, (1,))
+    
+    
+    def _get_polynomial_border(self, parameters, element):
         
-        return (obj_val_bdata, obj_val_data, obj_grad_data)
+        # the closed-form bilinear forms of all the elements and one element
+        func = energy.neuron_derivatives(self.sigma, self.dsigma, element, (1,))
+        polynomial = energy.PiecewisePolynomial1D(func, self.activation, self.interval, element, (1,))
+        return polynomial.bilinear_forms(parameters)
     
     
     def _get_error(self, p):
@@ -131,12 +165,16 @@ class FNM_Poisson_1d_DBC(energy.LinearEnergy):
         # core matrix and vectors used for vecterization
         g_bd = self.sigma(core_bd)
         g_in = self.sigma(core_in)
-        dg1 = self.dsigma(core_in, 1)
-        dg2 = dg1 * self.weights.t()
         
-        # assemble stiffness matrix
+        # assemble stiffness matrix, in closed form if interval is given
         G_bd = torch.mm(g_bd, g_bd.t()) * (1/self.penalty)
-        dG = torch.mm(dg1, dg2.t()) * torch.mm(w, w.t()) * self.area
+        if self.interval is not None:
+            dG = torch.cat([self._get_polynomial_border(parameters, parameters[i:i+1,:]) 
+                                for i in range(parameters.shape[0])], dim=1)
+        else:
+            dg1 = self.dsigma(core_in, 1)
+            dg2 = dg1 * self.weights.t()
+            dG = torch.mm(dg1, dg2.t()) * torch.mm(w, w.t()) * self.area
         Gk = dG + G_bd
         
         # assemble load vector
@@ -146,10 +184,50 @@ class FNM_Poisson_1d_DBC(energy.LinearEnergy):
         return (Gk, bk)
     
     
+    def get_stiffmat_border(self, parameters, core_in, core_bd):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core_in: a core matrix generated outside this energy class
+            core_bd: a core matrix generated outside this energy class
+        """
+        
+        # get components of parameters, in a column
+        w = parameters[:,0:1]
+        
+        # stored rows of all elements, only the newest one is activated
+        (g_bd,), (g1_bd,) = self.activated_rows_bd.update(parameters, core_bd)
+        g_in = self.sigma(core_in[-1:,:])
+        
+        # assemble the border of stiffness matrix, in closed form if interval is given
+        G_bd = torch.mm(g_bd, g1_bd.t()) * (1/self.penalty)
+        if self.interval is not None:
+            dG = self._get_polynomial_border(parameters, parameters[-1:,:])
+        else:
+            (dg2,), (dg1,) = self.activated_rows_in.update(parameters, core_in)
+            dG = torch.mm(dg2, dg1.t()) * w * w[-1:,:] * self.area
+        Gk = dG + G_bd
+        
+        # assemble the newest entry of load vector
+        f = self.source_data * self.weights
+        bk = torch.mm(g_in, f) * self.area 
+        
+        return (Gk, bk)
+    
+    
+    def get_core_points(self):
+        return (self.quadpts, self.boundary)
+    
+    
     def evaluate(self, param):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_val_bd = items[0]
         u_val_in = items[1]
         u_grad_in = items[2]
@@ -162,6 +240,15 @@ class FNM_Poisson_1d_DBC(energy.LinearEnergy):
         ones_bd = torch.ones(len(self.boundary),1).to(self.device)
         B_bd = torch.cat([self.boundary, ones_bd], dim=1).t()  
 
+        # closed-form bilinear forms, and the load by the quadrature
+        if self.pre_polynomial is not None:
+            g_bd = self.sigma(torch.mm(A, B_bd))
+            ug_bd = torch.mm(g_bd, u_val_bd)
+            fg_in, = energy.cached_products(self.load_cache, self.sigma, self.dsigma, A, self.quadpts, 
+                                            [(0, self.source_data * self.weights)])
+            dudg_in = self.pre_polynomial.bilinear_forms(A)
+            return -(1/2)*(dudg_in - fg_in * self.area + ug_bd).pow(2)
+        
         # core matrix and vectors used for vecterization
         core_in = torch.mm(A, B_in)
         core_bd = torch.mm(A, B_bd)
@@ -185,5 +272,16 @@ class FNM_Poisson_1d_DBC(energy.LinearEnergy):
         return self.evaluate(param)
     
     
+    def with_quadrature(self, quadrature):
+        """
+        The same energy on another quadrature of the domain, e.g., a coarser
+        one for the sketch scan, with the options of this energy.
+        """
+        return type(self)(self.activation, quadrature, self.boundary, self.penalty, self.pde, 
+                          self.device, self.parallel_evaluation, self.interval)
+    
+    
     def update_solution(self, pre_solution):
-        self.pre_solution = pre_solution
\ No newline at end of file
+        self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
+        self.pre_polynomial = self._get_polynomial_items(pre_solution)
\ No newline at end of file
@@ -72,13 +72,15 @@ class PINN_AllenCahn_2d_DBC(energy.NonlinearEnergy):
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
         
         
     def _get_energy_items(self, obj_func):
-        
+
         # initialized enery-item
         items = []
         
@@ -90,28 +92,11 @@ class PINN_AllenCahn_2d_DBC(energy.NonlinearEnergy):
         obj_val_idata = obj_func(self.quadpts_init)
         items.append(obj_val_idata.detach())
         
-        # evaluation on domain quadpts
-        xpts = self.quadpts_in[...,0:1].requires_grad_()
-        tpts = self.quadpts_in[...,1:2].requires_grad_()
-        quadpts = torch.cat([xpts,tpts],dim=1)
-        obj_val = obj_func(quadpts)
-        items.append(obj_val.detach())
-        
-        # get gradient evaluated on domain quadpts
-        f = obj_val.sum()
-        gradient_x = torch.autograd.grad(outputs=f, inputs=xpts, create_graph=True)
-        gradient_t = torch.autograd.grad(outputs=f, inputs=tpts, create_graph=True)
-        items.append(gradient_t[0].detach())
-        
-        # get u_xx evaluated on domain quadpts
-        dxf = gradient_x[0].sum()
-        hessian_xx = torch.autograd.grad(outputs=dxf, inputs=xpts)
-        items.append(hessian_xx[0].detach())
-        
-        # clear autograd graph
-        self.quadpts_in = self.quadpts_in.detach()
-        self.quadpts_bd = self.quadpts_bd.detach()
-        self.quadpts_init = self.quadpts_init.detach()
+        # value, u_t and u_xx evaluated on domain quadpts
+        obj_items = energy.get_derivatives(obj_func, self.quadpts_in, 2)
+        items.append(obj_items[0])
+        items.append(obj_items[1][:,1:2])
+        items.append(obj_items[2][:,0,0:1])
         
         return items
     
@@ -160,7 +145,7 @@ class PINN_AllenCahn_2d_DBC(energy.NonlinearEnergy):
         """
         
         # get bilinear forms
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         
         # interior residual
         u_val = items[2]
@@ -240,10 +225,14 @@ class PINN_AllenCahn_2d_DBC(energy.NonlinearEnergy):
         return (J, G.t())
     
     
+    def get_core_points(self):
+        return (self.quadpts_in, self.quadpts_bd, self.quadpts_init)
+    
+    
     def evaluate(self, param):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_trace_bd = items[0]
         u_trace_init = items[1]
         u_val = items[2]
@@ -287,5 +276,13 @@ class PINN_AllenCahn_2d_DBC(energy.NonlinearEnergy):
         return energy_eval
     
     
+    def evaluate_large_scale(self, param):
+        """ 
+        The large scale evaluation, all parameters are evaluated at once.
+        """
+        return self.evaluate(param)
+    
+    
     def update_solution(self, solution):
-        self.pre_solution = solution
\ No newline at end of file
+        self.pre_solution = solution
+        self.pre_items = self._get_energy_items(solution)
\ No newline at end of file
@@ -54,13 +54,15 @@ class PINN_Burgers_1d_PBC(energy.NonlinearEnergy):
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
         
         
     def _get_energy_items(self, obj_func):
-        
+
         # initialized enery-item
         items = []
         
@@ -71,19 +73,10 @@ class PINN_Burgers_1d_PBC(energy.NonlinearEnergy):
         items.append(obj_val_lb.detach())
         items.append(obj_val_rb.detach())
         
-        # evaluation on domain quadpts
-        quadpts = self.quadpts.requires_grad_()
-        obj_val = obj_func(quadpts)
-        items.append(obj_val.detach())
-        
-        # get gradient evaluated on all quadpts
-        f = obj_val.sum()
-        gradient = torch.autograd.grad(outputs=f, inputs=quadpts) #, create_graph=True)
-        obj_grad_data = gradient[0].detach()
-        items.append(obj_grad_data.detach())
-
-        # reset self.quadpts
-        self.quadpts = self.quadpts.detach()
+        # value and gradient evaluated on all quadpts
+        obj_items = energy.get_derivatives(obj_func, self.quadpts, 1)
+        items.append(obj_items[0])
+        items.append(obj_items[1])
         
         return items
     
@@ -118,7 +111,7 @@ class PINN_Burgers_1d_PBC(energy.NonlinearEnergy):
         """
         
         # get enery items
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         
         # interior residual
         u_val = items[2]
@@ -195,13 +188,17 @@ class PINN_Burgers_1d_PBC(energy.NonlinearEnergy):
         return (G, J)
     
     
+    def get_core_points(self):
+        return (self.quadpts, self.boundary)
+    
+    
     def evaluate(self, param):
         """
         Evaluation of the gradient of loss function
         """
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_lb = items[0]
         u_rb = items[1]
         u = items[2]
@@ -252,4 +249,5 @@ class PINN_Burgers_1d_PBC(energy.NonlinearEnergy):
         
         
     def update_solution(self, solution):
-        self.pre_solution = solution
\ No newline at end of file
+        self.pre_solution = solution
+        self.pre_items = self._get_energy_items(solution)
\ No newline at end of file
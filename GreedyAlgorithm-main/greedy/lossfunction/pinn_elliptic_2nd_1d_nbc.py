@@ -49,38 +49,29 @@ class PINN_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            activated_rows_in, activated_rows_bd: The activated rows of the 
+                            selected elements, which get_stiffmat_border 
+                            appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.activated_rows_in = energy.ActivatedRows(self.sigma, self.dsigma, self.weights, (0,2))
+        self.activated_rows_bd = energy.ActivatedRows(self.sigma, self.dsigma, None, (1,))
         
         
     def _get_energy_items(self, obj_func):
-        
-        # gradient evaluation on quadpts
-        quadpts = self.quadpts.requires_grad_()
-        obj_val = obj_func(quadpts)
-        obj_val_data = obj_val.detach()
-        
-        # get gradient evaluated on all quadpts
-        f = obj_val.sum()
-        gradient = torch.autograd.grad(outputs=f, inputs=quadpts, create_graph=True)
-        obj_grad_data = gradient[0].detach()
 
-        # get second-order derivatives evaluated on all quadpts
-        df = gradient[0].sum()
-        hessian = torch.autograd.grad(outputs=df, inputs=quadpts)
-        obj_hess_data = hessian[0].detach()
+        # value, gradient and second-order derivative on all quadpts
+        items = energy.get_derivatives(obj_func, self.quadpts, 2)
+        obj_val_data = items[0]
+        obj_grad_data = items[1]
+        obj_hess_data = items[2][:,0,0:1]
         
         # gradient evaluation on boundary nodes
-        boundary = self.boundary.requires_grad_()
-        obj_val_bd = obj_func(boundary)
-        f_bd = obj_val_bd.sum()
-        n_trace = torch.autograd.grad(outputs=f_bd, inputs=boundary)
-        obj_grad_bdata = n_trace[0].detach()
-        
-        # clear autograd graph
-        self.quadpts = self.quadpts.detach()
-        self.boundary = self.boundary.detach()
+        items_bd = energy.get_derivatives(obj_func, self.boundary, 1)
+        obj_grad_bdata = items_bd[1]
         
         return (obj_grad_bdata, obj_val_data, obj_grad_data, obj_hess_data)
     
@@ -128,7 +119,7 @@ class PINN_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
         """
         
         # get bilinear forms
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         
         # inner residual
         val = items[1]
@@ -181,12 +172,54 @@ class PINN_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
             torch.mm(g1, f) * self.area + torch.mm(dg_bd, gN) * self.penalty
          
         return (Gk, bk)
+    
+    
+    def get_stiffmat_border(self, parameters, core_in, core_bd):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core_in: a core matrix generated outside this energy class
+            core_bd: a core matrix generated outside this energy class
+        """
+        
+        # get components of parameters, in a column
+        w = parameters[:,0:1]
+        v = w * w
+        
+        # stored rows of all elements, only the newest one is activated
+        (g2, d2g2), (g1, d2g1) = self.activated_rows_in.update(parameters, core_in)
+        (dg_bd,), (dg1_bd,) = self.activated_rows_bd.update(parameters, core_bd)
+        
+        # assemble the border of stiffness matrix
+        G1 = torch.mm(g2, g1.t()) * self.area
+        G2 = torch.mm(g2, d2g1.t()) * v[-1:,:] * self.area
+        G3 = torch.mm(d2g2, g1.t()) * v * self.area
+        G4 = torch.mm(d2g2, d2g1.t()) * v * v[-1:,:] * self.area
+        G5 = torch.mm(dg_bd, dg1_bd.t()) * w * w[-1:,:] * self.penalty
+        Gk = G1 - G2 - G3 + G4 + G5
+        
+        # assemble the newest entry of load vector
+        gN = self.trace
+        f = self.source_data * self.weights
+        bk = torch.mm(-d2g1, f) * v[-1:,:] * self.area + \
+            torch.mm(g1, f) * self.area + torch.mm(dg1_bd, gN) * self.penalty
+         
+        return (Gk, bk)
+    
+    
+    def get_core_points(self):
+        return (self.quadpts, self.boundary)
         
         
     def evaluate(self, param):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_trace = items[0]
         u_val = items[1]
         u_hess = items[3]
@@ -226,6 +259,7 @@ class PINN_Elliptic_2nd_1d_NBC(energy.LinearEnergy):
     
     def update_solution(self, pre_solution):
         self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
         
         
         
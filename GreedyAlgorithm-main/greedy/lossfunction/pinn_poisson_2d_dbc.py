@@ -52,13 +52,20 @@ class PINN_Poisson_2d_DBC(energy.LinearEnergy):
             pre_solution: The evaluation of target function at pre_solution 
                           determines the parameters of the next neuron. The 
                           pre_solution is initialized by zero function.
+            pre_items: The energy items of pre_solution, which are evaluated
+                       once in update_solution and reused by evaluate.
+            activated_rows_in, activated_rows_bd: The activated rows of the 
+                            selected elements, which get_stiffmat_border 
+                            appends step by step.
         """ 
-        self.pre_solution = self._zero
+        self.update_solution(self._zero)
         self.parallel_evaluation = parallel_evaluation
+        self.activated_rows_in = energy.ActivatedRows(self.sigma, self.dsigma, self.weights_in, (2,))
+        self.activated_rows_bd = energy.ActivatedRows(self.sigma, self.dsigma, self.weights_bd, (0,))
         
         
     def _get_energy_items(self, obj_func):
-        
+
         # initialized enery-item
         items = []
         
@@ -66,29 +73,11 @@ class PINN_Poisson_2d_DBC(energy.LinearEnergy):
         obj_val_bdata = obj_func(self.quadpts_bd)
         items.append(obj_val_bdata.detach())
         
-        # evaluation on domain quadpts
-        xpts = self.quadpts_in[...,0:1].requires_grad_()
-        ypts = self.quadpts_in[...,1:2].requires_grad_()
-        quadpts = torch.cat([xpts,ypts],dim=1)
-        obj_val = obj_func(quadpts)
-        items.append(obj_val.detach())
-        
-        # get gradient evaluated on domain quadpts
-        f = obj_val.sum()
-        gradient_x = torch.autograd.grad(outputs=f, inputs=xpts, create_graph=True)
-        gradient_y = torch.autograd.grad(outputs=f, inputs=ypts, create_graph=True)
-        
-        # get Laplacian evaluated on domain quadpts
-        dxf = gradient_x[0].sum()
-        dyf = gradient_y[0].sum()
-        hessian_xx = torch.autograd.grad(outputs=dxf, inputs=xpts, create_graph=True)
-        hessian_yy = torch.autograd.grad(outputs=dyf, inputs=ypts)
-        items.append(hessian_xx[0].detach())
-        items.append(hessian_yy[0].detach())
-        
-        # clear autograd graph
-        self.quadpts_in = self.quadpts_in.detach()
-        self.quadpts_bd = self.quadpts_bd.detach()
+        # value and Laplacian evaluated on domain quadpts
+        obj_items = energy.get_derivatives(obj_func, self.quadpts_in, 2)
+        items.append(obj_items[0])
+        items.append(obj_items[2][:,0,0:1])
+        items.append(obj_items[2][:,1,1:2])
         
         return items
     
@@ -97,11 +86,6 @@ class PINN_Poisson_2d_DBC(energy.LinearEnergy):
         return self.pde.solution(p) - self.pre_solution(p)
     
     
-    def _partition(self, num_param, n):
-        division = len(num_param) / n
-        return [0]+[round(division * (i + 1)) for i in range(n)]
-    
-    
     def _energy_norm(self, obj_func): 
         
         """
@@ -143,7 +127,7 @@ class PINN_Poisson_2d_DBC(energy.LinearEnergy):
         """
         
         # get bilinear forms
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         
         # interior residual
         u_lap = items[2] + items[3]
@@ -196,10 +180,53 @@ class PINN_Poisson_2d_DBC(energy.LinearEnergy):
         return (Gk, bk)
     
     
+    def get_stiffmat_border(self, parameters, core_in, core_bd):
+        
+        """
+        Assemble the last column of the stiffmatrix and the last entry of
+        the load vector, i.e., only the bilinear forms between the newest 
+        element (in the last row) and all the elements
+
+        Args:
+            parameters: a set of parameters (w,b)
+            core_in: a core matrix generated outside this energy class
+            core_bd: a core matrix generated outside this energy class
+        """
+        
+        # get components of parameters, in a column
+        w1 = parameters[:,0:1]
+        w2 = parameters[:,1:2]
+        v11 = w1 * w1
+        v22 = w2 * w2
+        
+        # stored rows of all elements, only the newest one is activated
+        (g2_bd,), (g1_bd,) = self.activated_rows_bd.update(parameters, core_bd)
+        (d2g2_in,), (d2g1_in,) = self.activated_rows_in.update(parameters, core_in)
+        
+        # assemble the border of stiffness matrix
+        coef = v11 * v11[-1:,:] + v22 * v22[-1:,:] + \
+                v11 * v22[-1:,:] + v22 * v11[-1:,:]
+        d2G = torch.mm(d2g2_in, d2g1_in.t()) * coef * self.area_in
+        G_bd = torch.mm(g2_bd, g1_bd.t()) * self.area_bd * self.penalty
+        Gk = d2G + G_bd 
+        
+        # assemble the newest entry of load vector
+        gD = self.trace * self.weights_bd 
+        f = self.source_data * self.weights_in
+        bk = -torch.mm(d2g1_in, f) * (v11+v22)[-1:,:] * self.area_in + \
+            torch.mm(g1_bd, gD) * self.area_bd * self.penalty
+        
+        return (Gk, bk)
+    
+    
+    def get_core_points(self):
+        return (self.quadpts_in, self.quadpts_bd)
+    
+    
     def evaluate(self, param):
         
         # get items of the energy bilinear form, denote pre_solution := u
-        items = self._get_energy_items(self.pre_solution)
+        items = self.pre_items
         u_trace = items[0]
         u_lap = items[2] + items[3]
          
@@ -227,48 +254,15 @@ class PINN_Poisson_2d_DBC(energy.LinearEnergy):
     
     
     def evaluate_large_scale(self, param):
-        
-        if self.qtype == "MC":
-            return self.evaluate(param)
-
-        else:
-            # get items of the energy bilinear form, denote pre_solution := u
-            items = self._get_energy_items(self.pre_solution)
-            u_trace = items[0]
-            u_lap = items[2] + items[3]
-            
-            # get components of theta
-            w1 = param[0]
-            w2 = param[1]
-            v11 = w1 * w1
-            v22 = w2 * w2
-            A = torch.cat([param[0], param[1]], dim=1)
-            ones_in = torch.ones(len(self.quadpts_in),1).to(self.device)
-            B_in = torch.cat([self.quadpts_in, ones_in], dim=1).t()  
-            ones_bd = torch.ones(len(self.quadpts_bd),1).to(self.device)
-            B_bd = torch.cat([self.quadpts_bd, ones_bd], dim=1).t()  
-            
-            # core matrix and vectors used for vecterization
-            num_param = A.shape[0]
-            residual_in = torch.zeros(num_param,1)
-            residual_bd = torch.zeros(num_param,1)
-            
-            num_batch = 2
-            division = self._partition(range(num_param),num_batch)
-            for i in range(num_batch):
-                core_in = torch.mm(A[division[i]:division[i+1],:], B_in)
-                core_bd = torch.mm(A[division[i]:division[i+1],:], B_bd)
-                g_bd = self.sigma(core_bd)
-                d2g_in = self.dsigma(core_in, 2)
-                residual_in[division[i]:division[i+1]] = torch.mm(d2g_in, (u_lap+self.source_data)*self.weights_in) * \
-                        (v11[division[i]:division[i+1]] + v22[division[i]:division[i+1]])
-                residual_bd[division[i]:division[i+1]] = torch.mm(g_bd, (u_trace-self.trace)*self.weights_bd) * self.penalty
-            
-            # assemble
-            energy_eval = -(1/2)*(residual_in*self.area_in + residual_bd*self.area_bd).pow(2)
-                
-            return energy_eval
+        """
+        The large scale evaluation of 2D problem, for evaluation
+        in the multiple-parameter situation. The dictionaries scan
+        the param-mesh in chunks of their scan_memory, so all the
+        given parameters are evaluated at once.
+        """
+        return self.evaluate(param)
     
     
     def update_solution(self, pre_solution):
-        self.pre_solution = pre_solution
\ No newline at end of file
+        self.pre_solution = pre_solution
+        self.pre_items = self._get_energy_items(pre_solution)
\ No newline at end of file
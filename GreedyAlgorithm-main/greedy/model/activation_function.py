@@ -1,11 +1,23 @@
+import math
 import torch
-import numpy as np
 import torch.nn.functional as F
 
 ## =====================================
 ## general activations
 ## tensor
 
+def _relu_power(p, k):
+    # relu(p)^k, with relu(p)^0 being the Heaviside function
+    if k == 0:
+        return (p > 0).to(p.dtype)
+    return F.relu(p).pow(k)
+
+def _scale(val, coefficient):
+    # skip the multiplication by one
+    if coefficient == 1:
+        return val
+    return coefficient * val
+
 class ActivationFunction():
 
     class ReluPower():
@@ -16,110 +28,209 @@ class ActivationFunction():
         def __init__(self, degree):
             super().__init__()
             self.degree = degree
+            # falling factorials k!/(k-m)! of the m-th derivatives
+            self.coefficient = [float(math.perm(degree, m)) for m in range(degree+1)]
 
         def relu(self, p):
             val = F.relu(p).pow(self.degree)
             return val
 
         def relu_derivative(self, p, m):
-            coefficient = np.math.factorial(self.degree) / np.math.factorial(self.degree-m)
-            val = coefficient * F.relu(p).pow(self.degree-m)
+            if m > self.degree:
+                return torch.zeros_like(p)
+            val = _scale(_relu_power(p, self.degree-m), self.coefficient[m])
             return val
 
+        def relu_pieces(self, m):
+            # sigma^(m)(p) = k!/(k-m)! * relu(p)^(k-m)
+            if m > self.degree:
+                return []
+            return [(self.coefficient[m], 0., 1, self.degree-m)]
+
+        def relu_derivatives(self, p, orders):
+            # relu(p) is evaluated once for all the orders
+            r = F.relu(p)
+            vals = []
+            for m in orders:
+                k = self.degree - m
+                if k < 0:
+                    vals.append(torch.zeros_like(p))
+                    continue
+                elif k == 0:
+                    val = (p > 0).to(p.dtype)
+                elif k == 1:
+                    val = r
+                else:
+                    val = r.pow(k)
+                vals.append(_scale(val, self.coefficient[m]))
+            return vals
+
     class Bspline():
         """
-            bspline basis function with deg=degree, 
+            bspline basis function with deg=degree,
             when degree=1,  bspline is hat.
         """
 
         def __init__(self, degree):
             super().__init__()
             self.degree = degree
-            self.weight = torch.zeros(degree+2)
-            for i in range(degree+2):
-                weight = 1
-                for j in range(degree+2):
-                    if j != i:
-                        weight *= 1/(i-j)
-                self.weight[i] = weight
+            # weight_i = prod_{j != i} 1/(i-j) on the knots 0, ..., degree+1
+            n = degree + 2
+            self.weight = [(-1)**(n-1-i) / (math.factorial(i) * math.factorial(n-1-i)) for i in range(n)]
+            # coefficients of relu(i-p)^(degree-m) in the m-th derivative
+            self.coefficient = [[(degree+1) * w * (-1)**m * math.perm(degree, m) for w in self.weight]
+                                    for m in range(degree+1)]
 
         def bspline(self, p):
-            val = 0 
-            for i in range(len(self.weight)):
-                val += self.weight[i] * F.relu(i - p).pow(self.degree)
-            val *= (self.degree+1)
-            return val
+            return self.bspline_derivative(p, 0)
 
         def bspline_derivative(self, p, m):
-            val = 0 
-            coefficient = np.math.factorial(self.degree) / np.math.factorial(self.degree-m)
+            return self.bspline_derivatives(p, (m,))[0]
+
+        def bspline_pieces(self, m):
+            # sigma^(m)(p) = sum_i coefficient_i * relu(i-p)^(k-m)
+            if m > self.degree:
+                return []
+            return [(c, float(i), -1, self.degree-m) for i, c in enumerate(self.coefficient[m])]
+
+        def bspline_derivatives(self, p, orders):
+            # relu(i-p) is evaluated once for all the orders
+            vals = [torch.zeros_like(p) for _ in orders]
             for i in range(len(self.weight)):
-                val += self.weight[i] * F.relu(i - p).pow(self.degree-m) * (-1)**m * coefficient
-            val *= (self.degree+1)
-            return val
+                r = F.relu(i - p)
+                for val, m in zip(vals, orders):
+                    k = self.degree - m
+                    if k < 0:
+                        continue
+                    elif k == 0:
+                        term = (r > 0).to(p.dtype)
+                    elif k == 1:
+                        term = r
+                    else:
+                        term = r.pow(k)
+                    val.add_(term, alpha=self.coefficient[m][i])
+            return vals
 
     class Sigmoid():
         """
             sigmoidal function and derivatives.
         """
-        
+
         def __init__(self):
             pass
 
         def sigmoid(self, p):
-            val = 1 / (1 + torch.exp(-p))
+            val = torch.sigmoid(p)
             return val
 
         def sigmoid_derivative(self, p, m):
 
-            assert (m >= 1) & (m <= 3) 
+            assert (m >= 1) & (m <= 3)
+            return self.sigmoid_derivatives(p, (m,))[0]
 
-            def dsigmoid(p):
-                val = torch.exp(-p) / (torch.exp(-p) + 1).pow(2)
-                return val
+        def sigmoid_derivatives(self, p, orders):
 
-            def d2sigmoid(p):
-                val = (2*torch.exp(-2*p)) / (torch.exp(-p) + 1).pow(3) - \
-                    torch.exp(-p) / (torch.exp(-p) + 1).pow(2)
-                return val
-
-            def d3sigmoid(p):
-                val = torch.exp(-p) / (torch.exp(-p) + 1).pow(2) - \
-                    (6*torch.exp(-2*p)) / (torch.exp(-p) + 1).pow(3) + \
-                    (6*torch.exp(-3*p)) / (torch.exp(-p) + 1).pow(4)
-                return val
+            assert all((m >= 0) & (m <= 3) for m in orders)
 
+            # all the derivatives are polynomials of s = sigmoid(p)
+            s = torch.sigmoid(p)
+            ds = s * (1 - s)
             val_list = {
-                1: dsigmoid,
-                2: d2sigmoid,
-                3: d3sigmoid
+                0: lambda: s,
+                1: lambda: ds,
+                2: lambda: ds * (1 - 2*s),
+                3: lambda: ds * (1 - 6*ds)
             }
-            val = val_list[m](p)
-            return val
+            return [val_list[m]() for m in orders]
 
 
-    def __init__(self, ftype, *args) -> None:
+    def __init__(self, ftype, *args, compile=False) -> None:
+        """
+        INPUT:
+            ftype: "relu", "bspline" or "sigmoid".
+            args: the degree of relu and bspline.
+            compile: option for torch.compile of the implementations,
+                     which falls back to eager mode if not available.
+        """
         super().__init__()
         self.ftype = ftype
         self.degree = 0
         if self.ftype != "sigmoid":
             for arg in args:
                 self.degree = arg
-        
+        self.compile = compile
+        self._bind()
+
+    def _bind(self):
+
+        # the implementation is constructed once, with its coefficients
+        if self.ftype == "relu":
+            impl = self.ReluPower(self.degree)
+            funcs = (impl.relu, impl.relu_derivative, impl.relu_derivatives)
+            self._pieces = impl.relu_pieces
+        elif self.ftype == "bspline":
+            impl = self.Bspline(self.degree)
+            funcs = (impl.bspline, impl.bspline_derivative, impl.bspline_derivatives)
+            self._pieces = impl.bspline_pieces
+        elif self.ftype == "sigmoid":
+            impl = self.Sigmoid()
+            funcs = (impl.sigmoid, impl.sigmoid_derivative, impl.sigmoid_derivatives)
+            self._pieces = None
+        else:
+            raise RuntimeError("Such activation is not supported.")
+
+        # optionally compiled implementations
+        if self.compile:
+            if hasattr(torch, 'compile'):
+                funcs = tuple(torch.compile(func, dynamic=True) for func in funcs)
+            else:
+                print(' torch.compile is not available, use the eager mode.')
+        self._activate, self._dactivate, self._derivatives = funcs
+
+    def __getstate__(self):
+        # compiled functions are not picklable, rebind them after loading
+        state = self.__dict__.copy()
+        for key in ('_activate', '_dactivate', '_derivatives', '_pieces'):
+            state.pop(key, None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._bind()
+
     def activate(self, p):
-        val_list = {
-            "relu": self.ReluPower(self.degree).relu,
-            "bspline": self.Bspline(self.degree).bspline,
-            "sigmoid": self.Sigmoid().sigmoid
-        }
-        val = val_list[self.ftype](p)
-        return val
+        return self._activate(p)
 
     def dactivate(self, p, m):
-        val_list = {
-            "relu": self.ReluPower(self.degree).relu_derivative,
-            "bspline": self.Bspline(self.degree).bspline_derivative,
-            "sigmoid": self.Sigmoid().sigmoid_derivative
-        }
-        val = val_list[self.ftype](p, m)
-        return val
\ No newline at end of file
+        if m == 0:
+            return self._activate(p)
+        return self._dactivate(p, m)
+
+    def derivatives(self, p, orders):
+        """
+        The fused evaluation of sigma^(m)(p) for all m in orders, which
+        shares the common work, e.g., relu(p), in one pass over p.
+        """
+        return self._derivatives(p, tuple(orders))
+
+    def piecewise_polynomial(self, m):
+        """
+        The pieces (c, t, side, j) of a piecewise polynomial activation,
+                sigma^(m)(p) = sum c * relu(side*(p-t))^j,
+        where relu(.)^0 is the Heaviside function. So each piece is
+        supported on p > t (side=1) or p < t (side=-1). None if the
+        activation is not piecewise polynomial, e.g., sigmoid.
+        """
+        if self._pieces is None:
+            return None
+        return self._pieces(m)
+
+    def kinks(self):
+        """
+        The sorted kink locations t of a piecewise polynomial activation,
+        i.e., the neuron sigma(w*x+b) has kinks on w*x + b = t. None if
+        the activation is smooth, e.g., sigmoid.
+        """
+        if self._pieces is None:
+            return None
+        return sorted(set(piece[1] for piece in self._pieces(0)))
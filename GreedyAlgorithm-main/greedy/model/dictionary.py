@@ -8,8 +8,37 @@ Created on Thur Feb 09 11:23 2023
 @modifications: to be added
 """
 
+import os
+import torch
+import inspect
+import multiprocessing as mp
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
 from abc import ABC, abstractmethod
 
+
+# the dictionary and the energy sent once to each process of the pool
+_worker_state = {}
+
+
+def _init_worker(dtype, dictionary, energy):
+    # the candidates are distributed over processes, so each
+    # process uses a single thread for its own tensor operations
+    torch.set_num_threads(1)
+    torch.set_default_dtype(dtype)
+    _worker_state['dictionary'] = dictionary
+    _worker_state['energy'] = energy
+
+
+def _train_in_worker(evaluate, solution_items, theta, opt_type):
+    # the energy of the current solution, by its items of this step
+    energy = _worker_state['energy']
+    for key, value in solution_items.items():
+        setattr(energy, key, value)
+    pde_energy = getattr(energy, evaluate)
+    return _worker_state['dictionary']._train_element(pde_energy, theta, opt_type)
+
+
 ##=============================================##
 #            an abstract basic class            #
 ##=============================================##
@@ -25,6 +54,10 @@ class AbstractDictionary(ABC):
     def _select_initial_elements(self, pde_energy):
         pass
     
+    @abstractmethod
+    def _train_element(self, pde_energy, theta, opt_type):
+        pass
+    
     @abstractmethod
     def _argmax_optimize(self, pde_energy, opt_type):
         pass
@@ -32,4 +65,381 @@ class AbstractDictionary(ABC):
     @abstractmethod
     def find_optimal_element(self):
         pass
-    
\ No newline at end of file
+    
+    def _get_executor(self, energy):
+        """ 
+        mark: the process pool of parallel_search, which is started once
+              for each energy and reused in all the following greedy steps.
+              parallel_search is either True (all cpu cores) or the number 
+              of processes. The dictionary and the energy are sent to each
+              process once when it starts, then each step only sends the
+              items of the current solution, see _argmax_optimize_par.
+        """
+        if getattr(self, '_executor', None) is not None and self._executor_energy is not energy:
+            self._executor.shutdown()
+            self._executor = None
+        if getattr(self, '_executor', None) is None:
+            if self.parallel_search is True:
+                self.num_workers = os.cpu_count()
+            else:
+                self.num_workers = int(self.parallel_search)
+            self._executor = ProcessPoolExecutor(max_workers=self.num_workers,
+                                                 mp_context=mp.get_context("spawn"),
+                                                 initializer=_init_worker,
+                                                 initargs=(torch.get_default_dtype(), self, energy))
+            self._executor_energy = energy
+        return self._executor
+    
+    def _get_solution_items(self, energy):
+        
+        # the attributes of energy set by update_solution, which change in
+        # each step, but pre_solution itself is not used by the evaluation
+        return {key: value for key, value in vars(energy).items() 
+                    if key.startswith('pre_') and key != 'pre_solution'}
+    
+    def _check_scan_options(self):
+        """ 
+        mark: each of scan_dtype, fft_scan, search_levels, incremental_scan
+              and sketch_quadrature selects its own scan, so at most one of
+              them can be set, since the scans do not compose, e.g., the FFT
+              scan needs the whole bias grid of each direction, which the
+              multilevel search never scans, and the bounds of the incremental
+              scan need the exact scores of the whole mesh.
+        """
+        options = {'scan_dtype': getattr(self, 'scan_dtype', None) is not None,
+                   'fft_scan': bool(getattr(self, 'fft_scan', False)),
+                   'search_levels': getattr(self, 'search_levels', 0) > 0,
+                   'incremental_scan': bool(getattr(self, 'incremental_scan', 0)),
+                   'sketch_quadrature': getattr(self, 'sketch_quadrature', None) is not None}
+        chosen = [name for name, value in options.items() if value]
+        if len(chosen) > 1:
+            raise ValueError("The scan options {} cannot be combined, set at most one of them.".format(
+                             ', '.join(chosen)))
+    
+    def _select_low_precision(self, energy, select, best_k, evaluate="evaluate"):
+        """ 
+        mark: scan by select(pde_energy, k) with the products of the energy
+              in self.scan_dtype (e.g., torch.float32, or torch.bfloat16 on 
+              cpu), which only rank the candidates, then rescore the top 
+              rescore_k candidates in the default dtype and keep the top 
+              best_k ones. The dtype is passed to each energy evaluation, so
+              neither the energy nor the default dtype is changed. With the
+              largest relative error rho of the rescored scores q = -loss,
+              the candidates beyond them score at most q_K/(1 - rho), where
+              q_K is the lowest rescored score of the scan, so the scan is 
+              kept if the best_k-th rescored score is above this bound. 
+              Otherwise, e.g., once the residual is at the round-off level 
+              of scan_dtype, None is returned and this step scans in the 
+              default dtype.
+        """
+        pde_energy = getattr(energy, evaluate)
+        if 'dtype' not in inspect.signature(pde_energy).parameters:
+            raise ValueError("The scan in low precision is not supported by {}.".format(type(energy).__name__))
+        scan_energy = lambda param: pde_energy(param, dtype=self.scan_dtype)
+        num_scan = max(best_k, self.rescore_k)
+        theta_list = select(scan_energy, num_scan)
+        with torch.no_grad():
+            param = self._polar_to_cartesian(theta_list.t())
+            scan_score = -scan_energy(param).reshape(-1)
+            score = -pde_energy(param).reshape(-1)
+        
+        # the relative error of the scan, and the bound of the other candidates
+        k = min(best_k, score.shape[0])
+        top_score, index = torch.topk(score, k)
+        tiny = torch.finfo(score.dtype).tiny
+        error = ((scan_score - score).abs() / score.clamp(min=tiny)).max()
+        reliable = theta_list.shape[0] < num_scan or \
+                   (error < 1 and top_score[-1] * (1 - error) > scan_score.min())
+        if not reliable:
+            self.num_fallbacks = getattr(self, 'num_fallbacks', 0) + 1
+            print(' The scan in {} is not reliable, use the default dtype in this step.'.format(self.scan_dtype))
+            return None
+        
+        self.num_low_precision_scans = getattr(self, 'num_low_precision_scans', 0) + 1
+        return theta_list[index, :]
+    
+    def _select_multilevel(self, pde_energy, best_k, chunk_size):
+        """ 
+        mark: the coarse-to-fine search of the param-mesh, in the indices of 
+              its axes. The mesh of stride 2^search_levels is scanned first,
+              then around each of the top search_keep candidates, the points 
+              of half the stride within half the stride, i.e., its cell of the
+              coarser mesh, are scanned, down to stride 1. So the candidates 
+              are those of the param-mesh, and the best one is found once it 
+              is in the kept cells of all levels, i.e., the coarsest mesh has
+              to resolve the scores. Each level scores about search_keep*3^d 
+              candidates, d being the number of axes. With comm, the 
+              candidates of each level are split over the ranks.
+        """
+        axes = self._gather_param_axes()
+        dim = len(axes)
+        shape = torch.tensor([len(axis) for axis in axes]).to(self.device)
+        stride = 2 ** self.search_levels
+        keep = max(best_k, self.search_keep)
+        
+        # the coarse mesh, with the last point of each axis
+        coarse = [torch.unique(torch.cat([torch.arange(0, n, stride), torch.tensor([n-1])])) 
+                    for n in shape.tolist()]
+        index = torch.cartesian_prod(*coarse).reshape(-1, dim).to(self.device)
+        index = self._select_indices(pde_energy, axes, index, keep if stride > 1 else best_k, chunk_size)
+        
+        # refine the kept cells level by level
+        while stride > 1:
+            stride //= 2
+            offsets = torch.cartesian_prod(*[torch.arange(-1, 2) * stride] * dim).reshape(-1, dim)
+            index = (index.unsqueeze(1) + offsets.to(index).unsqueeze(0)).reshape(-1, dim)
+            index = torch.unique(torch.minimum(index.clamp(min=0), shape-1), dim=0)
+            index = self._select_indices(pde_energy, axes, index, keep if stride > 1 else best_k, chunk_size)
+        
+        return torch.stack([axis[index[:,i]] for i, axis in enumerate(axes)], dim=1)
+    
+    def _select_indices(self, pde_energy, axes, index, k, chunk_size):
+        
+        # with MPI, each rank only scores its own slice of the indices
+        if getattr(self, 'comm', None) is not None:
+            rank, size = self.comm.Get_rank(), self.comm.Get_size()
+            index = index[index.shape[0]*rank // size:index.shape[0]*(rank+1) // size]
+        
+        # the top k of the param-mesh points at index, chunk by chunk
+        loss = [torch.zeros(0).to(self.device)]
+        with torch.no_grad():
+            for start in range(0, index.shape[0], chunk_size):
+                sub = index[start:start+chunk_size]
+                theta = tuple(axis[sub[:,i]] for i, axis in enumerate(axes))
+                loss.append(pde_energy(self._polar_to_cartesian(theta)).reshape(-1))
+        loss = torch.cat(loss)
+        top = torch.topk(loss, min(k, loss.shape[0]), largest=False).indices
+        return self._gather_top(loss[top], index[top], k)
+    
+    def _select_fft(self, energy, select, best_k, evaluate="evaluate"):
+        """ 
+        mark: scan by select(pde_energy, k) with the FFT products over the
+              bias grid of each direction (see energy._fft_products), which
+              are approximate, then rescore the top rescore_k candidates and
+              keep the top best_k ones. The options are passed to the energy
+              evaluation in each call, so the scans of other threads and 
+              processes are not affected.
+        """
+        pde_energy = getattr(energy, evaluate)
+        if 'fft' not in inspect.signature(pde_energy).parameters:
+            raise ValueError("The FFT scan is not supported by {}.".format(type(energy).__name__))
+        fft = {'oversample': 8 if self.fft_scan is True else int(self.fft_scan)}
+        theta_list = select(lambda param: pde_energy(param, fft=fft), max(best_k, self.rescore_k))
+        with torch.no_grad():
+            loss = getattr(energy, evaluate)(self._polar_to_cartesian(theta_list.t())).reshape(-1)
+        
+        k = min(best_k, loss.shape[0])
+        index = torch.topk(loss, k, largest=False).indices
+        return theta_list[index, :]
+    
+    def _get_sketch_energy(self, energy):
+        """
+        mark: the energy on sketch_quadrature, e.g., a coarser Gauss rule
+              of GaussLegendreDomain on the same domain, which is built once
+              for each energy by energy.with_quadrature, so its data, e.g.,
+              the source, are evaluated on the sketch points, and it keeps
+              the options of energy, e.g., sparse_evaluation and
+              activation_bank. Its pre_solution follows that of energy in
+              each step.
+        """
+        if getattr(self, '_sketch_owner', None) is not energy:
+            if not hasattr(energy, 'with_quadrature'):
+                raise RuntimeError("The sketch scan needs an energy with with_quadrature.")
+            self._sketch_energy = energy.with_quadrature(self.sketch_quadrature)
+            self._sketch_owner = energy
+        self._sketch_energy.update_solution(energy.pre_solution)
+        return self._sketch_energy
+
+    def _select_sketch(self, energy, sketch, select, best_k, evaluate="evaluate"):
+        """
+        mark: scan by select(pde_energy, k) with the sketch energy, then 
+              rescore the top rescore_k candidates with energy and keep the 
+              top best_k ones. The scan is faster by the ratio of the numbers
+              of quadrature points.
+        """
+        theta_list = select(getattr(sketch, evaluate), max(best_k, self.rescore_k))
+        with torch.no_grad():
+            loss = getattr(energy, evaluate)(self._polar_to_cartesian(theta_list.t())).reshape(-1)
+
+        k = min(best_k, loss.shape[0])
+        index = torch.topk(loss, k, largest=False).indices
+        return theta_list[index, :]
+
+    def set_galerkin_state(self, coef, stiffmat):
+        """
+        mark: the coefficients of the current solution u = sum c_j*g_j in
+              the selected elements, and their stiffness matrix, which OGA
+              sets before each selection. They give the energy norm of the
+              change of u between steps for the incremental scan.
+        """
+        self._galerkin = (coef.detach().reshape(-1), stiffmat.detach())
+
+    def _gather_top(self, loss, theta, k):
+
+        # the top k of the rows of theta, which are reduced over the ranks
+        if getattr(self, 'comm', None) is not None:
+            candidates = self.comm.allgather((loss, theta))
+            loss = torch.cat([candidate[0] for candidate in candidates], dim=0)
+            theta = torch.cat([candidate[1] for candidate in candidates], dim=0)
+        index = torch.topk(loss, min(k, loss.shape[0]), largest=False).indices
+        return theta[index, :]
+
+    def _get_element_norms(self, energy, theta):
+
+        # the energy norms of the scanned elements do not change over the
+        # steps, so they are evaluated once for each energy
+        if getattr(self, '_norm_owner', None) is not energy:
+            with torch.no_grad():
+                norm = energy.evaluate_norms(self._polar_to_cartesian(theta.t()))
+            self._element_norms = torch.sqrt(norm.reshape(-1).clamp(min=0))
+            self._norm_owner = energy
+        return self._element_norms
+
+    def _select_incremental(self, energy, best_k, chunk_size, evaluate="evaluate"):
+        """
+        mark: the incremental scan between greedy steps. The score of g is
+              |r(g)| = sqrt(-2*loss), where r(g) = a(u,g) - f(g), so between
+              the full scan of the solution u_s and the current u_k,
+                    |r_k(g) - r_s(g)| = |a(u_k - u_s, g)| <= D*||g||_a,
+              where D = ||u_k - u_s||_a is given by the change of the
+              coefficients and the stiffness matrix of set_galerkin_state.
+              The candidates are rescored in the descending order of their
+              upper bounds |r_s(g)| + D*||g||_a, frontier_k at a time, until
+              the bound of the next ones is below the best_k-th score, so the
+              skipped candidates cannot be selected and the selection is that
+              of the full scan. A full scan is taken after incremental_scan
+              steps, or once the bounds ask for more than half of the mesh,
+              or without the Galerkin state, e.g., in RGA. The bound holds
+              when evaluate and the stiffness matrix share the quadrature.
+        """
+        pde_energy = getattr(energy, evaluate)
+        scan = getattr(self, '_last_scan', None)
+        galerkin = getattr(self, '_galerkin', None)
+        if scan is not None and scan['coef'] is not None and galerkin is not None and \
+                scan['steps'] < self.incremental_scan and galerkin[0].shape[0] >= scan['coef'].shape[0]:
+            theta_list = self._select_bounded(energy, pde_energy, scan, galerkin, best_k)
+            if theta_list is not None:
+                scan['steps'] += 1
+                return theta_list
+
+        # the full scan, which keeps the scores of all the candidates
+        theta, loss = [], []
+        with torch.no_grad():
+            for tile in self._gather_param_tiles(chunk_size):
+                loss.append(pde_energy(self._polar_to_cartesian(tile)).reshape(-1))
+                theta.append(torch.stack(tile, dim=1))
+        theta, loss = torch.cat(theta, dim=0), torch.cat(loss)
+        self._last_scan = {'theta': theta,
+                           'residual': torch.sqrt(-2 * loss.clamp(max=0)),
+                           'coef': None if galerkin is None else galerkin[0].clone(),
+                           'steps': 1}
+        self.num_full_scans = getattr(self, 'num_full_scans', 0) + 1
+        return self._gather_top(loss, theta, best_k)
+
+    def _select_bounded(self, energy, pde_energy, scan, galerkin, best_k):
+
+        # the energy norm of the change of the solution since the full scan
+        coef, stiffmat = galerkin
+        change = coef.clone()
+        change[0:scan['coef'].shape[0]] -= scan['coef']
+        distance = torch.sqrt(torch.dot(change, torch.mv(stiffmat, change)).clamp(min=0))
+        bound = scan['residual'] + distance * self._get_element_norms(energy, scan['theta'])
+        order = torch.argsort(bound, descending=True)
+
+        # rescore in the order of the bounds, with the running top best_k
+        num_param = order.shape[0]
+        k = min(best_k, num_param)
+        best_loss = torch.zeros(0).to(bound)
+        best_index = torch.zeros(0, dtype=torch.long).to(order.device)
+        start, full = 0, False
+        with torch.no_grad():
+            while start < num_param:
+                if best_loss.shape[0] == k and bound[order[start]] < torch.sqrt(-2 * best_loss[-1].clamp(max=0)):
+                    break
+                if start > num_param // 2:
+                    full = True
+                    break
+                index = order[start:start+self.frontier_k]
+                loss = pde_energy(self._polar_to_cartesian(scan['theta'][index].t())).reshape(-1)
+                loss = torch.cat([best_loss, loss])
+                index = torch.cat([best_index, index])
+                best_loss, top = torch.topk(loss, min(k, loss.shape[0]), largest=False)
+                best_index = index[top]
+                start += self.frontier_k
+        
+        # all the ranks take the full scan, if one of them needs it
+        if getattr(self, 'comm', None) is not None:
+            full = any(self.comm.allgather(full))
+        if full:
+            return None
+        self.num_rescored = getattr(self, 'num_rescored', 0) + min(start, num_param)
+        return self._gather_top(best_loss, scan['theta'][best_index], best_k)
+
+    def state_dict(self):
+        """
+        mark: the state of the scans kept between greedy steps, saved in the
+              checkpoints of OGA, i.e., scan_dtype and the scores of the last
+              full scan of the incremental scan. The sketch energy, the norms
+              of the elements and the activation bank of the energy are 
+              caches, which are rebuilt in the resumed run and give the same 
+              scores, so they are not saved.
+        """
+        state = {'scan_dtype': getattr(self, 'scan_dtype', None)}
+        scan = getattr(self, '_last_scan', None)
+        if scan is not None:
+            state['last_scan'] = {'theta': scan['theta'].cpu(),
+                                  'residual': scan['residual'].cpu(),
+                                  'coef': None if scan['coef'] is None else scan['coef'].cpu(),
+                                  'steps': scan['steps'],
+                                  'num_full_scans': getattr(self, 'num_full_scans', 0)}
+        return state
+
+    def load_state_dict(self, state):
+        """
+        mark: restore the state of state_dict(), an empty state starts a
+              new run, e.g., without the last scan of a previous run.
+        """
+        if 'scan_dtype' in state and hasattr(self, 'scan_dtype'):
+            self.scan_dtype = state['scan_dtype']
+        self._galerkin = None
+        scan = state.get('last_scan')
+        if scan is None:
+            self._last_scan = None
+            return
+        device = self.device
+        self._last_scan = {'theta': scan['theta'].to(device),
+                           'residual': scan['residual'].to(device),
+                           'coef': None if scan['coef'] is None else scan['coef'].to(device),
+                           'steps': scan['steps']}
+        self.num_full_scans = scan['num_full_scans']
+
+    def __getstate__(self):
+        # the process pool stays in the main process
+        state = self.__dict__.copy()
+        state['_executor'] = None
+        state['_executor_energy'] = None
+        state['_sketch_energy'] = None
+        state['_sketch_owner'] = None
+        state['_element_norms'] = None
+        state['_norm_owner'] = None
+        return state
+    
+    def _argmax_optimize_par(self, pde_energy, theta_list, opt_type):
+        """ 
+        Train the candidates (rows of theta_list) by _train_element in the 
+        process pool, one chunk of candidates per process. pde_energy is a 
+        method of the energy, which is kept in the processes, so only the
+        items of the current solution are sent with each chunk.
+        """
+        energy = pde_energy.__self__
+        executor = self._get_executor(energy)
+        num_search = theta_list.shape[0]
+        chunksize = -(-num_search // self.num_workers)
+        results = executor.map(_train_in_worker,
+                               repeat(pde_energy.__name__, num_search),
+                               repeat(self._get_solution_items(energy), num_search),
+                               theta_list.detach(),
+                               repeat(opt_type, num_search),
+                               chunksize=chunksize)
+        theta_updated, evaluate_list = zip(*results)
+        return torch.stack(theta_updated), torch.stack(evaluate_list).reshape(-1,1)
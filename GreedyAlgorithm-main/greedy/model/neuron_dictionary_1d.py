@@ -6,6 +6,7 @@ import numpy as np
 
 from . import dictionary as dt
 from ..optimization import generator as gen
+from ..tools import profiler
 
 dtype = torch.float64
 torch.set_default_dtype(dtype)
@@ -21,7 +22,13 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
                 param_b_domain,
                 params_mesh_size,
                 device,
-                parallel_search=False):
+                parallel_search=False,
+                best_k=1,
+                scan_dtype=None,
+                rescore_k=256,
+                fft_scan=False,
+                incremental_scan=0,
+                frontier_k=1024):
 
         """
         The STANDARD general dictionary for shallow neural networks,
@@ -36,7 +43,29 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
             params_mesh_size: a dict object, 
                             len = param_dim.
             device: cpu or cuda.
-            parallel_search: option for parallel optimization.
+            parallel_search: option for parallel optimization, True for
+                        all cpu cores or the number of processes, 
+                        "batch" for training all the candidates in one 
+                        batched optimizer. The process pool is kept for
+                        all the greedy steps, see AbstractDictionary._get_executor.
+            best_k: the number of initial guesses to be optimized, only 
+                        used when self.optimizer is given.
+            scan_dtype: the dtype of the products of energy evaluations in 
+                        the scan, e.g., torch.float32, or torch.bfloat16 on cpu,
+                        for the energies whose evaluate takes a dtype. None for
+                        the default dtype. The training stays in the default dtype.
+            rescore_k: the number of top candidates of a low-precision or 
+                        FFT scan, which are rescored in the default dtype.
+            fft_scan: option for the FFT scan over the bias grid of each 
+                        direction, see energy._fft_products, True or the number
+                        of bins per bias step (8 for True).
+            incremental_scan: the largest number of greedy steps between
+                        full scans, in which only the candidates whose 
+                        bound of the score may reach the best ones are
+                        rescored, see AbstractDictionary._select_incremental.
+                        0 for a full scan in each step.
+            frontier_k: the number of candidates rescored at once by the
+                        incremental scan.
         """
         super(NeuronDictionary1D, self).__init__()
 
@@ -50,6 +79,13 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
         
         self.device = device
         self.parallel_search = parallel_search
+        self.best_k = best_k
+        self.scan_dtype = scan_dtype
+        self.rescore_k = rescore_k
+        self.fft_scan = fft_scan
+        self.incremental_scan = incremental_scan
+        self.frontier_k = frontier_k
+        self._check_scan_options()
         
 
     def _index_to_sub(self, index, param_shape):
@@ -87,6 +123,16 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
         return theta, param
             
 
+    def _gather_param_tiles(self, chunk_size=None):
+        
+        # the param-mesh in rows, chunk_size parameters at a time (all at once for None)
+        theta, _ = self._gather_vertical_param()
+        theta = [item.reshape(-1) for item in theta]
+        chunk_size = theta[0].shape[0] if chunk_size is None else chunk_size
+        for start in range(0, theta[0].shape[0], chunk_size):
+            yield tuple(item[start:start+chunk_size] for item in theta)
+            
+
     def _select_initial_elements(self, pde_energy, best_k):
         
         # generate parameter-samples from a fine grid, and 
@@ -120,6 +166,27 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
         return (w, b), optimizer
     
     
+    def _train_element(self, pde_energy, theta, optimizer_type):
+        
+        # train a single parameter set and evaluate its ultimate energy
+        epochs = 10
+        theta, optimizer = self._get_optimizer(theta, optimizer_type)
+        for epoch in range(epochs):
+            def closure():
+                optimizer.zero_grad()
+                param = self._polar_to_cartesian(theta)
+                loss = pde_energy(param)
+                loss.backward()
+                # print('loss: {:.16e}, epoch = {:}'.format(loss.item(), epoch))
+                return loss
+            optimizer.step(closure)
+            # print('loss: {:.10e}, epoch = {:}'.format(closure().item(), epoch))
+            new_loss = closure().detach()
+        theta_updated = torch.cat([param.detach().reshape(1) for param in theta])
+        
+        return theta_updated, new_loss.reshape(1)
+    
+    
     def _argmax_optimize_seq(self, pde_energy, theta_list, optimizer_type):
         
         # each theta in the list should contain w and b
@@ -131,36 +198,35 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
         evaluate_list = torch.zeros(num_search, 1)
         
         # train parameters of each set and evaluate their ultimate energy
-        epochs = 10
         for i in range(num_search): 
             print(' training the {:.0f}-th candidate'.format(i+1))
-            theta, optimizer = self._get_optimizer(theta_list[i,...], optimizer_type)
-            for epoch in range(epochs):
-                def closure():
-                    optimizer.zero_grad()
-                    param = self._polar_to_cartesian(theta)
-                    loss = pde_energy(param)
-                    loss.backward()
-                    # print('loss: {:.16e}, epoch = {:}'.format(loss.item(), epoch))
-                    return loss
-                optimizer.step(closure)
-                # print('loss: {:.10e}, epoch = {:}'.format(closure().item(), epoch))
-                new_loss = closure().detach()
-            theta_updated[i,0] = theta[0]
-            theta_updated[i,1] = theta[1]
+            theta, new_loss = self._train_element(pde_energy, theta_list[i,...], optimizer_type)
+            theta_updated[i,:] = theta
             evaluate_list[i] = new_loss
         
         return theta_updated, evaluate_list            
             
     
-    def _argmax_optimize_par(self, pde_energy, theta_list, optimizer_type):
-        """ 
-        Not sure if this is neccessary. Default not calling.
-        """
-        # import-extra-packages
-        # import random
-        # from mpi4py import MPI 
-        pass
+    def _argmax_optimize_batch(self, pde_energy, theta_list, optimizer_type):
+        
+        # all the candidates are trained together as the rows of one
+        # parameter tensor, where w is fixed and only b is optimized
+        epochs = 10
+        w = theta_list[:,0:1].detach()
+        b = Parameter(theta_list[:,1:2].clone())
+        optimizer = gen.Generator([b], self.params_domain).get_batched_optimizer(optimizer_type)
+        def closure():
+            optimizer.zero_grad()
+            loss = pde_energy((w, b)).reshape(-1)
+            loss.sum().backward()
+            return loss
+        for epoch in range(epochs):
+            optimizer.step(closure)
+        new_loss = closure().detach()
+        theta_updated = torch.cat([w, b.detach()], dim=1)
+        
+        return theta_updated, new_loss.reshape(-1,1)
+    
     
     def _argmax_optimize(self, pde_energy, theta_list, optimizer_type):
         """ 
@@ -177,7 +243,9 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
                         "lbfgs", L-BFGS method.
         """
         
-        if not self.parallel_search:
+        if self.parallel_search == "batch":
+            return self._argmax_optimize_batch(pde_energy, theta_list, optimizer_type)
+        elif not self.parallel_search:
             return self._argmax_optimize_seq(pde_energy, theta_list, optimizer_type)
         else:
             return self._argmax_optimize_par(pde_energy, theta_list, optimizer_type)
@@ -188,7 +256,23 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
         # initial guesses 
         start_0 = time.time()
         pde_energy = energy.evaluate_large_scale
-        theta_init_guess = self._select_initial_elements(pde_energy, best_k=1)
+        best_k = self.best_k if self.optimizer else 1
+        self._check_scan_options()
+        with profiler.phase('scan'):
+            theta_init_guess = None
+            if self.incremental_scan:
+                # rescore the candidates whose bounds reach the best scores
+                theta_init_guess = self._select_incremental(energy, best_k, None, "evaluate_large_scale")
+            elif self.fft_scan:
+                # scan by the FFT over the biases, then rescore the top ones
+                theta_init_guess = self._select_fft(energy, self._select_initial_elements, 
+                                                    best_k, "evaluate_large_scale")
+            elif self.scan_dtype is not None:
+                # scan in a low precision, then rescore the top ones
+                theta_init_guess = self._select_low_precision(energy, self._select_initial_elements, 
+                                                              best_k, "evaluate_large_scale")
+            if theta_init_guess is None:
+                theta_init_guess = self._select_initial_elements(pde_energy, best_k=best_k)
         end_0 = time.time()
         # print('\n Initial guess time = {:.4f}s'.format(end_0 - start_0))
 
@@ -198,7 +282,8 @@ class NeuronDictionary1D(dt.AbstractDictionary): # shallow_neural_dict with 1D i
             optimizer_type = self.optimizer
             pde_energy = energy.evaluate
             # print('\n Start optimization:')
-            theta_list, evaluate_list = self._argmax_optimize(pde_energy, theta_init_guess, optimizer_type)
+            with profiler.phase('optimize'):
+                theta_list, evaluate_list = self._argmax_optimize(pde_energy, theta_init_guess, optimizer_type)
             end_1 = time.time()
             # print(' optimization time = {:.4f}s'.format(end_1 - start_1))
             
@@ -6,6 +6,7 @@ import numpy as np
 
 from . import dictionary as dt
 from ..optimization import generator as gen
+from ..tools import profiler
 
 dtype = torch.float64
 torch.set_default_dtype(dtype)
@@ -21,7 +22,18 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
                 param_b_domain,
                 params_mesh_size,
                 device,
-                parallel_search=False):
+                parallel_search=False,
+                best_k=1,
+                scan_memory=2**28,
+                comm=None,
+                scan_dtype=None,
+                rescore_k=256,
+                fft_scan=False,
+                search_levels=0,
+                search_keep=32,
+                incremental_scan=0,
+                frontier_k=1024,
+                sketch_quadrature=None):
 
         """
         The STANDARD general dictionary for shallow neural networks,
@@ -36,7 +48,46 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
             params_mesh_size: a dict object, 
                             len = param_dim.
             device: cpu or cuda.
-            parallel_search: option for parallel optimization.
+            parallel_search: option for parallel optimization, True for
+                        all cpu cores or the number of processes, 
+                        "batch" for training all the candidates in one 
+                        batched optimizer. The process pool is kept for
+                        all the greedy steps, see AbstractDictionary._get_executor.
+            best_k: the number of initial guesses to be optimized, only 
+                        used when self.optimizer is given.
+            scan_memory: memory budget (in bytes) of a parameter chunk
+                        when scanning the param-mesh.
+            comm: an MPI communicator (e.g., mpi4py's MPI.COMM_WORLD), then 
+                        the param-mesh and the candidates are distributed 
+                        over its ranks. None for a single process.
+            scan_dtype: the dtype of the products of energy evaluations in 
+                        the scan, e.g., torch.float32, or torch.bfloat16 on cpu,
+                        for the energies whose evaluate takes a dtype. None for
+                        the default dtype. The training stays in the default dtype.
+            rescore_k: the number of top candidates of a low-precision, FFT
+                        or sketched scan, which are rescored in the default 
+                        dtype on all the quadrature points.
+            fft_scan: option for the FFT scan over the bias grid of each 
+                        direction, see energy._fft_products, True or the number
+                        of bins per bias step (8 for True).
+            search_levels: the number of coarser levels of the coarse-to-fine
+                        search, whose coarsest mesh has a 2^search_levels 
+                        times larger mesh size. 0 for the scan of the whole
+                        param-mesh. With comm, the candidates of each level
+                        are split over the ranks.
+            search_keep: the number of candidates refined at each level.
+            incremental_scan: the largest number of greedy steps between
+                        full scans, in which only the candidates whose 
+                        bound of the score may reach the best ones are
+                        rescored, see AbstractDictionary._select_incremental.
+                        0 for a full scan in each step.
+            frontier_k: the number of candidates rescored at once by the
+                        incremental scan.
+            sketch_quadrature: a coarser quadrature of the same domain, e.g., 
+                        of GaussLegendreDomain with a larger mesh size, on 
+                        which the scan ranks the candidates, see 
+                        AbstractDictionary._get_sketch_energy. None for the
+                        quadrature of the energy.
         """
         super(NeuronDictionary2D, self).__init__()
         
@@ -50,6 +101,18 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
         
         self.device = device
         self.parallel_search = parallel_search
+        self.best_k = best_k
+        self.scan_memory = scan_memory
+        self.comm = comm
+        self.scan_dtype = scan_dtype
+        self.rescore_k = rescore_k
+        self.fft_scan = fft_scan
+        self.search_levels = search_levels
+        self.search_keep = search_keep
+        self.incremental_scan = incremental_scan
+        self.frontier_k = frontier_k
+        self.sketch_quadrature = sketch_quadrature
+        self._check_scan_options()
         
         
     def _get_domain(self, param_b_domain):
@@ -78,7 +141,7 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
         return (w1, w2, b)
 
     
-    def _gather_vertical_param(self):
+    def _gather_param_axes(self):
 
         # get lower and upper bounds for phi and b, where phi is the polar coordinate
         assert self.params_domain.shape[0] == 2
@@ -94,30 +157,77 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
         N2 = int(N2) + 1
         t = torch.linspace(min_val_t, max_val_t, N1).to(self.device)
         b = torch.linspace(min_val_b, max_val_b, N2).to(self.device)
-        theta = torch.meshgrid(t, b, indexing="ij")
+        return (t, b)
+    
+    
+    def _gather_vertical_param(self):
         
+        # the full param-mesh, only for small mesh sizes
+        theta = torch.meshgrid(*self._gather_param_axes(), indexing="ij")
         param = self._polar_to_cartesian(theta)
         return theta, param
+    
+    
+    def _gather_param_tiles(self, chunk_size):
+        
+        # generate the param-mesh lazily, chunk_size parameters at a time
+        t, b = self._gather_param_axes()
+        param_shape = (len(t), len(b))
+        num_param = param_shape[0] * param_shape[1]
+        
+        # with MPI, each rank only scans its own slice of the param-mesh
+        first, last = 0, num_param
+        if self.comm is not None:
+            rank, size = self.comm.Get_rank(), self.comm.Get_size()
+            first, last = num_param*rank // size, num_param*(rank+1) // size
+        for start in range(first, last, chunk_size):
+            index = torch.arange(start, min(start+chunk_size, last)).reshape(-1,1)
+            sub = self._index_to_sub(index, param_shape).to(self.device)
+            yield (t[sub[:,0]], b[sub[:,1]])
+    
+    
+    def _get_chunk_size(self, energy, dtype=None):
+        
+        # a chunk keeps about 4 matrices of shape chunk_size-by-num_points
+        # alive at once, e.g., the core matrix, activations and products
+        dtype = torch.get_default_dtype() if dtype is None else dtype
+        num_points = sum([points.shape[0] for points in energy.get_core_points()])
+        row_bytes = 4 * num_points * torch.finfo(dtype).bits // 8
+        return max(1, int(self.scan_memory // row_bytes))
             
 
-    def _select_initial_elements(self, pde_energy, best_k):
+    def _select_initial_elements(self, pde_energy, best_k, chunk_size):
             
-        # generate parameter-samples from a fine grid, and 
-        # select the top ones by evaluate them in the pde_energy
-        all_theta, all_param = self._gather_vertical_param()
-        param_shape = all_theta[0].shape
-        
-        # only index[0] or some top-k indices
-        all_init_loss = pde_energy(all_param)
-        _, index = torch.sort(all_init_loss, descending=False, dim=0)
-        sub = self._index_to_sub(index[0:best_k], param_shape)
-
-        # pick by subscripts
-        t = all_theta[0][sub[:,0:1],sub[:,1:2]]
-        b = all_theta[1][sub[:,0:1],sub[:,1:2]]
-        intial_guess = torch.cat([t,b], dim=1).to(self.device)
+        # the coarse-to-fine search only scans the kept cells
+        if self.search_levels > 0:
+            return self._select_multilevel(pde_energy, best_k, chunk_size)
         
-        return intial_guess
+        # scan parameter-samples from a fine grid chunk by chunk, and keep 
+        # the top ones by evaluate them in the pde_energy, so the peak memory 
+        # is bounded by chunk_size instead of the size of the param-mesh
+        best_loss = torch.zeros(0, 1).to(self.device)
+        best_theta = torch.zeros(0, 2).to(self.device)
+        with torch.no_grad():
+            for theta in self._gather_param_tiles(chunk_size):
+                loss = pde_energy(self._polar_to_cartesian(theta))
+                loss = torch.cat([best_loss, loss], dim=0)
+                theta = torch.cat([best_theta, torch.stack(theta, dim=1)], dim=0)
+                
+                # running top-k indices
+                k = min(best_k, loss.shape[0])
+                best_loss, index = torch.topk(loss, k, dim=0, largest=False)
+                best_theta = theta[index.flatten(), :]
+        
+        # reduce the top ones of all ranks, which are the same on every rank
+        if self.comm is not None:
+            candidates = self.comm.allgather((best_loss, best_theta))
+            loss = torch.cat([candidate[0] for candidate in candidates], dim=0)
+            theta = torch.cat([candidate[1] for candidate in candidates], dim=0)
+            k = min(best_k, loss.shape[0])
+            best_loss, index = torch.topk(loss, k, dim=0, largest=False)
+            best_theta = theta[index.flatten(), :]
+        
+        return best_theta
     
     
     def _get_optimizer(self, theta, optimizer_type):
@@ -134,6 +244,27 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
         return (t,b), optimizer
     
     
+    def _train_element(self, pde_energy, theta, optimizer_type):
+        
+        # train a single parameter set and evaluate its ultimate energy
+        epochs = 10
+        theta, optimizer = self._get_optimizer(theta, optimizer_type)
+        for epoch in range(epochs):
+            def closure():
+                optimizer.zero_grad()
+                param = self._polar_to_cartesian(theta)
+                loss = pde_energy(param)
+                loss.backward()
+                # print('loss: {:.16e}, epoch = {:}'.format(loss.item(), epoch))
+                return loss
+            optimizer.step(closure)
+            # print('loss: {:.10e}, epoch = {:}'.format(closure().item(), epoch))
+            new_loss = closure().detach()
+        theta_updated = torch.cat([param.detach().reshape(1) for param in theta])
+        
+        return theta_updated, new_loss.reshape(1)
+    
+    
     def _argmax_optimize_seq(self, pde_energy, theta_list, optimizer_type):
         
         # each theta in the list should contain t and b
@@ -145,36 +276,49 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
         evaluate_list = torch.zeros(num_search, 1)
         
         # train parameters of each set and evaluate their ultimate energy
-        epochs = 10
         for i in range(num_search): 
             print(' training the {:.0f}-th candidate'.format(i+1))
-            theta, optimizer = self._get_optimizer(theta_list[i,...], optimizer_type)
-            for epoch in range(epochs):
-                def closure():
-                    optimizer.zero_grad()
-                    param = self._polar_to_cartesian(theta)
-                    loss = pde_energy(param)
-                    loss.backward()
-                    # print('loss: {:.16e}, epoch = {:}'.format(loss.item(), epoch))
-                    return loss
-                optimizer.step(closure)
-                # print('loss: {:.10e}, epoch = {:}'.format(closure().item(), epoch))
-                new_loss = closure().detach()
-            theta_updated[i,0] = theta[0]
-            theta_updated[i,1] = theta[1]
+            theta, new_loss = self._train_element(pde_energy, theta_list[i,...], optimizer_type)
+            theta_updated[i,:] = theta
             evaluate_list[i] = new_loss
         
         return theta_updated, evaluate_list            
             
     
-    def _argmax_optimize_par(self, pde_energy, theta_list, optimizer_type):
-        """ 
-        Not sure if this is neccessary. Default not calling.
-        """
-        # import extra packages
-        # import random
-        # from mpi4py import MPI 
-        pass
+    def _argmax_optimize_batch(self, pde_energy, theta_list, optimizer_type):
+        
+        # all the candidates are trained together as the rows of one
+        # parameter tensor, in the polar coordinates
+        epochs = 10
+        theta = Parameter(theta_list.detach().clone())
+        optimizer = gen.Generator([theta], self.params_domain).get_batched_optimizer(optimizer_type)
+        def closure():
+            optimizer.zero_grad()
+            loss = pde_energy(self._polar_to_cartesian(theta.t())).reshape(-1)
+            loss.sum().backward()
+            return loss
+        for epoch in range(epochs):
+            optimizer.step(closure)
+        new_loss = closure().detach()
+        theta_updated = theta.detach()
+        
+        return theta_updated, new_loss.reshape(-1,1)
+    
+    
+    def _argmax_optimize_mpi(self, pde_energy, theta_list, optimizer_type):
+        
+        # each rank trains its share of the candidates, then gathers all
+        rank, size = self.comm.Get_rank(), self.comm.Get_size()
+        if self.parallel_search == "batch":
+            results = self._argmax_optimize_batch(pde_energy, theta_list[rank::size,...], optimizer_type)
+        else:
+            results = self._argmax_optimize_seq(pde_energy, theta_list[rank::size,...], optimizer_type)
+        results = self.comm.allgather(results)
+        theta_updated = torch.cat([result[0] for result in results], dim=0)
+        evaluate_list = torch.cat([result[1] for result in results], dim=0)
+        
+        return theta_updated, evaluate_list
+    
     
     def _argmax_optimize(self, pde_energy, theta_list, optimizer_type):
         """ 
@@ -191,7 +335,11 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
                         "lbfgs", L-BFGS method.
         """
         
-        if not self.parallel_search:
+        if self.comm is not None:
+            return self._argmax_optimize_mpi(pde_energy, theta_list, optimizer_type)
+        elif self.parallel_search == "batch":
+            return self._argmax_optimize_batch(pde_energy, theta_list, optimizer_type)
+        elif not self.parallel_search:
             return self._argmax_optimize_seq(pde_energy, theta_list, optimizer_type)
         else:
             return self._argmax_optimize_par(pde_energy, theta_list, optimizer_type)
@@ -201,8 +349,34 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
         
         # initial guesses 
         start_0 = time.time()
-        pde_energy = energy.evaluate_large_scale
-        theta_init_guess = self._select_initial_elements(pde_energy, best_k=1)
+        pde_energy = energy.evaluate
+        best_k = self.best_k if self.optimizer else 1
+        self._check_scan_options()
+        with profiler.phase('scan'):
+            theta_init_guess = None
+            if self.incremental_scan:
+                # rescore the candidates whose bounds reach the best scores
+                chunk_size = self._get_chunk_size(energy)
+                theta_init_guess = self._select_incremental(energy, best_k, chunk_size)
+            elif self.fft_scan:
+                # scan by the FFT over the biases, then rescore the top ones
+                chunk_size = self._get_chunk_size(energy)
+                select = lambda scan_energy, k: self._select_initial_elements(scan_energy, k, chunk_size)
+                theta_init_guess = self._select_fft(energy, select, best_k)
+            elif self.sketch_quadrature is not None:
+                # scan on the coarser quadrature, then rescore the top ones
+                sketch = self._get_sketch_energy(energy)
+                chunk_size = self._get_chunk_size(sketch)
+                select = lambda scan_energy, k: self._select_initial_elements(scan_energy, k, chunk_size)
+                theta_init_guess = self._select_sketch(energy, sketch, select, best_k)
+            elif self.scan_dtype is not None:
+                # scan in a low precision, then rescore the top ones
+                chunk_size = self._get_chunk_size(energy, self.scan_dtype)
+                select = lambda scan_energy, k: self._select_initial_elements(scan_energy, k, chunk_size)
+                theta_init_guess = self._select_low_precision(energy, select, best_k)
+            if theta_init_guess is None:
+                chunk_size = self._get_chunk_size(energy)
+                theta_init_guess = self._select_initial_elements(pde_energy, best_k=best_k, chunk_size=chunk_size)
         end_0 = time.time()
         print('\n Initial guess time = {:.4f}s'.format(end_0 - start_0))
 
@@ -213,7 +387,8 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
             optimizer_type = self.optimizer
             pde_energy = energy.evaluate
             print('\n Start optimization:')
-            theta_list, evaluate_list = self._argmax_optimize(pde_energy, theta_init_guess, optimizer_type)
+            with profiler.phase('optimize'):
+                theta_list, evaluate_list = self._argmax_optimize(pde_energy, theta_init_guess, optimizer_type)
             end_1 = time.time()
             print(' optimization time = {:.4f}s'.format(end_1 - start_1))
             
@@ -223,6 +398,10 @@ class NeuronDictionary2D(dt.AbstractDictionary): # shallow_neural_dict with 2D i
         else:
             optimal_element = self._polar_to_cartesian(theta_init_guess[0, ...].reshape(-1,1))
             
+        # every rank takes the element of rank 0 to update its pre_solution
+        if self.comm is not None:
+            optimal_element = self.comm.bcast(optimal_element, root=0)
+        
         # total time cost
         end_2 = time.time()
         print('\n Total selection time = {:.4f}s'.format(end_2 - start_0))
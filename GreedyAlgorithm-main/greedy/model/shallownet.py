@@ -8,6 +8,7 @@ class ShallowNN(nn.Module):
                  in_dim,
                  width,
                  out_dim=1,
+                 dsigma=None,
                  ):
         super(ShallowNN, self).__init__()
         self.layer1 = nn.Linear(in_dim, width, bias = True)
@@ -15,6 +16,12 @@ class ShallowNN(nn.Module):
         self.F = sigma    
         self.num_neurons = width
         
+        # derivatives of the activation, dF(p, m), taken from the 
+        # ActivationFunction object of sigma if not given
+        if dsigma is None:
+            dsigma = getattr(getattr(sigma, '__self__', None), 'dactivate', None)
+        self.dF = dsigma
+        
     def update_neurons(self, parameters):
         layer2_weight = parameters[0].requires_grad_(True)
         layer1_weight = parameters[1].requires_grad_(True)
@@ -29,4 +36,35 @@ class ShallowNN(nn.Module):
         out = self.layer1(out)
         out = self.F(out)
         out = self.layer2(out)
-        return out
\ No newline at end of file
+        return out
+    
+    def evaluate_derivatives(self, x, order=2):
+        """
+        Closed-form derivatives of the (scalar) network at x, without autograd:
+                u(x)   = sum_i a_i * sigma(w_i*x + b_i),
+                Du(x)  = sum_i a_i * sigma'(w_i*x + b_i) * w_i,
+                D2u(x) = sum_i a_i * sigma''(w_i*x + b_i) * w_i*w_i^T.
+        INPUT:
+            x: N-by-d points.
+            order: the highest order of derivatives, 0, 1 or 2.
+        OUTPUT:
+            a list of the value (N-by-1), the gradient (N-by-d) and 
+            the Hessian (N-by-d-by-d), up to the given order.
+        """
+        if (order > 0) and (self.dF is None):
+            raise RuntimeError("Derivatives of the activation are not given.")
+        
+        with torch.no_grad():
+            W = self.layer1.weight
+            a = self.layer2.weight
+            core = torch.mm(x, W.t()) + self.layer1.bias
+            items = [torch.mm(self.F(core), a.t())]
+            if order >= 1:
+                dg = self.dF(core, 1) * a
+                items.append(torch.mm(dg, W))
+            if order >= 2:
+                d2g = self.dF(core, 2) * a
+                WW = (W.unsqueeze(2) * W.unsqueeze(1)).reshape(W.shape[0], -1)
+                hessian = torch.mm(d2g, WW).reshape(x.shape[0], x.shape[1], x.shape[1])
+                items.append(hessian)
+        return items
@@ -1,3 +1,4 @@
 from .fista import FISTA
 from .pgd import PGD
-from .lbfgs import LBFGS
\ No newline at end of file
+from .lbfgs import LBFGS
+from .batched_optimizer import BatchedPGD, BatchedFISTA, BatchedLBFGS
\ No newline at end of file
@@ -0,0 +1,413 @@
+"""
+Created on Sat Oct 17 15:02 2026
+
+@author: Jinpp (xianlincn@pku.edu.cn)
+@version: 1.0
+@brief: Batched PGD, FISTA and L-BFGS, with box constraints. The only
+        parameter is an m-by-n tensor, whose rows are m independent
+        problems, e.g., m initial guesses of a neuron. The closure
+        returns the m losses, and the sum of them is differentiated,
+        so that all the rows advance in one vectorized step. Line
+        searches and stopping criteria work row by row, a row which
+        has converged is frozen by a mask.
+@modifications: to be added
+"""
+
+
+import torch
+
+from .line_search import batched_armijo
+from .optimizer import Optimizer
+
+
+class BatchedOptimizer(Optimizer):
+
+    def __init__(self, params, domain, defaults):
+        super(BatchedOptimizer, self).__init__(params, defaults)
+
+        if len(self.param_groups) != 1 or len(self.param_groups[0]['params']) != 1:
+            raise ValueError("{} only supports a single m-by-n parameter "
+                        "tensor".format(self.__class__.__name__))
+
+        self._param = self.param_groups[0]['params'][0]
+        self._domain = domain
+
+    def _box_projection(self, x):
+        # project each column into its interval of the domain
+        lower = self._domain[:,0].to(x)
+        upper = self._domain[:,1].to(x)
+        return torch.max(torch.min(x, upper), lower)
+
+    def _evaluate(self, closure, x):
+        # losses and gradients of all rows at x
+        self._param.copy_(x)
+        loss = closure().detach().reshape(-1).clone()
+        grad = self._param.grad.detach().clone()
+        return loss, grad
+
+    def _directional_evaluate_projected(self, closure, x, t, d):
+        return self._evaluate(closure, self._box_projection(x + t.unsqueeze(1) * d))
+
+    def _armijo(self, closure, x, d, f, g):
+        def obj_func(x, t, d):
+            return self._directional_evaluate_projected(closure, x, t, d)
+        return batched_armijo(obj_func, x, d, f, g)
+
+    def _get_group(self):
+        assert len(self.param_groups) == 1
+        group = self.param_groups[0]
+        if group['line_search_fn'] != "arc_armijo":
+            raise RuntimeError("only arc-Armijo line search is supported")
+        return group
+
+
+class BatchedPGD(BatchedOptimizer):
+
+    def __init__(self,
+                 params,
+                 domain,
+                 lr=1,
+                 max_iter=20,
+                 max_eval=None,
+                 tolerance_grad=1e-7,
+                 tolerance_change=1e-9,
+                 history_size=100,
+                 line_search_fn="arc_armijo"):
+        if max_eval is None:
+            max_eval = max_iter * 5 // 4
+        defaults = dict(
+            lr=lr,
+            max_iter=max_iter,
+            max_eval=max_eval,
+            tolerance_grad=tolerance_grad,
+            tolerance_change=tolerance_change,
+            history_size=history_size,
+            line_search_fn=line_search_fn)
+        super(BatchedPGD, self).__init__(params, domain, defaults)
+
+    @torch.no_grad()
+    def step(self, closure):
+
+        # Make sure the closure is always called with grad enabled
+        closure = torch.enable_grad()(closure)
+
+        group = self._get_group()
+        max_iter = group['max_iter']
+        max_eval = group['max_eval']
+        tolerance_grad = group['tolerance_grad']
+        tolerance_change = group['tolerance_change']
+
+        state = self.state[self._param]
+        state.setdefault('func_evals', 0)
+        state.setdefault('n_iter', 0)
+
+        # evaluate initial f(x) and df/dx of all rows
+        x = self._param.detach().clone()
+        loss, flat_grad = self._evaluate(closure, x)
+        orig_loss = loss.clone()
+        current_evals = torch.ones_like(loss, dtype=torch.long)
+        state['func_evals'] += 1
+
+        # rows which are not optimal yet
+        active = flat_grad.abs().amax(dim=1) > tolerance_grad
+
+        n_iter = 0
+        # optimize for a max of max_iter iterations
+        while n_iter < max_iter and active.any():
+            # keep track of number of iterations
+            n_iter += 1
+            state['n_iter'] += 1
+
+            # compute gradient descent direction
+            d = flat_grad.neg()
+            prev_loss = loss
+
+            # directional derivative is below tolerance
+            gtd = (flat_grad * d).sum(dim=1)
+            active = active & (gtd <= -tolerance_change)
+            if not active.any():
+                break
+
+            # per-row line search, then update the active rows only
+            new_loss, new_grad, t, ls_func_evals = self._armijo(closure, x, d, loss, flat_grad)
+            x_new = self._box_projection(x + t.unsqueeze(1) * d)
+            x = torch.where(active.unsqueeze(1), x_new, x)
+            loss = torch.where(active, new_loss, loss)
+            flat_grad = torch.where(active.unsqueeze(1), new_grad, flat_grad)
+
+            # update func eval
+            current_evals += torch.where(active, ls_func_evals, 0)
+            state['func_evals'] += int(ls_func_evals.max())
+
+            ############################################################
+            # check conditions, row by row
+            ############################################################
+            active = active & (current_evals < max_eval)
+
+            # optimal condition
+            active = active & (flat_grad.abs().amax(dim=1) > tolerance_grad)
+
+            # lack of progress
+            active = active & ((d * t.unsqueeze(1)).abs().amax(dim=1) > tolerance_change)
+            active = active & ((loss - prev_loss).abs() >= tolerance_change)
+
+        self._param.copy_(x)
+
+        return orig_loss
+
+
+class BatchedFISTA(BatchedOptimizer):
+
+    def __init__(self,
+                 params,
+                 domain,
+                 lr=1,
+                 max_iter=20,
+                 max_eval=None,
+                 tolerance_grad=1e-7,
+                 tolerance_change=1e-9,
+                 history_size=100,
+                 line_search_fn="arc_armijo"):
+        if max_eval is None:
+            max_eval = max_iter * 5 // 4
+        defaults = dict(
+            lr=lr,
+            max_iter=max_iter,
+            max_eval=max_eval,
+            tolerance_grad=tolerance_grad,
+            tolerance_change=tolerance_change,
+            history_size=history_size,
+            line_search_fn=line_search_fn)
+        super(BatchedFISTA, self).__init__(params, domain, defaults)
+
+    @torch.no_grad()
+    def step(self, closure):
+
+        # Make sure the closure is always called with grad enabled
+        closure = torch.enable_grad()(closure)
+
+        group = self._get_group()
+        max_iter = group['max_iter']
+        max_eval = group['max_eval']
+        tolerance_grad = group['tolerance_grad']
+        tolerance_change = group['tolerance_change']
+
+        state = self.state[self._param]
+        state.setdefault('func_evals', 0)
+        state.setdefault('n_iter', 0)
+
+        # initial guess y1 = x0, as x-1 = x0
+        x_init = self._param.detach().clone()
+        y = x_init.clone()
+
+        # evaluate initial f(y) and df/dy of all rows
+        loss, flat_grad = self._evaluate(closure, y)
+        orig_loss = loss.clone()
+        current_evals = torch.ones_like(loss, dtype=torch.long)
+        state['func_evals'] += 1
+
+        # rows which are not optimal yet
+        active = flat_grad.abs().amax(dim=1) > tolerance_grad
+
+        n_iter = 0
+        # optimize for a max of max_iter iterations
+        while n_iter < max_iter and active.any():
+            # keep track of number of iterations
+            n_iter += 1
+            state['n_iter'] += 1
+
+            # compute gradient descent direction
+            d = flat_grad.neg()
+            prev_loss = loss
+
+            # directional derivative is below tolerance
+            gtd = (flat_grad * d).sum(dim=1)
+            active = active & (gtd <= -tolerance_change)
+            if not active.any():
+                break
+
+            # per-row line search from y, then update the active rows only
+            new_loss, new_grad, t, ls_func_evals = self._armijo(closure, y, d, loss, flat_grad)
+            x_new = self._box_projection(y + t.unsqueeze(1) * d)
+            loss = torch.where(active, new_loss, loss)
+            flat_grad = torch.where(active.unsqueeze(1), new_grad, flat_grad)
+
+            # update func eval
+            current_evals += torch.where(active, ls_func_evals, 0)
+            state['func_evals'] += int(ls_func_evals.max())
+
+            # update iterates
+            coef = (n_iter) / (n_iter+3)
+            x_prev = x_init
+            x_init = torch.where(active.unsqueeze(1), x_new, x_init)
+            y = torch.where(active.unsqueeze(1), x_init + coef * (x_init - x_prev), y)
+
+            ############################################################
+            # check conditions, row by row
+            ############################################################
+            active = active & (current_evals < max_eval)
+
+            # optimal condition
+            active = active & (flat_grad.abs().amax(dim=1) > tolerance_grad)
+
+            # lack of progress
+            active = active & ((d * t.unsqueeze(1)).abs().amax(dim=1) > tolerance_change)
+            active = active & ((loss - prev_loss).abs() >= tolerance_change)
+
+        self._param.copy_(y)
+
+        return orig_loss
+
+
+class BatchedLBFGS(BatchedOptimizer):
+
+    def __init__(self,
+                 params,
+                 domain,
+                 lr=1,
+                 max_iter=20,
+                 max_eval=None,
+                 tolerance_grad=1e-7,
+                 tolerance_change=1e-9,
+                 history_size=100,
+                 line_search_fn="arc_armijo"):
+        if max_eval is None:
+            max_eval = max_iter * 5 // 4
+        defaults = dict(
+            lr=lr,
+            max_iter=max_iter,
+            max_eval=max_eval,
+            tolerance_grad=tolerance_grad,
+            tolerance_change=tolerance_change,
+            history_size=history_size,
+            line_search_fn=line_search_fn)
+        super(BatchedLBFGS, self).__init__(params, domain, defaults)
+
+    def _two_loop(self, flat_grad, old_dirs, old_stps, valid, H_diag):
+        # the L-BFGS direction of all rows, where the invalid (not yet
+        # filled) history entries have ro = 0, i.e., no contribution
+        num_old = int(valid.sum(dim=1).max())
+        history_size = valid.shape[1]
+        ys = (old_dirs * old_stps).sum(dim=2)
+        ro = torch.where(valid, 1. / torch.where(valid, ys, 1.), 0.)
+        al = torch.zeros_like(ro)
+        q = flat_grad.neg()
+        for i in range(history_size - 1, history_size - num_old - 1, -1):
+            al[:,i] = (old_stps[:,i] * q).sum(dim=1) * ro[:,i]
+            q = q - al[:,i:i+1] * old_dirs[:,i]
+        r = q * H_diag.unsqueeze(1)
+        for i in range(history_size - num_old, history_size):
+            be_i = (old_dirs[:,i] * r).sum(dim=1) * ro[:,i]
+            r = r + old_stps[:,i] * (al[:,i] - be_i).unsqueeze(1)
+        return r
+
+    @torch.no_grad()
+    def step(self, closure):
+
+        # Make sure the closure is always called with grad enabled
+        closure = torch.enable_grad()(closure)
+
+        group = self._get_group()
+        max_iter = group['max_iter']
+        max_eval = group['max_eval']
+        tolerance_grad = group['tolerance_grad']
+        tolerance_change = group['tolerance_change']
+        history_size = group['history_size']
+
+        state = self.state[self._param]
+        state.setdefault('func_evals', 0)
+        state.setdefault('n_iter', 0)
+
+        # evaluate initial f(x) and df/dx of all rows
+        x = self._param.detach().clone()
+        loss, flat_grad = self._evaluate(closure, x)
+        orig_loss = loss.clone()
+        current_evals = torch.ones_like(loss, dtype=torch.long)
+        state['func_evals'] += 1
+
+        # rows which are not optimal yet
+        active = flat_grad.abs().amax(dim=1) > tolerance_grad
+
+        # history of all rows, the newest in the last column
+        num_rows, num_param = x.shape
+        if 'old_dirs' not in state:
+            state['old_dirs'] = x.new_zeros(num_rows, history_size, num_param)
+            state['old_stps'] = x.new_zeros(num_rows, history_size, num_param)
+            state['valid'] = torch.zeros(num_rows, history_size, dtype=torch.bool, device=x.device)
+            state['H_diag'] = x.new_ones(num_rows)
+        old_dirs = state['old_dirs']
+        old_stps = state['old_stps']
+        valid = state['valid']
+        H_diag = state['H_diag']
+        d = state.get('d', torch.zeros_like(x))
+        t = state.get('t', x.new_zeros(num_rows))
+        prev_flat_grad = state.get('prev_flat_grad')
+
+        n_iter = 0
+        # optimize for a max of max_iter iterations
+        while n_iter < max_iter and active.any():
+            # keep track of nb of iterations
+            n_iter += 1
+            state['n_iter'] += 1
+
+            ############################################################
+            # compute gradient descent direction
+            ############################################################
+            if prev_flat_grad is not None:
+                # do lbfgs update (update memory) for the rows with ys > 1e-10
+                y = flat_grad - prev_flat_grad
+                s = d * t.unsqueeze(1)
+                ys = (y * s).sum(dim=1)
+                update = active & (ys > 1e-10)
+                if update.any():
+                    # shift history by one (limited-memory)
+                    rows = update.nonzero().flatten()
+                    old_dirs[rows] = torch.cat([old_dirs[rows,1:], y[rows].unsqueeze(1)], dim=1)
+                    old_stps[rows] = torch.cat([old_stps[rows,1:], s[rows].unsqueeze(1)], dim=1)
+                    valid[rows] = torch.cat([valid[rows,1:], valid.new_ones(len(rows),1)], dim=1)
+
+                    # update scale of initial Hessian approximation
+                    H_diag = torch.where(update, ys / (y * y).sum(dim=1), H_diag)
+
+            # the gradient direction while the history is empty
+            d = self._two_loop(flat_grad, old_dirs, old_stps, valid, H_diag)
+            prev_flat_grad = flat_grad
+            prev_loss = loss
+
+            # directional derivative is below tolerance
+            gtd = (flat_grad * d).sum(dim=1)
+            active = active & (gtd <= -tolerance_change)
+            if not active.any():
+                break
+
+            # per-row line search, then update the active rows only
+            new_loss, new_grad, t, ls_func_evals = self._armijo(closure, x, d, loss, flat_grad)
+            t = torch.where(active, t, 0.)
+            x = self._box_projection(x + t.unsqueeze(1) * d)
+            loss = torch.where(active, new_loss, loss)
+            flat_grad = torch.where(active.unsqueeze(1), new_grad, flat_grad)
+
+            # update func eval
+            current_evals += torch.where(active, ls_func_evals, 0)
+            state['func_evals'] += int(ls_func_evals.max())
+
+            ############################################################
+            # check conditions, row by row
+            ############################################################
+            active = active & (current_evals < max_eval)
+
+            # optimal condition
+            active = active & (flat_grad.abs().amax(dim=1) > tolerance_grad)
+
+            # lack of progress
+            active = active & ((d * t.unsqueeze(1)).abs().amax(dim=1) > tolerance_change)
+            active = active & ((loss - prev_loss).abs() >= tolerance_change)
+
+        state['d'] = d
+        state['t'] = t
+        state['H_diag'] = H_diag
+        state['prev_flat_grad'] = prev_flat_grad
+
+        self._param.copy_(x)
+
+        return orig_loss
@@ -43,6 +43,40 @@ class Generator():
                 }
         return op_dict
     
+    def _get_batched_optimizer_dict(self):
+        op_dict = {
+                    "pgd": BatchedPGD(self.parameters,
+                                      self.param_domain,
+                                      lr=1e-2,
+                                      max_iter=20,
+                                      max_eval=None,
+                                      tolerance_grad=1e-08,
+                                      tolerance_change=1e-10,
+                                      history_size=100,
+                                      line_search_fn="arc_armijo"),
+                    
+                    "fista": BatchedFISTA(self.parameters,
+                                          self.param_domain,
+                                          lr=1e-2,
+                                          max_iter=5,
+                                          max_eval=None,
+                                          tolerance_grad=1e-08,
+                                          tolerance_change=1e-10,
+                                          history_size=100,
+                                          line_search_fn="arc_armijo"),
+                    
+                    "lbfgs": BatchedLBFGS(self.parameters,
+                                          self.param_domain,
+                                          lr=1,
+                                          max_iter=20,
+                                          max_eval=None,
+                                          tolerance_grad=1e-08,
+                                          tolerance_change=1e-10,
+                                          history_size=100,
+                                          line_search_fn="arc_armijo"),  # box-projected, instead of strong wolfe 
+                }
+        return op_dict
+    
     def get_optimizer(self, optimizer_type):
         op_dict = self._get_optimizer_dict()
         optimizer = op_dict.get(optimizer_type)
@@ -50,4 +84,11 @@ class Generator():
             raise RuntimeError("Such optimizer is not supported.")
         else:
             return optimizer
-        
\ No newline at end of file
+    
+    def get_batched_optimizer(self, optimizer_type):
+        op_dict = self._get_batched_optimizer_dict()
+        optimizer = op_dict.get(optimizer_type)
+        if optimizer is None:
+            raise RuntimeError("Such optimizer is not supported.")
+        else:
+            return optimizer
@@ -227,3 +227,51 @@ def armijo(obj_func,
         t = c1 * c2 ** c2_power
 
     return f_new, g_new, t, ls_func_evals
+
+
+def batched_armijo(obj_func,
+                  x,
+                  d,
+                  f,
+                  g,
+                  m=1,
+                  c1=10, 
+                  c2=0.5, 
+                  c3=1e-4,
+                  max_ls=25):
+    """
+    armijo (arc_armijo) for m independent problems in the rows of 
+    x, d, g (m-by-n) and f (m). Every row keeps the first step which 
+    satisfies its own Armijo condition, the others keep backtracking.
+    The steps t and the numbers of evaluations are returned by rows.
+    """
+
+    t = torch.full_like(f, c1 * c2 ** m)
+    g = g.clone(memory_format=torch.contiguous_format)
+    gtd = (g * d).sum(dim=1)
+    # evaluate objective and gradient using initial step
+    f_new, g_new = obj_func(x, t, d)
+    ls_func_evals = torch.ones_like(f, dtype=torch.long)
+    done = torch.zeros_like(f, dtype=torch.bool)
+
+    # determine a point satisfying the Armijo criteria, row by row
+    ls_iter = 0
+    while ls_iter < max_ls:
+        # check conditions
+        if ls_iter > 1:
+            done = done | (f_new <= (f + c3 * t * gtd))
+            if done.all():
+                break
+
+        # update step
+        m += 1
+        t = torch.where(done, t, torch.full_like(t, c1 * c2 ** m))
+
+        # next step, only for the rows not done
+        f_trial, g_trial = obj_func(x, t, d)
+        f_new = torch.where(done, f_new, f_trial)
+        g_new = torch.where(done.unsqueeze(1), g_new, g_trial)
+        ls_func_evals += (~done).long()
+        ls_iter += 1
+
+    return f_new, g_new, t, ls_func_evals
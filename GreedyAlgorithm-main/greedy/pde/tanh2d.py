@@ -57,6 +57,20 @@ class Datatanh_2d_DBC(PDE):
         val = -0.5 + 0.5*torch.tanh(coef1*x - coef2*t)
         return val
     
+    def gradient(self, p):
+        """ The gradient (u_x, u_t) of the exact solution 
+        """
+
+        x = p[..., 0:1]
+        t = p[..., 1:2]
+        coef1 = np.sqrt(self.eps/self.lam/8.)
+        coef2 = self.eps * 0.75
+        sech2 = 1. - torch.tanh(coef1*x - coef2*t)**2
+        val = torch.zeros_like(p)
+        val[..., 0:1] = 0.5*coef1*sech2
+        val[..., 1:2] = -0.5*coef2*sech2
+        return val
+    
     def dirichlet(self, p):
         """ The dirichlet boundary value of the solution
             INPUT:
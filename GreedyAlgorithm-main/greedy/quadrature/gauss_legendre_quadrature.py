@@ -1,10 +1,35 @@
 import numpy as np
-from .quadrature import Quadrature
+from .quadrature import Quadrature, TensorProductQuadrature
 
 ## =====================================
 ## quadrature points
 ## numpy    
 
+def _kink_lines(parameters, kinks):
+    # the kinks w*x + b = t of all neurons, as lines (w, b-t) with w != 0
+    parameters = np.asarray(parameters, dtype=np.float64)
+    parameters = parameters[np.abs(parameters[:,0:-1]).sum(axis=1) > 0, :]
+    lines = [np.concatenate((parameters[:,0:-1], parameters[:,-1:] - t), axis=1) for t in kinks]
+    return np.concatenate(lines, axis=0)
+
+def _split_polygon(polygon, line, tol):
+    # split a convex polygon (k-by-2, in order) by the line w*x + c = 0
+    s = polygon @ line[0:-1] + line[-1]
+    if (s >= -tol).all() or (s <= tol).all():
+        return [polygon]
+    negative, positive = [], []
+    for i in range(len(s)):
+        j = (i + 1) % len(s)
+        if s[i] <= tol:
+            negative.append(polygon[i])
+        if s[i] >= -tol:
+            positive.append(polygon[i])
+        if (s[i] < -tol and s[j] > tol) or (s[i] > tol and s[j] < -tol):
+            point = polygon[i] + s[i] / (s[i] - s[j]) * (polygon[j] - polygon[i])
+            negative.append(point)
+            positive.append(point)
+    return [np.array(part) for part in (negative, positive) if len(part) >= 3]
+
 class GaussLegendreDomain():
     
     def __init__(self, index, device):
@@ -53,12 +78,14 @@ class GaussLegendreDomain():
         return Quadrature(self.qtype, self.device, quadpts, weights, h)
         
             
-    def interval_quadpts(self, interval, h):
+    def interval_quadpts(self, interval, h, store=None):
         """ The Gauss-Lengendre quadrature information on a discretized mesh of 1d interval [a,b].
             Usually the mesh is uniform.
             INPUT:
                 interval: np.array object
                        h: np.array object, mesh size 
+                   store: a QuadratureStore, or None. If given, the quadrature is
+                          loaded from its memory-mapped files, built at the first time
             OUTPUT:
                  quadpts: npts-by-1
                  weights: npts-by-1
@@ -69,6 +96,9 @@ class GaussLegendreDomain():
             h = np.array([0.01], dtype=np.float64)
         """
 
+        if store is not None:
+            return store.load(self.interval_quadpts, interval, h)
+
         N = int((interval[0][1] - interval[0][0])/h) + 1
         xp = np.linspace(interval[0][0], interval[0][1], N)
         quadpts = (self.quadpts*h + xp[0:-1] + xp[1:]) / 2
@@ -97,12 +127,48 @@ class GaussLegendreDomain():
         h = h.flatten().reshape(-1,1)  
         return Quadrature(self.qtype, self.device, quadpts, weights, h)
     
-    def rectangle_quadpts(self, rectangle, h):
+    def interval_quadpts_kinks(self, interval, h, parameters, kinks=(0.,)):
+        """ The Gauss-Lengendre quadrature information on a uniform mesh of 1d interval [a,b],
+            with the kinks of neurons inserted as breakpoints. So the products of relu^k or
+            bspline neurons are integrated exactly, once (index + 1) points are enough for
+            their polynomial degree.
+            INPUT:
+                interval: np.array object
+                       h: np.array object, mesh size
+              parameters: np.array object, n-by-2, the (w,b) of neurons
+                   kinks: the kinks t of activation, see ActivationFunction.kinks()
+            OUTPUT:
+                 quadpts: npts-by-1
+                 weights: npts-by-1, scaled by the length of subintervals
+                       h:  shape=[1]
+        """
+
+        N = int((interval[0][1] - interval[0][0])/h) + 1
+        xp = np.linspace(interval[0][0], interval[0][1], N)
+
+        # insert the kinks inside the interval, and drop the tiny subintervals
+        lines = _kink_lines(parameters, kinks)
+        points = -lines[:,1] / lines[:,0]
+        points = points[(points > xp[0]) & (points < xp[-1])]
+        xp = np.union1d(xp, points)
+        keep = np.diff(xp) > 1e-12 * h
+        xp = np.concatenate((xp[0:1], xp[1:][keep]))
+
+        lengths = xp[1:] - xp[0:-1]
+        quadpts = (self.quadpts*lengths + xp[0:-1] + xp[1:]) / 2
+        weights = self.weights * lengths / h
+        quadpts = quadpts.flatten().reshape(-1,1)
+        weights = weights.flatten().reshape(-1,1)
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
+
+    def rectangle_quadpts(self, rectangle, h, store=None):
         """ The Gauss-Lengendre quadrature information on a discretized mesh of 2d rectangle [a,b]*[c,d].
             Usually the mesh is uniform.
             INPUT:
                 interval: np.array object
                        h: np.array object, mesh sizes
+                   store: a QuadratureStore, or None. If given, the quadrature is
+                          loaded from its memory-mapped files, built at the first time
             OUTPUT:
                  quadpts: npts-by-2
                  weights: npts-by-1
@@ -112,6 +178,9 @@ class GaussLegendreDomain():
             rectangle = np.array([[0, 1], [0, 1]], dtype=np.float64)
             h = np.array([0.01, 0.01], dtype=np.float64)
         """
+
+        if store is not None:
+            return store.load(self.rectangle_quadpts, rectangle, h)
         
         Nx = int((rectangle[0][1] - rectangle[0][0])/h[0]) + 1
         Ny = int((rectangle[1][1] - rectangle[1][0])/h[1]) + 1
@@ -135,13 +204,118 @@ class GaussLegendreDomain():
         weights = weights_x * weights_y
 
         return Quadrature(self.qtype, self.device, quadpts, weights, h)
+
+    def rectangle_quadpts_kinks(self, rectangle, h, parameters, kinks=(0.,)):
+        """ The Gauss-Lengendre quadrature information on a uniform mesh of 2d rectangle [a,b]*[c,d],
+            where the cells cut by the kinks of neurons, i.e., the lines w*x + b = t, are split into
+            convex polygons. The polygons are triangulated and integrated by the collapsed (Duffy)
+            Gauss-Lengendre rule, so the products of relu^k or bspline neurons are integrated
+            exactly, once (index + 1) points are enough for their polynomial degree.
+            INPUT:
+               rectangle: np.array object
+                       h: np.array object, mesh sizes
+              parameters: np.array object, n-by-3, the (w,b) of neurons
+                   kinks: the kinks t of activation, see ActivationFunction.kinks()
+            OUTPUT:
+                 quadpts: npts-by-2, the uncut cells first
+                 weights: npts-by-1, scaled by the area of pieces
+                       h:  shape=[2]
+        """
+
+        Nx = int((rectangle[0][1] - rectangle[0][0])/h[0]) + 1
+        Ny = int((rectangle[1][1] - rectangle[1][0])/h[1]) + 1
+        x = np.linspace(rectangle[0][0], rectangle[0][1], Nx)
+        y = np.linspace(rectangle[1][0], rectangle[1][1], Ny)
+        X, Y = np.meshgrid(x, y)
+
+        # the lines cutting each cell, i.e., changing sign on its corners
+        lines = _kink_lines(parameters, kinks)
+        tol = 1e-12 * max(h)
+        cuts = {}
+        for n, line in enumerate(lines):
+            s = (line[0]*X + line[1]*Y + line[2]) / np.linalg.norm(line[0:2])
+            corners = np.stack((s[0:-1,0:-1], s[0:-1,1:], s[1:,0:-1], s[1:,1:]))
+            for cell in np.flatnonzero((corners.min(axis=0) < -tol) & (corners.max(axis=0) > tol)):
+                cuts.setdefault(cell, []).append(n)
+        cut = np.zeros((Ny-1)*(Nx-1), dtype=bool)
+        cut[list(cuts.keys())] = True
+
+        # the tensor rule on the uncut cells
+        cx = ((x[0:-1] + x[1:]) / 2)[None,:].repeat(Ny-1, axis=0).flatten()[~cut]
+        cy = ((y[0:-1] + y[1:]) / 2)[:,None].repeat(Nx-1, axis=1).flatten()[~cut]
+        qx, qy = np.meshgrid(self.quadpts.flatten(), self.quadpts.flatten())
+        wx, wy = np.meshgrid(self.weights.flatten(), self.weights.flatten())
+        xpt = cx[:,None] + qx.flatten()[None,:] * h[0] / 2
+        ypt = cy[:,None] + qy.flatten()[None,:] * h[1] / 2
+        quadpts = [np.stack((xpt.flatten(), ypt.flatten()), axis=1)]
+        weights = [np.tile((wx*wy).flatten(), len(cx)).reshape(-1,1)]
+
+        # split the cut cells, and triangulate the pieces from their first vertices
+        triangles = []
+        for cell, indices in cuts.items():
+            i, j = divmod(cell, Nx-1)
+            polygons = [np.array([[x[j],y[i]], [x[j+1],y[i]], [x[j+1],y[i+1]], [x[j],y[i+1]]])]
+            for n in indices:
+                polygons = [part for polygon in polygons for part in _split_polygon(polygon, lines[n], tol)]
+            for polygon in polygons:
+                for k in range(1, len(polygon)-1):
+                    triangles.append((polygon[0], polygon[k], polygon[k+1]))
+
+        # the collapsed rule on triangles, x = P0 + u*(P1-P0) + u*v*(P2-P1), with
+        # jacobian 2*area*u, so one more point in u keeps the algebraic precision
+        if len(triangles) > 0:
+            P0, P1, P2 = [np.array(P) for P in zip(*triangles)]
+            collapsed = GaussLegendreDomain(len(self.quadpts), self.device)
+            u = ((collapsed.quadpts.flatten() + 1) / 2)[:,None].repeat(len(self.quadpts), axis=1).flatten()
+            v = ((self.quadpts.flatten() + 1) / 2)[None,:].repeat(len(u) // len(self.quadpts), axis=0).flatten()
+            wu = collapsed.weights.flatten()[:,None].repeat(len(self.quadpts), axis=1).flatten()
+            wv = self.weights.flatten()[None,:].repeat(len(u) // len(self.quadpts), axis=0).flatten()
+            E1, E2 = P1 - P0, P2 - P1
+            area2 = np.abs(E1[:,0]*E2[:,1] - E1[:,1]*E2[:,0])
+            pts = P0[:,None,:] + u[None,:,None] * (E1[:,None,:] + v[None,:,None] * E2[:,None,:])
+            wts = area2[:,None] * (wu * wv * u)[None,:] / (h[0] * h[1])
+            quadpts.append(pts.reshape(-1,2))
+            weights.append(wts.reshape(-1,1))
+
+        quadpts = np.concatenate(quadpts, axis=0)
+        weights = np.concatenate(weights, axis=0)
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
+
+    def tensor_product_quadpts(self, domain, h):
+        """ The lazy Gauss-Lengendre quadrature information on a uniform mesh of the box domain 
+            in any dimension, which keeps only the 1d nodes and weights of each axis, with memory
+            O(N*d) instead of O(N^d). The points are in the same order as rectangle_quadpts and
+            cuboid_quadpts.
+            INPUT:
+                  domain: np.array object, d-by-2
+                       h: np.array object, mesh sizes
+            OUTPUT:
+                 a TensorProductQuadrature object
+            Examples
+            -------
+            cuboid = np.array([[0, 1], [0, 1], [0, 1]], dtype=np.float64)
+            h = np.array([0.01, 0.01, 0.01], dtype=np.float64)
+        """
+        
+        nodes = []
+        weights = []
+        for i in range(domain.shape[0]):
+            N = int((domain[i][1] - domain[i][0])/h[i]) + 1
+            x = np.linspace(domain[i][0], domain[i][1], N)
+            xp = (self.quadpts*h[i] + x[0:-1] + x[1:]) / 2
+            nodes.append(xp.flatten())
+            weights.append(np.tile(self.weights, xp.shape[1]).flatten())
+            
+        return TensorProductQuadrature(self.qtype, self.device, nodes, weights, h)
     
-    def cuboid_quadpts(self, cuboid, h):
+    def cuboid_quadpts(self, cuboid, h, store=None):
         """ The Gauss-Lengendre quadrature information on a discretized mesh of 3d cuboid [a,b]*[c,d]*[e,f].
             Usually the mesh is uniform.
             INPUT:
                 interval: np.array object
                        h: np.array object, mesh sizes 
+                   store: a QuadratureStore, or None. If given, the quadrature is
+                          loaded from its memory-mapped files, built at the first time
             OUTPUT:
                  quadpts: npts-by-3
                  weights: npts-by-1
@@ -152,6 +326,9 @@ class GaussLegendreDomain():
             h = np.array([0.1, 0.1, 0.1], dtype=np.float64)
         """
 
+        if store is not None:
+            return store.load(self.cuboid_quadpts, cuboid, h)
+
         Nx = int((cuboid[0][1] - cuboid[0][0])/h[0]) + 1
         Ny = int((cuboid[1][1] - cuboid[1][0])/h[1]) + 1
         Nz = int((cuboid[2][1] - cuboid[2][0])/h[2]) + 1
@@ -195,17 +372,26 @@ class GaussLegendreQuadrature(GaussLegendreDomain):
     def point_quadpts(self, point):
         return super().point_quadpts(point)
 
-    def interval_quadpts(self, interval, h):
-        return super().interval_quadpts(interval, h)
+    def interval_quadpts(self, interval, h, store=None):
+        return super().interval_quadpts(interval, h, store)
 
     def interval_quadpts_exact(self, x, h):
         return super().interval_quadpts_exact(x, h)
 
-    def rectangle_quadpts(self, rectangle, h):
-        return super().rectangle_quadpts(rectangle, h)
+    def interval_quadpts_kinks(self, interval, h, parameters, kinks=(0.,)):
+        return super().interval_quadpts_kinks(interval, h, parameters, kinks)
+
+    def rectangle_quadpts(self, rectangle, h, store=None):
+        return super().rectangle_quadpts(rectangle, h, store)
+
+    def rectangle_quadpts_kinks(self, rectangle, h, parameters, kinks=(0.,)):
+        return super().rectangle_quadpts_kinks(rectangle, h, parameters, kinks)
+
+    def tensor_product_quadpts(self, domain, h):
+        return super().tensor_product_quadpts(domain, h)
 
-    def cuboid_quadpts(self, cuboid, h):
-        return super().cuboid_quadpts(cuboid, h)
+    def cuboid_quadpts(self, cuboid, h, store=None):
+        return super().cuboid_quadpts(cuboid, h, store)
 
     def interval_boundary_quadpts(self, interval):
 
@@ -15,9 +15,17 @@ class MonteCarloDomain():
         self.device = device
         self.qtype = "MC"
 
-    def interval_samples(self, interval, number_of_samples):
+    def interval_samples(self, interval, number_of_samples, store=None, seed=None):
         """ The Monte Carlo information on 1d interval [a,b].
+            The samples are drawn with the seed of numpy.random, if given. With a
+            QuadratureStore, they are saved once and loaded from the memory-mapped
+            files afterwards.
         """  
+        if store is not None:
+            return store.load(self.interval_samples, interval, number_of_samples, seed=seed)
+        if seed is not None:
+            np.random.seed(seed)
+
         measure = interval[0][1] - interval[0][0]
         quadpts = interval[0][0] + np.random.rand(number_of_samples, 1) * measure
         quadpts = quadpts.astype(np.float64)
@@ -25,10 +33,18 @@ class MonteCarloDomain():
         h = np.array([1 / number_of_samples])
         return Quadrature(self.qtype, self.device, quadpts, weights, h)
 
-    def rectangle_samples(self, rectangle, number_of_samples):
+    def rectangle_samples(self, rectangle, number_of_samples, store=None, seed=None):
         """ The Monte Carlo information on 2d rectangle [a,b]*[c,d].
+            The samples are drawn with the seed of numpy.random, if given. With a
+            QuadratureStore, they are saved once and loaded from the memory-mapped
+            files afterwards.
         """    
 
+        if store is not None:
+            return store.load(self.rectangle_samples, rectangle, number_of_samples, seed=seed)
+        if seed is not None:
+            np.random.seed(seed)
+
         measure_0 = rectangle[0][1] - rectangle[0][0]
         measure_1 = rectangle[1][1] - rectangle[1][0]
         measure = measure_0 * measure_1
@@ -44,10 +60,18 @@ class MonteCarloDomain():
 
         return Quadrature(self.qtype, self.device, quadpts, weights, h)        
 
-    def cuboid_samples(self, cuboid, number_of_samples):
+    def cuboid_samples(self, cuboid, number_of_samples, store=None, seed=None):
         """ The Monte Carlo information on 3d cuboid [a,b]*[c,d]*[e,f].
+            The samples are drawn with the seed of numpy.random, if given. With a
+            QuadratureStore, they are saved once and loaded from the memory-mapped
+            files afterwards.
         """    
 
+        if store is not None:
+            return store.load(self.cuboid_samples, cuboid, number_of_samples, seed=seed)
+        if seed is not None:
+            np.random.seed(seed)
+
         measure_0 = cuboid[0][1] - cuboid[0][0]
         measure_1 = cuboid[1][1] - cuboid[1][0]
         measure_2 = cuboid[2][1] - cuboid[2][0]
@@ -131,14 +155,14 @@ class MonteCarloQuadrature(MonteCarloDomain):
     def __init__(self, device):
         super(MonteCarloQuadrature, self).__init__(device)
 
-    def interval_samples(self, interval, number_of_samples):
-        return super().interval_samples(interval, number_of_samples)
+    def interval_samples(self, interval, number_of_samples, store=None, seed=None):
+        return super().interval_samples(interval, number_of_samples, store, seed)
 
-    def rectangle_samples(self, rectangle, number_of_samples):
-        return super().rectangle_samples(rectangle, number_of_samples)
+    def rectangle_samples(self, rectangle, number_of_samples, store=None, seed=None):
+        return super().rectangle_samples(rectangle, number_of_samples, store, seed)
 
-    def cuboid_samples(self, cuboid, number_of_samples):
-        return super().cuboid_samples(cuboid, number_of_samples)
+    def cuboid_samples(self, cuboid, number_of_samples, store=None, seed=None):
+        return super().cuboid_samples(cuboid, number_of_samples, store, seed)
 
     def circle_samples(self, center, radius, number_of_samples):
         return super().circle_samples(center, radius, number_of_samples)
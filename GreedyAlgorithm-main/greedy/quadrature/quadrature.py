@@ -14,4 +14,96 @@ class Quadrature(object):
         return self.weights.shape[0]
 
     def get_dimension(self):
-        return self.quadpts.shape[1]   
\ No newline at end of file
+        return self.quadpts.shape[1]   
+
+class TensorProductQuadrature(object):
+    def __init__(self, qtype, device, nodes, weights, h):
+        """ A lazy tensor-product quadrature, which keeps only the 1d nodes and weights
+            of each axis, and hands out the points in tiles. The points are ordered as
+            rectangle_quadpts and cuboid_quadpts, i.e., the meshgrid of the axes with
+            the 2nd axis slowest, then the 1st, 3rd, ... axes.
+            INPUT:
+                nodes: a list of 1d np.array objects, the nodes of each axis
+                weights: a list of 1d np.array objects, the weights of each axis
+                h: np.array object, mesh sizes
+        """
+        self.qtype = qtype
+        self.device = device
+        self.nodes = [torch.from_numpy(np.asarray(x).flatten()).type(dtype=torch.float64).to(device) for x in nodes]
+        self.weights_1d = [torch.from_numpy(np.asarray(w).flatten()).type(dtype=torch.float64).to(device) for w in weights]
+        h = torch.tensor(h).type(dtype=torch.float64).to(device)
+        self.area = torch.prod(h)
+        
+        # the axes from the slowest to the fastest in the flattened order
+        dim = len(self.nodes)
+        self.layout = [1, 0] + list(range(2, dim)) if dim >= 2 else [0]
+        self.shape = [len(self.nodes[axis]) for axis in self.layout]
+
+    def get_number_of_points(self):
+        return int(np.prod(self.shape))
+
+    def get_dimension(self):
+        return len(self.nodes)
+
+    def get_tile(self, start, end):
+        """ The points (npts-by-d) and weights (npts-by-1) of flattened indices [start, end).
+        """
+        index = torch.arange(start, end, device=self.device)
+        quadpts = torch.zeros(end - start, self.get_dimension()).to(self.device)
+        weights = torch.ones(end - start, 1).to(self.device)
+        for axis, n in zip(reversed(self.layout), reversed(self.shape)):
+            index, i = torch.div(index, n, rounding_mode='floor'), index % n
+            quadpts[:,axis] = self.nodes[axis][i]
+            weights[:,0] *= self.weights_1d[axis][i]
+        return (quadpts, weights)
+
+    def tiles(self, tile_size):
+        """ Generate the (quadpts, weights) tiles of at most tile_size points.
+        """
+        num_points = self.get_number_of_points()
+        for start in range(0, num_points, tile_size):
+            yield self.get_tile(start, min(start + tile_size, num_points))
+
+    def integrate(self, func, tile_size=2**20):
+        """ The integral of func (npts-by-m values) tile by tile.
+        """
+        value = 0
+        for quadpts, weights in self.tiles(tile_size):
+            value = value + torch.sum(func(quadpts) * weights, dim=0)
+        return value * self.area
+
+    def integrate_separable(self, funcs):
+        """ The integral of a separable integrand prod_i funcs[i](x_i), axis by axis, 
+            where funcs[i] maps the 1d nodes (n_i) to values (n_i).
+        """
+        value = self.area
+        for x, w, func in zip(self.nodes, self.weights_1d, funcs):
+            value = value * torch.sum(func(x) * w)
+        return value
+
+    def weigh(self, values):
+        """ The npts-by-m values times the weights of their points, in the flattened order,
+            by broadcasting the 1d weights of each axis, without the dense weights.
+        """
+        values = values.reshape(self.shape + [-1])
+        for position, axis in enumerate(self.layout):
+            shape = [1] * (len(self.shape) + 1)
+            shape[position] = -1
+            values = values * self.weights_1d[axis].reshape(shape)
+        return values.reshape(self.get_number_of_points(), -1)
+
+    def reduce(self, values):
+        """ The integrals of m-by-npts values on all the points, in the flattened order,
+            by contracting the factored weights axis by axis, without the dense weights.
+        """
+        values = values.reshape([-1] + self.shape)
+        for axis in reversed(self.layout):
+            values = torch.matmul(values, self.weights_1d[axis])
+        return values.reshape(-1,1) * self.area
+
+    def materialize(self):
+        """ The Quadrature object of all the points.
+        """
+        quadpts, weights = self.get_tile(0, self.get_number_of_points())
+        h = np.array([self.area.item()])
+        return Quadrature(self.qtype, self.device, quadpts.cpu().numpy(), weights.cpu().numpy(), h)
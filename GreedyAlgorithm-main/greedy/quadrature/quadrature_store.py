@@ -0,0 +1,84 @@
+import os
+import hashlib
+import numpy as np
+from .quadrature import Quadrature
+
+## =====================================
+## on-disk quadrature
+## numpy
+
+class QuadratureStore():
+
+    def __init__(self, directory):
+        """ An on-disk store of quadrature information, keyed by (qtype, builder, domain, h,
+            index, seed). The points and weights are saved as .npy files once, and loaded by
+            memory mapping, so repeated runs skip the rebuild and share one page-cache copy.
+            Examples
+            -------
+            store = QuadratureStore("./quadrature_cache")
+            gl_quad = GaussLegendreDomain(index, device)
+            quadrature = store.load(gl_quad.cuboid_quadpts, cuboid, h, index=index)
+            quadrature = gl_quad.cuboid_quadpts(cuboid, h, store=store)
+
+            INPUT:
+                directory: the directory of .npy files, created if not existing.
+        """
+
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_key(self, qtype, name, domain, h, index, seed):
+
+        # a readable prefix and the hash of all the arguments
+        args = (qtype, name, np.asarray(domain, dtype=np.float64).tolist(),
+                np.asarray(h, dtype=np.float64).tolist(), index, seed)
+        digest = hashlib.sha1(repr(args).encode()).hexdigest()[0:16]
+        return '{}_{}_{}'.format(qtype, name, digest)
+
+    def _save(self, path, array):
+
+        # write a temporary file first, so other processes never load a partial file
+        temp = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp, 'wb') as file:
+            np.save(file, array)
+        os.replace(temp, path)
+
+    def load(self, sampling, domain, h, index=None, seed=None):
+        """ Load the quadrature generated by sampling(domain, h), which is built and saved
+            at the first time.
+            INPUT:
+                sampling: a bound builder, e.g., GaussLegendreDomain(...).cuboid_quadpts,
+                          or MonteCarloDomain(...).cuboid_samples with h the number of samples.
+                  domain: np.array object
+                       h: np.array object, mesh sizes, or the number of samples
+                   index: the index of Gauss-Legendre quadrature, only used in the key,
+                          by default taken from the builder
+                    seed: the seed of numpy.random for random samples
+            OUTPUT:
+                quadrature: a Quadrature object, whose points and weights are memory mapped
+                            (copy-on-write) on cpu
+        """
+
+        # the reference rule (and the boundary index) of Gauss-Legendre builders
+        builder = sampling.__self__
+        if index is None and hasattr(builder, 'quadpts'):
+            index = (len(builder.quadpts) - 1, getattr(builder, 'index', None))
+        key = self._get_key(builder.qtype, sampling.__name__, domain, h, index, seed)
+        paths = [os.path.join(self.directory, '{}_{}.npy'.format(key, item))
+                    for item in ('quadpts', 'weights', 'area')]
+
+        # build and save at the first time
+        if not all(os.path.exists(path) for path in paths):
+            if seed is not None:
+                np.random.seed(seed)
+            quadrature = sampling(domain, h)
+            self._save(paths[0], quadrature.quadpts.cpu().numpy())
+            self._save(paths[1], quadrature.weights.cpu().numpy())
+            self._save(paths[2], quadrature.area.cpu().numpy().reshape(1))
+
+        # torch.from_numpy shares the mapped memory, without copying, and
+        # the area is passed as h of length one
+        quadpts = np.load(paths[0], mmap_mode='c')
+        weights = np.load(paths[1], mmap_mode='c')
+        area = np.load(paths[2])
+        return Quadrature(builder.qtype, builder.device, quadpts, weights, area)
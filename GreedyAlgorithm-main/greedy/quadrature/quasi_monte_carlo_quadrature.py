@@ -1,5 +1,5 @@
 import numpy as np
-from quadrature import Quadrature
+from .quadrature import Quadrature
 
 ## =====================================
 ## deterministic samples
@@ -16,10 +16,16 @@ class QuasiMonteCarloQuadrature():
                         qmc = QuasiMonteCarloQuadrature(device)
                         samples = qmc.n_rectangle_samples(n_rectangle, number_of_samples).
                         
-            Otherwise there is another version (much slower when large amount):
+            Otherwise there is the vectorized version, optionally leaped and scrambled:
             
                         samples = qmc._n_rectangle_samples(n_rectangle, number_of_samples).
             
+            For a large amount of samples, the scrambled Sobol (or Halton) sequence is
+            generated chunk by chunk, where the sum of integrals over chunks is the integral:
+            
+                        for samples in qmc.n_rectangle_chunks(n_rectangle, number_of_samples):
+                            ...
+            
         Args:
                 device: cuda/cpu
         """     
@@ -46,36 +52,116 @@ class QuasiMonteCarloQuadrature():
         return prime[index]
         
         
-    def _get_standard_halton(self, number_of_samples, prime_base):
-        """ Halton sequence on the standard domain [0,1].
+    def _get_permutations(self, prime_base, number_of_digits, seed):
+        """ Random permutations of the digits 1, ..., prime_base-1 at each digit position, 
+            where the digit 0 is fixed, so the scrambled radical inverse is still finite.
+        """
+        
+        rng = np.random.default_rng(seed)
+        permutations = np.zeros((number_of_digits, prime_base), dtype=np.int64)
+        for j in range(number_of_digits):
+            permutations[j,1:] = 1 + rng.permutation(prime_base - 1)
+        return permutations
+        
+        
+    def _get_table(self, prime_base, permutations):
+        
+        # radical inverse of all the m-digit numbers, m = len(permutations)
+        m = len(permutations)
+        numbers = np.arange(prime_base**m, dtype=np.int64)
+        table = np.zeros(prime_base**m)
+        for l in range(m):
+            digits = (numbers // prime_base**l) % prime_base
+            table += permutations[l][digits] * float(prime_base)**(-(l+1))
+        return table
+    
+    
+    def _get_consecutive_halton(self, first, number_of_samples, prime_base, permutations, group):
+        
+        # for the consecutive indices, the lowest m digits run through the table cyclically 
+        # and the higher digits are constant on each cycle, so no division is needed
+        m = min(group, len(permutations))
+        M = prime_base**m
+        table = self._get_table(prime_base, permutations[0:m])
+        r, q = first % M, first // M
+        sequence = np.resize(np.roll(table, -r), number_of_samples)
+        if m == len(permutations):
+            return sequence
+        
+        # the higher digits on each cycle, with the length of cycles
+        number_of_cycles = (r + number_of_samples - 1) // M + 1
+        higher = self._get_consecutive_halton(q, number_of_cycles, prime_base, permutations[m:], group)
+        lengths = np.full(number_of_cycles, M)
+        lengths[0] = M - r
+        sequence += np.repeat(higher * float(prime_base)**(-m), lengths)[0:number_of_samples]
+        return sequence
+        
+        
+    def _get_standard_halton(self, number_of_samples, prime_base, start=0, leap=1, scramble=False, seed=None):
+        """ Halton sequence on the standard domain [0,1], by the vectorized radical inverse 
+            of the indices start+1, start+1+leap, ..., which reads a group of digits at once 
+            from a lookup table of at most 2^16 entries. 
         
         Args:
                 number_of_samples: the length of Halton sequence
                 prime_base: the prime number by which [0,1] will be divided
+                start: the number of skipped samples, e.g., of previous chunks
+                leap: the leap between two used samples, a prime other than the bases
+                scramble: option for the random permutations of the digits
+                seed: the seed of permutations
         """
         
-        sequence  = np.zeros(number_of_samples)
-        numer_of_bits = int(1 + np.ceil(np.log(number_of_samples)/np.log(prime_base)))
-        
-        frac_base = prime_base ** (-(np.linspace(1,numer_of_bits,numer_of_bits)))
-        working_base = np.zeros(numer_of_bits)
-        
-        for i in range(number_of_samples):
-            j = 0
-            condition = True
-            while condition:
-                working_base[j] += 1
-                if working_base[j] < prime_base:
-                    condition = False
-                else:
-                    working_base[j] = 0
-                    j += 1 
-            sequence[i] = np.dot(working_base, frac_base)
+        last = start + 1 + leap * (number_of_samples - 1)
+        numer_of_bits = int(1 + np.ceil(np.log(last + 1) / np.log(prime_base)))
+        if scramble:
+            permutations = self._get_permutations(prime_base, numer_of_bits, seed)
+        else:
+            permutations = np.tile(np.arange(prime_base, dtype=np.int64), (numer_of_bits, 1))
+        
+        # the number of digits read at once
+        group = max(1, int(np.log(2**16) / np.log(prime_base)))
+        if leap == 1:
+            return self._get_consecutive_halton(start + 1, number_of_samples, prime_base, permutations, group)
+        
+        indices = start + 1 + leap * np.arange(number_of_samples, dtype=np.int64)
+        sequence = np.zeros(number_of_samples)
+        scale = 1.
+        j = 0
+        while j < numer_of_bits:
+            m = min(group, numer_of_bits - j)
+            table = self._get_table(prime_base, permutations[j:j+m])
+            indices, digits = np.divmod(indices, prime_base**m)
+            sequence += scale * table[digits]
+            scale = scale * float(prime_base)**(-m)
+            j += m
             
         return sequence
+    
+    
+    def halton_sequence(self, number_of_samples, dim, start=0, leap=1, scramble=False, seed=None):
+        """ Halton sequence on the standard domain [0,1]^dim, with the first dim primes as bases.
+        """
+        
+        sequence = np.zeros((number_of_samples, dim))
+        for i in range(dim):
+            seed_i = None if seed is None else seed + i
+            sequence[...,i] = self._get_standard_halton(number_of_samples, self._prime(i), 
+                                                        start, leap, scramble, seed_i)
+        return sequence
+    
+    
+    def _scale_samples(self, n_rectangle, sample, number_of_samples):
+        
+        # scale the standard samples to the rectangle, with equal weights
+        lengths = n_rectangle[...,1] - n_rectangle[...,0]
+        quadpts = n_rectangle[...,0] + lengths * sample
+        measure = lengths.prod()
+        weights = measure * np.ones((quadpts.shape[0],1)).astype(np.float64) 
+        h = np.array([1 / number_of_samples])
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
         
         
-    def _n_rectangle_samples(self, n_rectangle, number_of_samples):
+    def _n_rectangle_samples(self, n_rectangle, number_of_samples, leap=1, scramble=False, seed=None):
         """ The Quasi-Monte-Carlo method supports generating samples in any dimension
             but only in domains with rectangle shapes. Standard sequence of samples will
             be generated in [0,1]^n with n the dimensionality. However, scaling process
@@ -84,27 +170,17 @@ class QuasiMonteCarloQuadrature():
         Args:
             n_rectangle (np.array): rectangle in any dimension
             number_of_samples (int): total number of samples
+            leap (int): the leap of Halton sequence
+            scramble (bool): option for the scrambled Halton sequence
+            seed (int): the seed of scrambling
         """
         
         # dimensionality 
         dim = n_rectangle.shape[0]
         
         # get scaled qmc sequence 
-        lengths = np.zeros(dim)
-        quadpts = np.zeros((number_of_samples, dim))
-        for i in range(dim):
-            prime = self._prime(i)
-            length = n_rectangle[i][1] - n_rectangle[i][0]
-            sequence = self._get_standard_halton(number_of_samples, prime)
-            quadpts[...,i] = n_rectangle[i][0] + length * sequence
-            lengths[i] = length
-        
-        # get volumn (measure) of domain
-        measure = lengths.prod()
-        weights = measure * np.ones((quadpts.shape[0],1)).astype(np.float64) 
-        h = np.array([1 / number_of_samples])
-        
-        return Quadrature(self.device, quadpts, weights, h)      
+        sample = self.halton_sequence(number_of_samples, dim, leap=leap, scramble=scramble, seed=seed)
+        return self._scale_samples(n_rectangle, sample, number_of_samples)
             
     
     def n_rectangle_samples(self, n_rectangle, number_of_samples):
@@ -129,5 +205,134 @@ class QuasiMonteCarloQuadrature():
         weights = measure * np.ones((quadpts.shape[0],1)).astype(np.float64) 
         h = np.array([1 / number_of_samples])
         
-        return Quadrature(self.device, quadpts, weights, h)      
-        
\ No newline at end of file
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
+    
+    
+    def n_rectangle_chunks(self, n_rectangle, number_of_samples, chunk_size=2**20, sequence="sobol", seed=None):
+        """ The scrambled Quasi-Monte-Carlo samples on a rectangle in any dimension, generated
+            and yielded chunk by chunk, so only one chunk is held in memory. Each chunk is 
+            weighted as a part of all the samples, i.e., the integral is the sum over chunks.
+
+        Args:
+            n_rectangle (np.array): rectangle in any dimension
+            number_of_samples (int): total number of samples
+            chunk_size (int): number of samples in each chunk, a power of 2 for Sobol
+            sequence (str): "sobol" (needs scipy.stats.qmc) or "halton"
+            seed (int): the seed of scrambling
+        """
+        
+        # dimensionality
+        dim = n_rectangle.shape[0]
+        
+        if sequence == "sobol":
+            from scipy.stats import qmc 
+            sampler = qmc.Sobol(d=dim, scramble=True, seed=seed)
+        elif sequence != "halton":
+            raise RuntimeError("Such QMC sequence is not supported.")
+        
+        for start in range(0, number_of_samples, chunk_size):
+            n = min(chunk_size, number_of_samples - start)
+            if sequence == "sobol":
+                sample = sampler.random(n)
+            else:
+                sample = self.halton_sequence(n, dim, start=start, scramble=True, seed=seed)
+            yield self._scale_samples(n_rectangle, sample, number_of_samples)
+            
+            
+    def interval_boundary_samples(self, interval):
+
+        quadpts = interval.reshape(-1,1).astype(np.float64)
+        weights = np.ones_like(quadpts).astype(np.float64)
+        h = np.array([1/2], dtype=np.float64)
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
+    
+    
+    def rectangle_boundary_samples(self, rectangle, number_of_each_hyperplane, scramble=False, seed=None):
+        """ The Quasi-Monte-Carlo information on the boundary of 2d rectangle [a,b]*[c,d],
+            with the same 1d Halton samples on each edge.
+        """
+        
+        sample = self._get_standard_halton(number_of_each_hyperplane, 2, scramble=scramble, seed=seed)
+        sample = sample.reshape(-1,1)
+        ones = np.ones_like(sample)
+        
+        quadpts = []
+        weights = []
+        for i in range(2):
+            length = rectangle[i][1] - rectangle[i][0]
+            for value in rectangle[1-i]:
+                pts = [None, None]
+                pts[i] = rectangle[i][0] + length * sample
+                pts[1-i] = value * ones
+                quadpts.append(np.concatenate(pts, axis=1))
+                weights.append(4 * length * ones)
+        
+        # four segments taken part when calculating
+        quadpts = np.concatenate(quadpts, axis=0)
+        weights = np.concatenate(weights, axis=0)
+        h = np.array([1/number_of_each_hyperplane/4], dtype=np.float64)
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
+    
+    
+    def cuboid_boundary_samples(self, cuboid, number_of_each_hyperplane, scramble=False, seed=None):
+        """ The Quasi-Monte-Carlo information on the boundary of 3d cuboid [a,b]*[c,d]*[e,f],
+            with the same 2d Halton samples on each face.
+        """
+        
+        sample = self.halton_sequence(number_of_each_hyperplane, 2, scramble=scramble, seed=seed)
+        ones = np.ones_like(sample[...,0:1])
+        
+        quadpts = []
+        weights = []
+        for i in range(3):
+            face = [j for j in range(3) if j != i]
+            lengths = cuboid[face,1] - cuboid[face,0]
+            for value in cuboid[i]:
+                pts = [None, None, None]
+                pts[face[0]] = cuboid[face[0]][0] + lengths[0] * sample[...,0:1]
+                pts[face[1]] = cuboid[face[1]][0] + lengths[1] * sample[...,1:2]
+                pts[i] = value * ones
+                quadpts.append(np.concatenate(pts, axis=1))
+                weights.append(6 * lengths.prod() * ones)
+        
+        # six faces taken part when calculating
+        quadpts = np.concatenate(quadpts, axis=0)
+        weights = np.concatenate(weights, axis=0)
+        h = np.array([1/number_of_each_hyperplane/6], dtype=np.float64)
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
+    
+    
+    def circle_boundary_samples(self, center, radius, number_of_samples, scramble=False, seed=None):
+        """ The Quasi-Monte-Carlo information on 2d circle's boundary, 
+            with theta = 2*pi * Y and Y the 1d Halton samples.
+        """
+        
+        pi = np.pi
+        measure = 2 * pi * radius
+        theta = 2 * pi * self._get_standard_halton(number_of_samples, 2, scramble=scramble, seed=seed)
+        quadpts_x = radius * np.cos(theta).reshape(-1,1) + center[0]
+        quadpts_y = radius * np.sin(theta).reshape(-1,1) + center[1]
+        quadpts = np.concatenate((quadpts_x, quadpts_y), axis=1).astype(np.float64)
+        weights = measure * np.ones((quadpts.shape[0],1)).astype(np.float64) 
+        h = np.array([1 / number_of_samples])
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
+    
+    
+    def sphere_boundary_samples(self, center, radius, number_of_samples, scramble=False, seed=None):
+        """ The Quasi-Monte-Carlo information on 3d shpere, by the area-preserving map of
+            2d Halton samples (Y, Z), i.e., phi = 2*pi * Y and theta = arcsin(2*Z - 1).
+        """
+        
+        pi = np.pi
+        measure = 4 * pi * radius**2
+        sample = self.halton_sequence(number_of_samples, 2, scramble=scramble, seed=seed)
+        phi = 2 * pi * sample[...,0:1]
+        theta = np.arcsin(2 * sample[...,1:2] - 1)
+        
+        quadpts_x = radius * np.cos(theta) * np.cos(phi) + center[0]
+        quadpts_y = radius * np.cos(theta) * np.sin(phi) + center[1]
+        quadpts_z = radius * np.sin(theta) + center[2]
+        quadpts = np.concatenate((quadpts_x, quadpts_y, quadpts_z), axis=1).astype(np.float64)
+        weights = measure * np.ones((quadpts.shape[0],1)).astype(np.float64) 
+        h = np.array([1 / number_of_samples])
+        return Quadrature(self.qtype, self.device, quadpts, weights, h)
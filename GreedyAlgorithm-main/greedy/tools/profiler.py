@@ -0,0 +1,241 @@
+"""
+Created on Sat Oct 17 19:08 2026
+
+@author: Jinpp (xianlincn@pku.edu.cn)
+@version: 1.0
+@brief: Structured instrumentation of the greedy training. The phases,
+        e.g., the dictionary scan, the optimizer refinement, the Galerkin
+        assembly and solve, and the error evaluation, are marked by
+                    with profiler.phase('scan'):
+                        ...
+        in the algorithm and the dictionaries. Each phase is always a
+        torch.profiler.record_function range, and once a GreedyProfiler
+        is active, its time, FLOPs and the calls of energy methods are
+        also recorded for each neuron, one JSON line per neuron, with
+        the peak memory of the step on gpu, or the peak resident size
+        of the whole process so far on cpu.
+@modifications: to be added
+"""
+
+import json
+import time
+import resource
+import torch
+from contextlib import contextmanager
+
+try:
+    from torch.utils._python_dispatch import TorchDispatchMode
+    from torch.utils.flop_counter import flop_registry
+except ImportError:
+    TorchDispatchMode = object
+    flop_registry = None
+
+# the active profiler, if any
+_active = None
+
+
+def phase(name):
+    """ A phase of the greedy training, named 'greedy.<name>' in torch.profiler. """
+    if _active is None:
+        return torch.profiler.record_function('greedy.' + name)
+    return _active.phase(name)
+
+
+def begin_step(k):
+    """ Start the record of the k-th neuron (from 0). """
+    if _active is not None:
+        _active.begin_step(k)
+
+
+def end_step(**values):
+    """ Finish the record of the current neuron, with extra values, e.g., errors. """
+    if _active is not None:
+        _active.end_step(**values)
+
+
+class _FlopCounter(TorchDispatchMode):
+
+    def __init__(self):
+        # the FLOPs of the operators in torch.utils.flop_counter, i.e., the
+        # matrix products and convolutions, without module or autograd hooks
+        super().__init__()
+        self.flops = 0
+
+    def __torch_dispatch__(self, func, types, args=(), kwargs=None):
+        kwargs = kwargs or {}
+        out = func(*args, **kwargs)
+        flop_count = flop_registry.get(func._overloadpacket)
+        if flop_count is not None:
+            self.flops += flop_count(*args, **kwargs, out_val=out)
+        return out
+
+
+class _CountedMethod():
+
+    def __init__(self, profiler, name, func):
+        # a bound method of the energy, whose calls are counted
+        self.profiler = profiler
+        self.name = name
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        self.profiler._count(self.name)
+        return self.func(*args, **kwargs)
+
+    def __reduce__(self):
+        # pickled as the method itself, e.g., for the parallel search
+        return (getattr, (self.func.__self__, self.func.__name__))
+
+
+class GreedyProfiler():
+
+    def __init__(self, path=None, energy=None,
+                 methods=('evaluate', 'evaluate_large_scale', 'get_stiffmat_border'),
+                 count_flops=True):
+        """
+            Examples
+            -------
+            with GreedyProfiler("oga_2d.jsonl", energy) as profiler:
+                oga.train()
+            print(profiler.summary())
+
+            INPUT:
+                path: the JSON-lines file of per-neuron records, or None.
+                energy: the energy whose calls of methods are counted in
+                        each phase, e.g., the evaluate calls of the scan and
+                        of the optimizer closures.
+                methods: the names of the counted energy methods.
+                count_flops: FLOP estimates of matrix products in each phase
+                             by torch.utils.flop_counter, which only counts
+                             the matrix products and convolutions.
+        """
+
+        self.path = path
+        self.energy = energy
+        self.methods = methods
+        self.count_flops = count_flops
+        if count_flops and flop_registry is None:
+            print(' torch.utils.flop_counter is not available, FLOPs are not counted.')
+            self.count_flops = False
+        self.use_gpu = torch.cuda.is_available()
+
+        # all records, and the record of the current neuron
+        self.records = []
+        self.record = None
+        self.current = None
+        self.file = None
+
+    def __enter__(self):
+        global _active
+        if self.path is not None:
+            self.file = open(self.path, 'w')
+        self._watch()
+        _active = self
+        return self
+
+    def __exit__(self, *args):
+        global _active
+        _active = None
+        self._unwatch()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return False
+
+    def _watch(self):
+
+        # count the calls by wrappers on the energy instance
+        if self.energy is None:
+            return
+        for name in self.methods:
+            func = getattr(self.energy, name, None)
+            if func is None:
+                continue
+            setattr(self.energy, name, _CountedMethod(self, name, func))
+
+    def _unwatch(self):
+        if self.energy is None:
+            return
+        for name in self.methods:
+            self.energy.__dict__.pop(name, None)
+
+    def _count(self, name):
+        if self.record is None:
+            return
+        calls = self.record['calls'].setdefault(self.current or 'other', {})
+        calls[name] = calls.get(name, 0) + 1
+
+    def _synchronize(self):
+        if self.use_gpu:
+            torch.cuda.synchronize()
+
+    @contextmanager
+    def phase(self, name):
+        """ Time a phase, the times of nested or repeated phases are added up. """
+        outer = self.current
+        self.current = name
+        counter = _FlopCounter() if (self.count_flops and outer is None) else None
+        with torch.profiler.record_function('greedy.' + name):
+            self._synchronize()
+            start = time.perf_counter()
+            try:
+                if counter is None:
+                    yield
+                else:
+                    with counter:
+                        yield
+            finally:
+                self._synchronize()
+                self.current = outer
+                if self.record is not None:
+                    times = self.record['time']
+                    times[name] = times.get(name, 0.) + time.perf_counter() - start
+                    if counter is not None:
+                        flops = self.record['flops']
+                        flops[name] = flops.get(name, 0) + counter.flops
+
+    def begin_step(self, k):
+        self.record = {'neuron': k+1, 'time': {}, 'calls': {}, 'flops': {}}
+        if self.use_gpu:
+            torch.cuda.reset_peak_memory_stats()
+        self.start = time.perf_counter()
+
+    def end_step(self, **values):
+        record = self.record
+        if record is None:
+            return
+        self._synchronize()
+        record['total_time'] = time.perf_counter() - self.start
+
+        # the peak of this step on gpu. On cpu, the tensors are not seen by
+        # tracemalloc, so only the peak resident size of the process since 
+        # its start is recorded, whose ru_maxrss is in kilobytes on linux
+        if self.use_gpu:
+            record['peak_memory'] = torch.cuda.max_memory_allocated()
+        else:
+            record['process_peak_memory'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        for key, value in values.items():
+            record[key] = value.item() if isinstance(value, torch.Tensor) else value
+
+        self.records.append(record)
+        if self.file is not None:
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+        self.record = None
+
+    def summary(self):
+        """
+            OUTPUT:
+                totals: the total time, FLOPs and calls of each phase over all
+                        the recorded neurons.
+        """
+        totals = {'time': {}, 'flops': {}, 'calls': {}}
+        for record in self.records:
+            for key in ('time', 'flops'):
+                for name, value in record[key].items():
+                    totals[key][name] = totals[key].get(name, 0) + value
+            for name, calls in record['calls'].items():
+                total_calls = totals['calls'].setdefault(name, {})
+                for method, n in calls.items():
+                    total_calls[method] = total_calls.get(method, 0) + n
+        return totals
@@ -0,0 +1,426 @@
+import sys
+sys.path.append('../')
+
+import io
+import os
+import json
+import time
+import platform
+import argparse
+import contextlib
+import torch
+import numpy as np
+from torch.nn.parameter import Parameter
+
+from greedy.pde import cos1d, cos2d, cos3d, poly1d, poly2d, sin1d, tanh2d, wave1d
+from greedy.model import shallownet
+from greedy.model import activation_function as af
+from greedy.model import neuron_dictionary_1d as ndict1d
+from greedy.model import neuron_dictionary_2d as ndict2d
+from greedy.model import neuron_dictionary_3d as ndict3d
+from greedy.lossfunction import fnm_L2fitting_1d, fnm_L2fitting_2d
+from greedy.lossfunction import fnm_elliptic_2nd_1d_nbc, fnm_elliptic_2nd_2d_nbc, fnm_elliptic_2nd_3d_nbc
+from greedy.lossfunction import fnm_elliptic_4th_1d_nbc, fnm_elliptic_4th_2d_nbc, fnm_poisson_1d_dbc
+from greedy.lossfunction import pinn_elliptic_2nd_1d_nbc, pinn_poisson_1d_dbc, pinn_poisson_2d_dbc
+from greedy.lossfunction import pinn_burgers_1d, pinn_allencahn_2d_dbc
+from greedy.quadrature import gauss_legendre_quadrature as gq
+from greedy.quadrature import monte_carlo_quadrature as mc
+from greedy.quadrature.quadrature import Quadrature
+from greedy.optimization import generator as gen
+from greedy.algorithm import orthogonal_greedy as og
+from greedy.tools.prettytable import PrettyTable
+
+# precision settings
+data_type = torch.float64
+torch.set_default_dtype(data_type)
+
+# device settings
+use_gpu = torch.cuda.is_available()
+device = torch.device("cuda" if use_gpu else "cpu")
+
+# the number of cells along each axis of quadrature, and the mesh size
+# of dictionary, which are scaled by the arguments. The 3D dictionary is
+# coarser than the example (1/10), whose scan takes minutes
+QUAD_CELLS = {1: 1000, 2: 30, 3: 10}
+DICT_MESH = {1: 1/1000, 2: 1/30, 3: 1/5}
+
+
+## =====================================
+## settings of energies, dictionaries and OGA runs
+
+def _interval_boundary(domain):
+    return torch.from_numpy(domain).to(device).reshape(-1,1)
+
+def _allencahn(activation, quadrature, domain, cells):
+
+    # (x,t) in (-1,1)*(0,1], spacial boundary x = -1,1 and initial time t = 0
+    gl_quad = gq.GaussLegendreDomain(1, device)
+    line = gl_quad.interval_quadpts(domain[1:2], np.array([1/cells]))
+    pts, wts = line.quadpts.cpu().numpy(), line.weights.cpu().numpy()
+    ones = np.ones_like(pts)
+    quadpts_bd = np.concatenate([np.concatenate([-ones, pts], axis=1), np.concatenate([ones, pts], axis=1)], axis=0)
+    quadrature_bd = Quadrature('GL', device, quadpts_bd, np.concatenate([wts, wts], axis=0), np.array([1/cells]))
+    quadpts_init = np.concatenate([2*pts-1, 0*ones], axis=1)
+    quadrature_init = Quadrature('GL', device, quadpts_init, wts, np.array([1/cells]))
+    pde = tanh2d.Datatanh_2d_DBC(0.01, 1.)
+    return pinn_allencahn_2d_dbc.PINN_AllenCahn_2d_DBC(activation, quadrature, quadrature_bd,
+                                                        quadrature_init, pde, device)
+
+# name: (dim, constructor(activation, quadrature, domain, cells))
+ENERGY_CASES = {
+    'fnm_L2fitting_1d': (1, lambda a, q, d, n: fnm_L2fitting_1d.FNM_L2fitting_1d(a, q, wave1d.DataWave_1d(), device)),
+    'fnm_L2fitting_2d': (2, lambda a, q, d, n: fnm_L2fitting_2d.FNM_L2fitting_2d(a, q, cos2d.DataCos_2nd_2d_NBC(), device)),
+    'fnm_elliptic_2nd_1d_nbc': (1, lambda a, q, d, n: fnm_elliptic_2nd_1d_nbc.FNM_Elliptic_2nd_1d_NBC(
+                                        a, q, cos1d.DataCos_2nd_1d_NBC(), device)),
+    'fnm_elliptic_2nd_2d_nbc': (2, lambda a, q, d, n: fnm_elliptic_2nd_2d_nbc.FNM_Elliptic_2nd_2d_NBC(
+                                        a, q, cos2d.DataCos_2nd_2d_NBC(), device)),
+    'fnm_elliptic_2nd_3d_nbc': (3, lambda a, q, d, n: fnm_elliptic_2nd_3d_nbc.FNM_Elliptic_2nd_3d_NBC(
+                                        a, q, cos3d.DataCos_2nd_3d_NBC(), device)),
+    'fnm_elliptic_4th_1d_nbc': (1, lambda a, q, d, n: fnm_elliptic_4th_1d_nbc.FNM_Elliptic_4th_1d_NBC(
+                                        a, q, poly1d.DataPoly_4th_1d_NBC(), device)),
+    'fnm_elliptic_4th_2d_nbc': (2, lambda a, q, d, n: fnm_elliptic_4th_2d_nbc.FNM_Elliptic_4th_2d_NBC(
+                                        a, q, poly2d.DataPoly_4th_2d_NBC(), device)),
+    'fnm_poisson_1d_dbc': (1, lambda a, q, d, n: fnm_poisson_1d_dbc.FNM_Poisson_1d_DBC(
+                                        a, q, _interval_boundary(d), 1e-3, cos1d.Data_poisson_1d_DBC(), device)),
+    'pinn_elliptic_2nd_1d_nbc': (1, lambda a, q, d, n: pinn_elliptic_2nd_1d_nbc.PINN_Elliptic_2nd_1d_NBC(
+                                        a, q, _interval_boundary(d), cos1d.DataCos_2nd_1d_NBC(), device)),
+    'pinn_poisson_1d_dbc': (1, lambda a, q, d, n: pinn_poisson_1d_dbc.PINN_Poisson_1d_DBC(
+                                        a, q, _interval_boundary(d), cos1d.Data_poisson_1d_DBC(), device)),
+    'pinn_poisson_2d_dbc': (2, lambda a, q, d, n: pinn_poisson_2d_dbc.PINN_Poisson_2d_DBC(
+                                        a, q, mc.MonteCarloQuadrature(device).rectangle_boundary_samples(d, 4*n),
+                                        cos2d.Data_Poisson_2d_DBC(), device)),
+    'pinn_burgers_1d_pbc': (1, lambda a, q, d, n: pinn_burgers_1d.PINN_Burgers_1d_PBC(
+                                        a, q, _interval_boundary(d), 1e-3, sin1d.DataSin_1d_PBC(), device)),
+    'pinn_allencahn_2d_dbc': (2, _allencahn),
+}
+
+# name: (example file, energy, activation, number of quadrature cells and dictionary mesh size)
+OGA_CASES = {
+    'fnm_elliptic_4th_1d_nbc': ('oga_fnm_elliptic_4th_1d_nbc.py', ('relu', 3), 1000, 1/1000),
+    'fnm_elliptic_2nd_2d_nbc': ('oga_fnm_elliptic_2nd_2d_nbc.py', ('relu', 2), 30, 1/30),
+    'fnm_L2fitting_2d': ('oga_fnm_L2fitting_2d.py', ('relu', 2), 30, 1/30),
+}
+
+DICTIONARIES = {1: ndict1d.NeuronDictionary1D, 2: ndict2d.NeuronDictionary2D, 3: ndict3d.NeuronDictionary3D}
+
+
+def get_activation(name):
+    # e.g., "relu:2", "bspline:3" or "sigmoid"
+    ftype, *degree = name.split(':')
+    return af.ActivationFunction(ftype, *[int(k) for k in degree])
+
+def get_quadrature(dim, cells):
+    domain = np.array([[-1.,1.]]*dim)
+    gl_quad = gq.GaussLegendreDomain(1, device)
+    sampling = [gl_quad.interval_quadpts, gl_quad.rectangle_quadpts, gl_quad.cuboid_quadpts][dim-1]
+    return domain, sampling(domain, np.array([1/cells]*dim))
+
+def get_energy(name, activation, cells):
+    dim, constructor = ENERGY_CASES[name]
+    domain, quadrature = get_quadrature(dim, cells)
+    return constructor(activation, quadrature, domain, cells)
+
+def get_dictionary(dim, activation, mesh_size, optimizer=False):
+    param_b_domain = torch.tensor([[-2., 2.]])
+    return DICTIONARIES[dim](activation, optimizer, param_b_domain, mesh_size, device)
+
+def get_candidates(dim, num):
+    # random unit directions and biases, as the (w, b) tuples of the dictionaries
+    generator = torch.Generator().manual_seed(0)
+    w = torch.randn(num, dim, generator=generator)
+    w = w / w.norm(dim=1, keepdim=True)
+    b = 4 * torch.rand(num, 1, generator=generator) - 2
+    return tuple(w[:,i:i+1].to(device) for i in range(dim)) + (b.to(device),)
+
+
+## =====================================
+## timing
+
+def timeit(func, repeat):
+
+    # the median of repeated runs, after one warm-up run
+    def run():
+        if use_gpu:
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        func()
+        if use_gpu:
+            torch.cuda.synchronize()
+        return time.perf_counter() - start
+    with contextlib.redirect_stdout(io.StringIO()):
+        run()
+        times = [run() for _ in range(repeat)]
+    return float(np.median(times))
+
+def bench_energy(name, activation, cells, repeat, num_candidates=1024, num_elements=64):
+
+    dim = ENERGY_CASES[name][0]
+    energy = get_energy(name, activation, cells)
+    param = get_candidates(dim, num_candidates)
+    results = {}
+    with torch.no_grad():
+        results['evaluate'] = timeit(lambda: energy.evaluate(param), repeat)
+        if hasattr(energy, 'evaluate_large_scale'):
+            results['evaluate_large_scale'] = timeit(lambda: energy.evaluate_large_scale(param), repeat)
+
+    # the Galerkin system of num_elements elements
+    if hasattr(energy, 'get_stiffmat_and_rhs'):
+        parameters = torch.cat(get_candidates(dim, num_elements), dim=1)
+        bases = [torch.cat([points, torch.ones(points.shape[0],1).to(device)], dim=1).t()
+                    for points in energy.get_core_points()]
+        core = [torch.mm(parameters, B) for B in bases]
+        results['get_stiffmat_and_rhs'] = timeit(lambda: energy.get_stiffmat_and_rhs(parameters, *core), repeat)
+
+        # the border of a new element in each repeat, as in the OGA steps, 
+        # where only the rows of the previous elements are already activated
+        newest = iter(torch.cat(get_candidates(dim, num_elements+repeat+1), dim=1)[num_elements:])
+        def border():
+            param = torch.cat([parameters[:-1], next(newest).reshape(1,-1)], dim=0)
+            energy.get_stiffmat_border(param, *[torch.mm(param, B) for B in bases])
+        energy.get_stiffmat_border(parameters, *core)
+        results['get_stiffmat_border'] = timeit(border, repeat)
+    return results
+
+def bench_dictionary(dim, activation, cells, mesh_size, repeat):
+
+    name = [case for case, (d, _) in ENERGY_CASES.items() if d == dim and 'elliptic_2nd' in case][0]
+    energy = get_energy(name, activation, cells)
+    dictionary = get_dictionary(dim, activation, mesh_size)
+    return {'find_optimal_element': timeit(lambda: dictionary.find_optimal_element(energy), repeat)}
+
+def bench_sketch(dim, activation, cells, mesh_size, coarsening, num_steps):
+
+    # the exhaustive and the sketched scans in the same steps of an OGA run,
+    # which adds the elements of the exhaustive scan
+    name = [case for case, (d, _) in ENERGY_CASES.items() if d == dim and 'elliptic_2nd' in case][0]
+    energy = get_energy(name, activation, cells)
+    dictionary = get_dictionary(dim, activation, mesh_size)
+    _, sketch_quadrature = get_quadrature(dim, max(1, cells // coarsening))
+    snn = shallownet.ShallowNN(sigma=activation.activate, in_dim=dim, width=num_steps)
+    oga = og.OrthogonalGreedy(dictionary, energy, snn, device)
+
+    find_optimal_element = dictionary.find_optimal_element
+    times, differ = {'exhaustive_scan': 0., 'sketched_scan': 0.}, []
+    def compared(energy):
+        start = time.perf_counter()
+        element = find_optimal_element(energy)
+        times['exhaustive_scan'] += time.perf_counter() - start
+        dictionary.sketch_quadrature = sketch_quadrature
+        start = time.perf_counter()
+        sketched = find_optimal_element(energy)
+        times['sketched_scan'] += time.perf_counter() - start
+        dictionary.sketch_quadrature = None
+        differ.append(not all(torch.equal(a, b) for a, b in zip(element, sketched)))
+        return element
+    dictionary.find_optimal_element = compared
+    with contextlib.redirect_stdout(io.StringIO()):
+        oga.train()
+    return times, sum(differ)
+
+def bench_optimizers(dim, activation, cells, repeat, num_candidates=16):
+
+    name = [case for case, (d, _) in ENERGY_CASES.items() if d == dim and 'elliptic_2nd' in case][0]
+    energy = get_energy(name, activation, cells)
+    dictionary = get_dictionary(dim, activation, DICT_MESH[dim])
+    # candidates in the parameter domain, with w = 1 in 1D
+    theta = [torch.rand(num_candidates) * (row[1] - row[0]) + row[0] for row in dictionary.params_domain.cpu()]
+    if dim == 1:
+        theta = [torch.ones(num_candidates)] + theta
+    theta = torch.stack(theta, dim=1).to(device)
+    results = {}
+    for optimizer_type in ('pgd', 'fista', 'lbfgs'):
+
+        # one step of a single candidate
+        def single_step():
+            param, optimizer = dictionary._get_optimizer(theta[0], optimizer_type)
+            def closure():
+                optimizer.zero_grad()
+                loss = energy.evaluate(dictionary._polar_to_cartesian(param))
+                loss.backward()
+                return loss
+            optimizer.step(closure)
+        results[optimizer_type + '.step'] = timeit(single_step, repeat)
+
+        # one step of all candidates by the batched optimizer
+        def batched_step():
+            param = Parameter(theta.clone())
+            optimizer = gen.Generator([param], dictionary.params_domain).get_batched_optimizer(optimizer_type)
+            def closure():
+                optimizer.zero_grad()
+                loss = energy.evaluate(dictionary._polar_to_cartesian(param.t())).reshape(-1)
+                loss.sum().backward()
+                return loss
+            optimizer.step(closure)
+        results['batched_' + optimizer_type + '.step'] = timeit(batched_step, repeat)
+    return results
+
+
+## =====================================
+## OGA runs and the reference errors in example docstrings
+
+def reference_errors(example, degree):
+    """
+    The rows N: [l2_err, energy_err] (or [fitting_err]) of the final
+    results in the docstring of an example, for the given degree.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../example', example)
+    rows, active = {}, False
+    with open(path) as file:
+        for line in file:
+            text = line.strip().lstrip('#').strip()
+            if 'power = {:d},'.format(degree) in text:
+                active = True
+            elif active and text.startswith('|'):
+                cells = [cell.strip() for cell in text.strip('|').split('|')]
+                if cells[0].isdigit():
+                    rows[int(cells[0])] = [float(cell) for cell in cells[1::2]]
+            elif active and rows and not text.startswith('+'):
+                break
+    return rows
+
+def bench_oga(name, num_neurons, rtol):
+
+    example, (ftype, degree), cells, mesh_size = OGA_CASES[name]
+    dim = ENERGY_CASES[name][0]
+    activation = af.ActivationFunction(ftype, degree)
+    dictionary = get_dictionary(dim, activation, mesh_size)
+    energy = get_energy(name, activation, cells)
+    snn = shallownet.ShallowNN(sigma=activation.activate, in_dim=dim, width=num_neurons)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        errors, snn = og.OrthogonalGreedy(dictionary, energy, snn, device).train()
+    total_time = time.perf_counter() - start
+
+    # the row N of the table is the error of N-1 neurons
+    errors = errors[-1].cpu().tolist()
+    reference = reference_errors(example, degree).get(num_neurons)
+    passed = None if reference is None else all(abs(e - r) <= rtol * r for e, r in zip(errors, reference))
+    return total_time, {'errors': errors, 'reference': reference, 'passed': passed}
+
+
+## =====================================
+## baselines
+
+def compare(results, baseline, threshold):
+
+    # regressions are slower than the baseline by more than the threshold
+    table = PrettyTable(['benchmark', 'baseline', 'current', 'ratio', ''])
+    regressions = []
+    for key, value in results.items():
+        if key not in baseline:
+            continue
+        ratio = value / baseline[key]
+        flag = 'REGRESSION' if ratio > 1 + threshold else ''
+        if flag:
+            regressions.append(key)
+        table.add_row([key, '{:.4e}'.format(baseline[key]), '{:.4e}'.format(value), '{:.2f}'.format(ratio), flag])
+    print(table)
+    return regressions
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='benchmarks of the energies, dictionaries, optimizers and OGA')
+    parser.add_argument('--groups', nargs='+', default=['energy', 'dictionary', 'optimizer'],
+                        choices=['energy', 'dictionary', 'optimizer', 'oga', 'sketch'])
+    parser.add_argument('--dims', nargs='+', type=int, default=[1, 2, 3])
+    parser.add_argument('--quad-scales', nargs='+', type=int, default=[1],
+                        help='the quadrature cells along each axis are QUAD_CELLS[dim]*scale')
+    parser.add_argument('--dict-scales', nargs='+', type=int, default=[1],
+                        help='the dictionary mesh sizes are DICT_MESH[dim]/scale')
+    parser.add_argument('--sketch-coarsening', type=int, default=2,
+                        help='the sketched scans of 2D/3D use a quadrature with fewer cells by this factor along each axis')
+    parser.add_argument('--sketch-steps', type=int, default=16, help='the OGA steps of the sketched scans')
+    parser.add_argument('--activations', nargs='+', default=['relu:2'])
+    parser.add_argument('--threads', nargs='+', type=int, default=[torch.get_num_threads()])
+    parser.add_argument('--energies', nargs='+', default=list(ENERGY_CASES))
+    parser.add_argument('--oga', nargs='+', default=['fnm_elliptic_4th_1d_nbc'], choices=list(OGA_CASES))
+    parser.add_argument('--num-neurons', type=int, default=64)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--save', default=None, help='save the results as a baseline')
+    parser.add_argument('--baseline', default=None, help='compare with a saved baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown of a regression')
+    parser.add_argument('--rtol', type=float, default=0.05, help='relative tolerance of the reference errors')
+    args = parser.parse_args()
+
+    results, gates, skipped, sketches = {}, {}, {}, {}
+    for threads in args.threads:
+        torch.set_num_threads(threads)
+        for act in args.activations:
+            activation = get_activation(act)
+            for dim in args.dims:
+                for qs in args.quad_scales:
+                    cells = QUAD_CELLS[dim] * qs
+                    nq = cells**dim * 2**dim
+                    tag = 'd={}/nq={}/act={}/threads={}'.format(dim, nq, act, threads)
+                    print(' benchmarking', tag)
+
+                    if 'energy' in args.groups:
+                        for name in args.energies:
+                            if ENERGY_CASES[name][0] != dim:
+                                continue
+                            try:
+                                for method, t in bench_energy(name, activation, cells, args.repeat).items():
+                                    results['energy/{}.{}/{}'.format(name, method, tag)] = t
+                            except (MemoryError, torch.cuda.OutOfMemoryError) as error:
+                                # the large scales beyond the memory, other errors are failures
+                                skipped['energy/{}/{}'.format(name, tag)] = repr(error)
+
+                    if 'optimizer' in args.groups:
+                        for method, t in bench_optimizers(dim, activation, cells, args.repeat).items():
+                            results['optimizer/{}/{}'.format(method, tag)] = t
+
+                    if 'dictionary' in args.groups:
+                        for ds in args.dict_scales:
+                            mesh_size = DICT_MESH[dim] / ds
+                            for method, t in bench_dictionary(dim, activation, cells, mesh_size, args.repeat).items():
+                                key = 'dictionary/NeuronDictionary{}D.{}/{}/dict={:.4g}'.format(dim, method, tag, mesh_size)
+                                results[key] = t
+
+                    if 'sketch' in args.groups and dim > 1:
+                        for ds in args.dict_scales:
+                            mesh_size = DICT_MESH[dim] / ds
+                            times, num_differ = bench_sketch(dim, activation, cells, mesh_size, 
+                                                             args.sketch_coarsening, args.sketch_steps)
+                            for method, t in times.items():
+                                key = 'sketch/NeuronDictionary{}D.{}/{}/dict={:.4g}'.format(dim, method, tag, mesh_size)
+                                results[key] = t
+                            key = 'sketch/NeuronDictionary{}D/{}/dict={:.4g}'.format(dim, tag, mesh_size)
+                            sketches[key] = num_differ
+
+        # the complete OGA runs of the example settings, with their reference errors
+        if 'oga' in args.groups:
+            for name in args.oga:
+                print(' running OGA', name)
+                key = 'oga/{}/N={}/threads={}'.format(name, args.num_neurons, threads)
+                results[key], gates[key] = bench_oga(name, args.num_neurons, args.rtol)
+
+    table = PrettyTable(['benchmark', 'time (s)'])
+    for key, value in results.items():
+        table.add_row([key, '{:.4e}'.format(value)])
+    print(table)
+    for key, error in skipped.items():
+        print(' skipped {}: {}'.format(key, error))
+    for key, num_differ in sketches.items():
+        print(' {}: the sketched scan selects another neuron than the exhaustive scan in {:d} of {:d} steps'.format(
+              key, num_differ, args.sketch_steps))
+    for key, gate in gates.items():
+        print(' {}: errors = {}, reference = {}, {}'.format(key, gate['errors'], gate['reference'],
+                                                          {True: 'passed', False: 'FAILED', None: 'no reference'}[gate['passed']]))
+
+    if args.save is not None:
+        meta = {'torch': torch.__version__, 'machine': platform.machine(), 'processor': platform.processor(),
+                'device': str(device), 'date': time.strftime('%Y-%m-%d %H:%M:%S')}
+        with open(args.save, 'w') as file:
+            json.dump({'meta': meta, 'results': results, 'gates': gates, 'skipped': skipped, 'sketches': sketches}, file, indent=1)
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        print(' {:d} regressions beyond {:.0%}'.format(len(regressions), args.threshold))
+
+    failed = [key for key, gate in gates.items() if gate['passed'] is False]
+    sys.exit(1 if (regressions or failed) else 0)
@@ -1,10 +1,13 @@
 import sys
 sys.path.append('../')
 
+import time
+import math
 import torch
 import matplotlib.pyplot as plt
 
 from greedy.model import activation_function as af 
+from greedy.model.activation_function import _relu_power
 
 def show_model(sigma):
     
@@ -18,6 +21,98 @@ def show_model(sigma):
     plt.ylabel("evaluation")
     plt.show()
     
+class BaselineActivation():
+    """
+        The former dispatch, which constructed the implementations (with
+        the bspline weights) on every call and evaluated the orders one by
+        one, as the reference of the benchmark. The weights are kept in
+        float64 to compare the values.
+    """
+    
+    def __init__(self, ftype, degree=0):
+        self.ftype = ftype
+        self.degree = degree
+        
+    def _weight(self):
+        weight = torch.zeros(self.degree+2, dtype=torch.float64)
+        for i in range(self.degree+2):
+            w = 1
+            for j in range(self.degree+2):
+                if j != i:
+                    w *= 1/(i-j)
+            weight[i] = w
+        return weight
+        
+    def _relu(self, p, m, weight):
+        coefficient = math.factorial(self.degree) / math.factorial(self.degree-m)
+        return coefficient * _relu_power(p, self.degree-m)
+        
+    def _bspline(self, p, m, weight):
+        coefficient = math.factorial(self.degree) / math.factorial(self.degree-m)
+        val = 0
+        for i in range(len(weight)):
+            val += weight[i] * _relu_power(i - p, self.degree-m) * (-1)**m * coefficient
+        return val * (self.degree+1)
+        
+    def _sigmoid(self, p, m, weight):
+        e = torch.exp(-p)
+        val_list = {
+            0: lambda: 1 / (1 + e),
+            1: lambda: e / (e + 1).pow(2),
+            2: lambda: (2*e.pow(2)) / (e + 1).pow(3) - e / (e + 1).pow(2),
+            3: lambda: e / (e + 1).pow(2) - (6*e.pow(2)) / (e + 1).pow(3) + (6*e.pow(3)) / (e + 1).pow(4)
+        }
+        return val_list[m]()
+        
+    def dactivate(self, p, m):
+        # all the implementations are constructed on each call, as before
+        weight = self._weight()
+        val_list = {
+            "relu": self._relu,
+            "bspline": self._bspline,
+            "sigmoid": self._sigmoid
+        }
+        return val_list[self.ftype](p, m, weight)
+    
+def benchmark_activation(sigma, orders, num_samples=10**7, repeat=5):
+    
+    # the former separate calls vs the fused call, in the same values
+    samples = torch.rand(num_samples, dtype=torch.float64) * 8 - 4
+    baseline = BaselineActivation(sigma.ftype, sigma.degree)
+    def separate():
+        return [baseline.dactivate(samples, m) for m in orders]
+    def fused():
+        return sigma.derivatives(samples, orders)
+    
+    errors = [(a - b).abs().max().item() for a, b in zip(separate(), fused())]
+    assert max(errors) < 1e-10
+    
+    timings = {}
+    for name, func in (("baseline", separate), ("fused", fused)):
+        func()
+        start = time.time()
+        for _ in range(repeat):
+            func()
+        end = time.time()
+        timings[name] = (end-start)/repeat
+        print(' {:s} {:d}, orders {:}, {:s}: {:.4f}s per call'.format(
+            sigma.ftype, sigma.degree, tuple(orders), name, timings[name]))
+    assert timings["fused"] < timings["baseline"]
+    
+def compare_highest_derivative(sigma, h=1e-6):
+    
+    # the m = degree derivative against central differences of the 
+    # (degree-1)-th one, away from the kinks at the integers
+    samples = torch.arange(-4, 4, dtype=torch.float64) + torch.rand(8, 100, dtype=torch.float64).t() * 0.8 + 0.1
+    samples = samples.flatten()
+    m = sigma.degree
+    lower = (lambda p: sigma.activate(p)) if m == 1 else (lambda p: sigma.dactivate(p, m-1))
+    reference = (lower(samples+h) - lower(samples-h)) / (2*h)
+    errors = [(sigma.dactivate(samples, m) - reference).abs().max().item(), 
+              (sigma.derivatives(samples, (m,))[0] - reference).abs().max().item()]
+    print(' {:s} {:d}, derivative of order {:d} against differences:'.format(sigma.ftype, m, m), errors)
+    assert max(errors) < 1e-6
+    
 # main process
 if __name__ == "__main__":
     
@@ -29,6 +124,17 @@ if __name__ == "__main__":
     # show the shape of activation function
     show_model(sigma)
     
+    # timings on 10^7 samples, eager and compiled
+    benchmark_activation(af.ActivationFunction("relu", 3), (0,1,2))
+    benchmark_activation(af.ActivationFunction("bspline", 3), (0,1,2))
+    benchmark_activation(af.ActivationFunction("sigmoid"), (0,1,2))
+    benchmark_activation(af.ActivationFunction("relu", 3, compile=True), (0,1,2))
+    
+    # the highest derivatives, e.g., relu^0 being the Heaviside function
+    for degree in (1, 2, 3, 4):
+        compare_highest_derivative(af.ActivationFunction("relu", degree))
+        compare_highest_derivative(af.ActivationFunction("bspline", degree))
+    
     # activation functions passed test:
     # 1. ftype = "sigmoid" 
     # 2. ftype = "relu", with degree = 1, 2, 3, ...
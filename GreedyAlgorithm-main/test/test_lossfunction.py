@@ -0,0 +1,99 @@
+import sys
+sys.path.append('../')
+
+import io
+import contextlib
+import torch
+import numpy as np
+
+from greedy.pde import cos2d, cos3d, poly2d
+from greedy.model import shallownet
+from greedy.model import activation_function as af
+from greedy.lossfunction import fnm_elliptic_2nd_3d_nbc as loss3d
+from greedy.lossfunction import fnm_elliptic_4th_2d_nbc as loss4th2d
+from greedy.lossfunction import pinn_poisson_2d_dbc as pinn2d
+from greedy.quadrature import gauss_legendre_quadrature as gq
+from greedy.quadrature import monte_carlo_quadrature as mc
+
+# precision settings
+data_type = torch.float64
+torch.set_default_dtype(data_type)
+
+# device settings
+use_gpu = torch.cuda.is_available()
+device = torch.device("cuda" if use_gpu else "cpu")
+
+
+def _random_param(in_dim, num_param):
+
+    # unit directions and nonzero biases, on which a dropped bias shows
+    w = torch.randn(num_param, in_dim).to(device)
+    w = w / w.norm(dim=1, keepdim=True)
+    b = (torch.rand(num_param, 1).to(device) + 0.5) * torch.sign(torch.randn(num_param, 1).to(device))
+    return torch.cat([w, b], dim=1)
+
+
+def compare_with_assembly(energy, activation, in_dim, width=8, num_param=16):
+
+    # the scan scores -(1/2)*<J'(u),g>^2 against those by the assembled
+    # system, <J'(u),g> = a(u,g) - f(g) = G[g,:]*c - b[g] of u = sum c_j*g_j
+    torch.manual_seed(0)
+    snn = shallownet.ShallowNN(sigma=activation.activate, in_dim=in_dim, width=width).to(device)
+    param_u = _random_param(in_dim, width)
+    c = torch.randn(width, 1).to(device)
+    snn.update_neurons((c.t().clone(), param_u[:,0:in_dim].clone(), param_u[:,in_dim].clone()))
+    energy.update_solution(snn.forward)
+
+    param = _random_param(in_dim, num_param)
+    A = torch.cat([param, param_u], dim=0)
+    core = []
+    for points in energy.get_core_points():
+        ones = torch.ones(points.shape[0],1).to(device)
+        core.append(torch.mm(A, torch.cat([points, ones], dim=1).t()))
+    Gk, bk = energy.get_stiffmat_and_rhs(A, *core)
+    residual = torch.mm(Gk[0:num_param, num_param:], c) - bk[0:num_param]
+    loss = -(1/2) * residual.pow(2)
+
+    # no debug output from the evaluations
+    param = torch.split(param, 1, dim=1)
+    stdout = io.StringIO()
+    with contextlib.redirect_stdout(stdout), torch.no_grad():
+        loss_eval = energy.evaluate(param)
+        loss_large = energy.evaluate_large_scale(param)
+        norms = energy.evaluate_norms(param)
+
+    err_eval = ((loss_eval - loss).abs().max() / loss.abs().max()).item()
+    err_norms = ((norms.reshape(-1) - torch.diagonal(Gk)[0:num_param]).abs().max() / Gk.diagonal().abs().max()).item()
+    err_large = ((loss_large - loss).abs().max() / loss.abs().max()).item()
+    print('\n {:d}D {}: relative differences of evaluate, evaluate_large_scale, evaluate_norms = {:.6e}, {:.6e}, {:.6e}'.format(
+          in_dim, type(energy).__name__, err_eval, err_large, err_norms))
+    assert err_eval < 1e-10
+    assert err_large < 1e-10
+    assert err_norms < 1e-10
+    assert stdout.getvalue() == ''
+
+
+if __name__ == '__main__':
+
+    # 3D FNM energy, the bias of the scanned elements
+    activation = af.ActivationFunction("relu", 2)
+    gl_quad = gq.GaussLegendreDomain(2, device)
+    quadrature = gl_quad.cuboid_quadpts(np.array([[-1.,1.],[-1.,1.],[-1.,1.]]), np.array([1/4,1/4,1/4]))
+    energy = loss3d.FNM_Elliptic_2nd_3d_NBC(activation, quadrature, cos3d.DataCos_2nd_3d_NBC(), device)
+    compare_with_assembly(energy, activation, 3)
+
+    # 2D PINN energy with Gauss-Legendre quadrature in the domain
+    activation = af.ActivationFunction("relu", 3)
+    gl_quad = gq.GaussLegendreDomain(2, device)
+    rectangle = np.array([[-1.,1.],[-1.,1.]])
+    quadrature_in = gl_quad.rectangle_quadpts(rectangle, np.array([1/10, 1/10]))
+    quadrature_bd = mc.MonteCarloQuadrature(device).rectangle_boundary_samples(rectangle, 100)
+    energy = pinn2d.PINN_Poisson_2d_DBC(activation, quadrature_in, quadrature_bd, cos2d.Data_Poisson_2d_DBC(), device)
+    compare_with_assembly(energy, activation, 2)
+
+    # 2D FNM energy of the 4th order, the items of the previous solution
+    activation = af.ActivationFunction("relu", 3)
+    gl_quad = gq.GaussLegendreDomain(2, device)
+    quadrature = gl_quad.rectangle_quadpts(np.array([[-1.,1.],[-1.,1.]]), np.array([1/10, 1/10]))
+    energy = loss4th2d.FNM_Elliptic_4th_2d_NBC(activation, quadrature, poly2d.DataPoly_4th_2d_NBC(), device)
+    compare_with_assembly(energy, activation, 2)
@@ -6,6 +6,8 @@ import numpy as np
 from torch.nn.parameter import Parameter
 from greedy.model import activation_function as af
 from greedy.model import shallownet as sn
+from greedy.model import neuron_dictionary_2d as ndict2d
+from greedy.model import neuron_dictionary_3d as ndict3d
 
 
 def _polar_to_cartesian(dim, theta):
@@ -28,6 +30,32 @@ def _polar_to_cartesian(dim, theta):
         return (w1, w2, w3, b)
     else:
         raise RuntimeError("Dimension error.")
+
+
+def compare_with_autograd(snn, x):
+    
+    # closed-form derivatives against a double backward pass
+    val, grad, hess = snn.evaluate_derivatives(x, 2)
+    x = x.detach().requires_grad_()
+    u = snn(x)
+    du = torch.autograd.grad(u.sum(), x, create_graph=True)[0]
+    d2u = torch.stack([torch.autograd.grad(du[:,i].sum(), x, retain_graph=True)[0] 
+                       for i in range(x.shape[1])], dim=1)
+    errors = [(val-u).abs().max().item(), 
+              (grad-du).abs().max().item(), 
+              (hess-d2u).abs().max().item()]
+    print("derivative errors against autograd:", errors)
+    assert max(errors) < 1e-10
+
+
+def compare_index_to_sub(dictionary, param_shape):
+    
+    # subscripts of a column of vector-indices against numpy
+    index = torch.arange(int(np.prod(param_shape))).reshape(-1,1)
+    sub = dictionary._index_to_sub(index, param_shape)
+    sub_np = np.stack(np.unravel_index(index.flatten().numpy(), param_shape), axis=1)
+    print("subscripts of shape {}:".format(tuple(sub.shape)), np.array_equal(sub.numpy(), sub_np))
+    assert np.array_equal(sub.numpy(), sub_np)
     
 
 if __name__ == '__main__':
@@ -116,4 +144,16 @@ if __name__ == '__main__':
     print(snn.layer2.weight.shape)
     print(snn.layer2.weight)
     print("layer2_bias:")
-    print(snn.layer2.bias)
\ No newline at end of file
+    print(snn.layer2.bias)
+    
+    # closed-form derivatives of the updated model
+    snn = sn.ShallowNN(sigma.activate, in_dim, width, out_dim).double()
+    snn.update_neurons((torch.randn(1, width), torch.randn(width, 2), torch.randn(width)))
+    compare_with_autograd(snn, torch.rand(100, in_dim, dtype=torch.float64)*2-1)
+    
+    # subscripts of the param-meshes of 2D and 3D dictionaries
+    device = torch.device("cpu")
+    dictionary = ndict2d.NeuronDictionary2D(sigma, False, torch.tensor([[-2., 2.]]), 1/10, device)
+    compare_index_to_sub(dictionary, (7, 5))
+    dictionary = ndict3d.NeuronDictionary3D(sigma, False, torch.tensor([[-2., 2.]]), 1/10, device)
+    compare_index_to_sub(dictionary, (7, 5, 3))
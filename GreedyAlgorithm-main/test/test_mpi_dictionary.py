@@ -0,0 +1,74 @@
+# the MPI-distributed dictionary scan, run with
+#       mpirun -np 4 python test_mpi_dictionary.py
+# every rank should select the same element as the single-process scan
+
+import sys
+sys.path.append('../')
+
+import time
+import torch
+import numpy as np
+from mpi4py import MPI
+
+from greedy.pde import cos3d
+from greedy.model import activation_function as af
+from greedy.model import neuron_dictionary_3d as ndict
+from greedy.lossfunction import fnm_elliptic_2nd_3d_nbc as loss
+from greedy.quadrature import gauss_legendre_quadrature as gq
+
+# precision settings
+data_type = torch.float64
+torch.set_default_dtype(data_type)
+
+# device settings
+device = torch.device("cpu")
+
+
+if __name__ == "__main__":
+    
+    comm = MPI.COMM_WORLD
+    rank = comm.Get_rank()
+    
+    # 3D energy and dictionaries, with and without MPI
+    pde = cos3d.DataCos_2nd_3d_NBC()
+    activation = af.ActivationFunction("relu", 2)
+    gl_quad = gq.GaussLegendreDomain(2, device)
+    quadrature = gl_quad.cuboid_quadpts(np.array([[-1.,1.],[-1.,1.],[-1.,1.]]), np.array([1/4,1/4,1/4]))
+    energy = loss.FNM_Elliptic_2nd_3d_NBC(activation, quadrature, pde, device)
+    param_b_domain = torch.tensor([[-2., 2.]])
+    param_mesh_size = 1/5
+    dictionary = ndict.NeuronDictionary3D(activation, "pgd", param_b_domain, param_mesh_size, 
+                                          device, best_k=4, comm=comm)
+    dictionary_serial = ndict.NeuronDictionary3D(activation, "pgd", param_b_domain, param_mesh_size, 
+                                                 device, best_k=4)
+    
+    # distributed scan and optimization
+    start = time.time()
+    element = dictionary.find_optimal_element(energy)
+    end = time.time()
+    element = torch.cat(element, dim=1)
+    element_serial = torch.cat(dictionary_serial.find_optimal_element(energy), dim=1)
+    
+    # the same element on every rank, and the same as the serial one
+    elements = comm.allgather(element)
+    err_ranks = max([(e - element).abs().max().item() for e in elements])
+    err_serial = (element - element_serial).abs().max().item()
+    if rank == 0:
+        print('\n {:d} ranks, distributed selection time = {:.4f}s'.format(comm.Get_size(), end-start))
+        print(' difference between ranks = {:.6e}'.format(err_ranks))
+        print(' difference to the serial selection = {:.6e}'.format(err_serial))
+    assert err_ranks == 0
+    assert err_serial < 1e-10
+    
+    # the multilevel search, whose levels are split over the ranks
+    dictionary.search_levels, dictionary_serial.search_levels = 2, 2
+    element = torch.cat(dictionary.find_optimal_element(energy), dim=1)
+    element_serial = torch.cat(dictionary_serial.find_optimal_element(energy), dim=1)
+    elements = comm.allgather(element)
+    err_ranks = max([(e - element).abs().max().item() for e in elements])
+    err_serial = (element - element_serial).abs().max().item()
+    if rank == 0:
+        print('\n multilevel search, difference between ranks, to the serial selection = {:.6e}, {:.6e}'.format(
+              err_ranks, err_serial))
+    assert err_ranks == 0
+    assert err_serial < 1e-10
@@ -0,0 +1,623 @@
+import sys
+sys.path.append('../')
+
+import time
+import json
+import pickle
+import tempfile
+import torch
+import numpy as np
+
+from greedy.pde import cos1d, cos2d, cos3d, poly1d, poly2d
+from greedy.model import shallownet
+from greedy.model import activation_function as af
+from greedy.model import neuron_dictionary_1d as ndict1d
+from greedy.model import neuron_dictionary_2d as ndict2d
+from greedy.model import neuron_dictionary_3d as ndict3d
+from greedy.lossfunction import fnm_elliptic_2nd_1d_nbc as loss1d
+from greedy.lossfunction import fnm_elliptic_2nd_2d_nbc as loss2d
+from greedy.lossfunction import fnm_elliptic_2nd_3d_nbc as loss3d
+from greedy.lossfunction import fnm_elliptic_4th_1d_nbc as loss4th1d
+from greedy.lossfunction import fnm_elliptic_4th_2d_nbc as loss4th2d
+from greedy.lossfunction import fnm_L2fitting_1d as fitting1d
+from greedy.lossfunction import fnm_poisson_1d_dbc as poisson1d
+from greedy.lossfunction import energy as en
+from greedy.quadrature import gauss_legendre_quadrature as gq
+from greedy.quadrature import quadrature as quad
+from greedy.algorithm import orthogonal_greedy as og
+from greedy.tools import profiler
+
+# precision settings
+data_type = torch.float64
+torch.set_default_dtype(data_type)
+
+# device settings
+use_gpu = torch.cuda.is_available()
+device = torch.device("cuda" if use_gpu else "cpu")
+
+
+def run_oga(dictionary, energy, num_neurons, **kwargs):
+
+    # train a new network from the zero solution, with the training time
+    energy.update_solution(energy._zero)
+    snn = shallownet.ShallowNN(sigma=dictionary.activation.activate,
+                               in_dim=dictionary.geo_dim,
+                               width=num_neurons
+                               )
+    oga = og.OrthogonalGreedy(dictionary, energy, snn, device, **kwargs)
+    start = time.time()
+    errors, snn = oga.train()
+    return oga, errors, time.time() - start
+
+
+def full_solve(oga, energy, num_neurons):
+
+    # the Galerkin system assembled at once, as the examples did
+    system = energy.get_stiffmat_and_rhs(oga.inner_param[0:num_neurons,...],
+                                         oga.core_mat[0][0:num_neurons,:])
+    Gk, bk = system[0], system[1]
+    return Gk, bk, torch.linalg.solve(Gk, bk)
+
+
+def compare_with_full_solve(dictionary, energy, in_dim, num_neurons):
+
+    oga, errors, train_time = run_oga(dictionary, energy, num_neurons)
+
+    Gk, bk, coef = full_solve(oga, energy, num_neurons)
+    Gk, bk, coef = Gk.detach(), bk.detach(), coef.detach()
+    err_mat = (Gk - oga.stiffmat).abs().max().item()
+    err_coef = (coef.reshape(1,-1) - oga.outer_param).abs().max().item()
+    residual = (torch.mm(Gk, oga.outer_param.reshape(-1,1)) - bk).abs().max().item()
+    print('\n {:d}D OGA with {:d} neurons, time = {:.4f}s'.format(in_dim, num_neurons, train_time))
+    print(' stiffness matrix difference = {:.6e}'.format(err_mat))
+    print(' coefficients difference = {:.6e}'.format(err_coef))
+    print(' residual of Cholesky solution = {:.6e}'.format(residual))
+    
+    # both solutions are backward stable, so they agree to 1e-10 while 
+    # G_k is well-conditioned, and only up to the forward error bound 
+    # cond(G)*eps beyond, e.g., cond(G) = 5.9e10 at N = 32 in 1D, where
+    # no refinement in float64 gets below it
+    cond = torch.linalg.cond(Gk).item()
+    print(' condition number = {:.6e}'.format(cond))
+    if cond < 1e7:
+        bound = 1e-10
+    else:
+        bound = 10 * cond * np.finfo(float).eps * coef.abs().max().item()
+    assert not oga.breakdown
+    assert err_mat < 1e-10
+    assert residual < 1e-10
+    assert err_coef < bound
+
+
+def profile_oga(dictionary, energy, in_dim, num_neurons):
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = directory + '/oga.jsonl'
+        with profiler.GreedyProfiler(path, energy) as greedy_profiler:
+            run_oga(dictionary, energy, num_neurons)
+        with open(path) as file:
+            records = [json.loads(line) for line in file]
+
+    # one record per neuron, and the energy methods are restored
+    totals = greedy_profiler.summary()
+    print('\n {:d}D OGA with {:d} neurons, profile:'.format(in_dim, num_neurons))
+    for name, value in totals['time'].items():
+        print(' {:>8s}: time = {:.4f}s, flops = {:.3e}, calls = {}'.format(
+            name, value, totals['flops'].get(name, 0), totals['calls'].get(name, {})))
+    assert len(records) == num_neurons
+    assert all(name in records[-1]['time'] for name in ('error', 'scan', 'assembly', 'solve'))
+    assert totals['calls']['scan']['evaluate_large_scale'] == num_neurons
+    assert ('peak_memory' if torch.cuda.is_available() else 'process_peak_memory') in records[-1]
+    assert 'evaluate' not in energy.__dict__
+
+
+def scan_in_low_precision(dictionary, energy, in_dim, num_neurons):
+
+    # the products in float32 are in a lower precision, but the energy and
+    # the default dtype are not changed by the scan
+    torch.manual_seed(0)
+    param = tuple(torch.rand(64, 1) for _ in range(in_dim+1))
+    with torch.no_grad():
+        loss = energy.evaluate(param)
+        low_loss = energy.evaluate(param, dtype=torch.float32)
+    err_loss = ((low_loss - loss).abs().max() / loss.abs().max()).item()
+    assert low_loss.dtype == loss.dtype and 0 < err_loss < 1e-4
+
+    # the scans in float32 and bfloat16, whose unreliable steps are
+    # scanned again in the default dtype
+    oga, errors, default_time = run_oga(dictionary, energy, num_neurons)
+    print('\n {:d}D OGA with the scan in low precision, {:d} neurons'.format(in_dim, num_neurons))
+    print(' relative difference of the losses in float32 = {:.6e}'.format(err_loss))
+    print(' time with the scan in {} = {:.4f}s'.format(torch.get_default_dtype(), default_time))
+    for dtype in (torch.float32, torch.bfloat16):
+        dictionary.scan_dtype = dtype
+        dictionary.num_low_precision_scans, dictionary.num_fallbacks = 0, 0
+        low_oga, low_errors, low_time = run_oga(dictionary, energy, num_neurons)
+        assert dictionary.scan_dtype == dtype
+        dictionary.scan_dtype = None
+        
+        # the same elements, or elements of the same loss
+        err_param = (oga.inner_param - low_oga.inner_param).abs().max().item()
+        err_errors = ((errors - low_errors).abs() / errors).max().item()
+        print(' time with the scan in {} = {:.4f}s, steps in {} and in the default dtype = {:d}, {:d}'.format(
+              dtype, low_time, dtype, dictionary.num_low_precision_scans, dictionary.num_fallbacks))
+        print(' parameters and relative errors difference = {:.6e}, {:.6e}'.format(err_param, err_errors))
+        assert dictionary.num_low_precision_scans + dictionary.num_fallbacks == num_neurons
+        assert err_param == 0 or err_errors < 1e-10
+        assert torch.get_default_dtype() == data_type and energy.quadpts.dtype == data_type
+        if dtype == torch.float32:
+            assert dictionary.num_fallbacks == 0
+
+
+def search_in_parallel(dictionary, energy, in_dim, num_neurons, num_workers, best_k=4):
+
+    # the training of best_k candidates in each step, sequentially and in
+    # the process pool, which is started once and kept in all the steps
+    dictionary.optimizer, dictionary.best_k = 'pgd', best_k
+    oga, errors, seq_time = run_oga(dictionary, energy, num_neurons)
+    # the pools of all steps, recorded in the class, so the dictionary 
+    # sent to the workers is unchanged
+    get_executor = type(dictionary)._get_executor
+    executors = []
+    def recorded(self, energy):
+        executors.append(get_executor(self, energy))
+        return executors[-1]
+    type(dictionary)._get_executor = recorded
+    dictionary.parallel_search = num_workers
+    try:
+        par_oga, par_errors, par_time = run_oga(dictionary, energy, num_neurons)
+    finally:
+        del type(dictionary)._get_executor
+        dictionary._executor.shutdown()
+        dictionary._executor = None
+        dictionary.parallel_search = False
+        dictionary.optimizer, dictionary.best_k = False, 1
+
+    err_param = (oga.inner_param - par_oga.inner_param).abs().max().item()
+    err_errors = (errors - par_errors).abs().max().item()
+    print('\n {:d}D OGA with the parallel search of {:d} processes, {:d} neurons'.format(in_dim, num_workers, num_neurons))
+    print(' time with the sequential and parallel search = {:.4f}s, {:.4f}s'.format(seq_time, par_time))
+    print(' parameters difference = {:.6e}'.format(err_param))
+    print(' errors difference = {:.6e}'.format(err_errors))
+    # the energy is sent once, each step only sends the items of the solution
+    step_bytes = len(pickle.dumps(dictionary._get_solution_items(energy)))
+    print(' bytes sent to the processes at the start and in each step = {:d}, {:d}'.format(
+          len(pickle.dumps(energy)), step_bytes))
+    assert len(executors) == num_neurons
+    assert all(executor is executors[0] for executor in executors)
+    assert step_bytes < len(pickle.dumps(energy))
+    assert err_param == 0 and err_errors == 0
+
+
+def train_candidates(dictionary, energy, in_dim, num_neurons, best_k=2):
+
+    # the sequential training of the best_k scanned candidates after a few
+    # steps, whose rows hold all the polar and bias parameters
+    run_oga(dictionary, energy, num_neurons)
+    chunk_size = dictionary._get_chunk_size(energy)
+    theta_init = dictionary._select_initial_elements(energy.evaluate, best_k, chunk_size)
+    theta, loss = dictionary._argmax_optimize_seq(energy.evaluate, theta_init, 'pgd')
+    with torch.no_grad():
+        init_loss = energy.evaluate(dictionary._polar_to_cartesian(theta_init.t()))
+        trained_loss = energy.evaluate(dictionary._polar_to_cartesian(theta.t()))
+
+    err_loss = (trained_loss - loss).abs().max().item()
+    print('\n {:d}D sequential training of {:d} candidates, after {:d} neurons'.format(in_dim, best_k, num_neurons))
+    print(' losses of the scanned and trained candidates: {}, {}'.format(init_loss.flatten().tolist(), loss.flatten().tolist()))
+    print(' difference of the returned and recomputed losses = {:.6e}'.format(err_loss))
+    assert theta.shape == theta_init.shape
+    assert err_loss < 1e-12
+    assert (loss <= init_loss).all()
+
+
+def resume_from_checkpoint(dictionary, energy, in_dim, num_neurons, bank=False, **options):
+
+    # the scan options of the dictionary, e.g., the incremental scan, whose
+    # last full scan is in the checkpoint, and the activation bank of the energy
+    defaults = {name: getattr(dictionary, name) for name in options}
+    for name, value in options.items():
+        setattr(dictionary, name, value)
+    if bank:
+        energy.activation_bank = en.ActivationBank()
+
+    # a full run, and a run of half the neurons resumed with all of them
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            oga, errors, _ = run_oga(dictionary, energy, num_neurons)
+            run_oga(dictionary, energy, num_neurons//2, checkpoint=directory + '/oga.pt')
+
+            # resumed as in a new process, without the scan state in memory
+            dictionary._last_scan, dictionary._norm_owner = None, None
+            resumed, resumed_errors, _ = run_oga(dictionary, energy, num_neurons, checkpoint=directory + '/oga.pt')
+    finally:
+        for name, value in defaults.items():
+            setattr(dictionary, name, value)
+        energy.activation_bank = None
+
+    err_param = (oga.inner_param - resumed.inner_param).abs().max().item()
+    err_coef = (oga.outer_param - resumed.outer_param).abs().max().item()
+    err_errors = (errors - resumed_errors).abs().max().item()
+    print('\n {:d}D OGA resumed at {:d} of {:d} neurons, options = {}, bank = {}'.format(in_dim, num_neurons//2, 
+          num_neurons, sorted(options), bank))
+    print(' parameters difference = {:.6e}'.format(err_param))
+    print(' coefficients difference = {:.6e}'.format(err_coef))
+    print(' errors difference = {:.6e}'.format(err_errors))
+    assert err_param == 0 and err_coef == 0 and err_errors == 0
+
+
+def pickle_energy(dictionary, energy, in_dim, num_neurons):
+
+    # the pickled energy, e.g., for the workers of the parallel search, 
+    # drops the activated rows of the trained elements and rebuilds them
+    oga, errors, _ = run_oga(dictionary, energy, num_neurons)
+    num_bytes = len(pickle.dumps(energy))
+    energy_copy = pickle.loads(pickle.dumps(energy))
+    assert energy.activated_rows.num_rows == num_neurons
+    assert energy_copy.activated_rows.num_rows == 0 and energy_copy.activated_rows.rows is None
+
+    core = oga._get_core(oga.inner_param)[0]
+    rows, _ = energy.activated_rows.update(oga.inner_param, core)
+    rows_copy, _ = energy_copy.activated_rows.update(oga.inner_param, core)
+    err_rows = max((row - row_copy).abs().max().item() for row, row_copy in zip(rows, rows_copy))
+    print('\n {:d}D energy pickled after {:d} neurons, {:.1f} KB'.format(in_dim, num_neurons, num_bytes/2**10))
+    print(' activated rows difference = {:.6e}'.format(err_rows))
+    assert err_rows == 0
+
+
+def compare_sparse_scan(dictionary, energy, in_dim, num_neurons):
+
+    # the scores of the whole param-mesh, after a few steps, by the dense
+    # and the sparse-support evaluation
+    run_oga(dictionary, energy, num_neurons)
+    theta, param = dictionary._gather_vertical_param()
+    param = tuple(item.reshape(-1,1) for item in param)
+    with torch.no_grad():
+        loss = energy.evaluate(param)
+        energy.sparse_evaluation = True
+        try:
+            sparse_loss = energy.evaluate(param)
+        finally:
+            energy.sparse_evaluation = False
+
+    err_loss = ((loss - sparse_loss).abs().max() / loss.abs().max()).item()
+    print('\n {:d}D sparse scan of {}, {} {:d}, after {:d} neurons'.format(in_dim, type(energy).__name__, 
+          dictionary.activation.ftype, dictionary.activation.degree, num_neurons))
+    print(' relative scan difference = {:.6e}'.format(err_loss))
+    assert err_loss < 1e-11
+
+
+def bank_activations(dictionary, energy, in_dim, num_neurons, directory=None):
+
+    # the same training with the activated core matrices stored once
+    oga, errors, dense_time = run_oga(dictionary, energy, num_neurons)
+    energy.activation_bank = en.ActivationBank(directory)
+    banked, banked_errors, bank_time = run_oga(dictionary, energy, num_neurons)
+    num_bytes = energy.activation_bank.num_bytes
+    energy.activation_bank.clear()
+    energy.activation_bank = None
+
+    err_param = (oga.inner_param - banked.inner_param).abs().max().item()
+    err_errors = (errors - banked_errors).abs().max().item()
+    print('\n {:d}D OGA with an activation bank in {}, {:.1f} MB'.format(in_dim, directory or 'memory', num_bytes/2**20))
+    print(' time without and with the bank = {:.4f}s, {:.4f}s'.format(dense_time, bank_time))
+    print(' parameters difference = {:.6e}'.format(err_param))
+    print(' errors difference = {:.6e}'.format(err_errors))
+    assert num_bytes > 0
+    assert err_param < 1e-10 and err_errors < 1e-10
+
+
+def scan_with_fft(dictionary, energy, in_dim, num_neurons):
+
+    # the dense scan, and the FFT scan with the top ones rescored
+    oga, errors, dense_time = run_oga(dictionary, energy, num_neurons)
+    dictionary.fft_scan = True
+    fft_oga, fft_errors, fft_time = run_oga(dictionary, energy, num_neurons)
+    dictionary.fft_scan = False
+
+    # the approximate scores of the whole param-mesh, at the last step
+    theta, param = dictionary._gather_vertical_param()
+    param = tuple(item.reshape(-1,1) for item in param)
+    with torch.no_grad():
+        loss = energy.evaluate(param)
+        fft_loss = energy.evaluate(param, fft={'oversample': 8})
+
+    err_loss = ((loss - fft_loss).abs().max() / loss.abs().max()).item()
+    err_errors = ((errors[-1] - fft_errors[-1]).abs() / errors[-1]).max().item()
+    print('\n {:d}D OGA with the FFT scan, {:d} neurons'.format(in_dim, num_neurons))
+    print(' time with the dense and the FFT scan = {:.4f}s, {:.4f}s'.format(dense_time, fft_time))
+    print(' relative scan difference = {:.6e}'.format(err_loss))
+    print(' relative errors difference = {:.6e}'.format(err_errors))
+    # the scores only rank the candidates, whose top ones are rescored
+    assert err_loss < 1e-2
+    assert err_errors < 1e-2
+
+
+def scan_with_sketch(dictionary, energy, in_dim, num_neurons, sketch_quadrature):
+
+    # the full scan, and the scan on the coarser quadrature with the top
+    # ones rescored
+    oga, errors, full_time = run_oga(dictionary, energy, num_neurons)
+    dictionary.sketch_quadrature = sketch_quadrature
+    sketch_oga, sketch_errors, sketch_time = run_oga(dictionary, energy, num_neurons)
+    dictionary.sketch_quadrature = None
+    assert dictionary._sketch_energy.pre_solution == energy.pre_solution
+
+    ratio = sketch_quadrature.quadpts.shape[0] / energy.quadpts.shape[0]
+    err_errors = ((errors[-1] - sketch_errors[-1]).abs() / errors[-1]).max().item()
+    print('\n {:d}D OGA with the sketched scan of {:.0%} quadrature points, {:d} neurons'.format(in_dim, ratio, num_neurons))
+    print(' time with the full and the sketched scan = {:.4f}s, {:.4f}s'.format(full_time, sketch_time))
+    print(' relative errors difference = {:.6e}'.format(err_errors))
+    # the sketched scores only rank the candidates, whose top ones are rescored
+    assert err_errors < 1e-2
+
+    # the sketch energy keeps the options of the energy
+    options_energy = pickle.loads(pickle.dumps(energy))
+    options_energy.sparse_evaluation, options_energy.activation_bank = True, en.ActivationBank()
+    dictionary.sketch_quadrature = sketch_quadrature
+    sketch = dictionary._get_sketch_energy(options_energy)
+    dictionary.sketch_quadrature = None
+    assert type(sketch) is type(energy)
+    assert sketch.quadpts.shape[0] == sketch_quadrature.quadpts.shape[0]
+    assert sketch.sparse_evaluation and (sketch.activation_bank is options_energy.activation_bank)
+
+
+def search_multilevel(dictionary, energy, in_dim, num_neurons, levels):
+
+    def train():
+        # count the candidates scored by the evaluations without grad
+        evaluate = energy.evaluate
+        num_scored = [0]
+        def counted(param):
+            if not torch.is_grad_enabled() or not param[0].requires_grad:
+                num_scored[0] += param[0].shape[0]
+            return evaluate(param)
+        energy.evaluate = counted
+        try:
+            oga, errors, train_time = run_oga(dictionary, energy, num_neurons)
+        finally:
+            del energy.evaluate
+        return oga, errors, num_scored[0], train_time
+
+    # the single-level scan, and the coarse-to-fine search of each number of levels
+    oga, errors, num_scored, single_time = train()
+    print('\n {:d}D OGA with the multilevel search, {:d} neurons'.format(in_dim, num_neurons))
+    print(' single level: time = {:.4f}s, scored candidates = {:d}'.format(single_time, num_scored))
+    for num_levels in levels:
+        dictionary.search_levels = num_levels
+        try:
+            multi_oga, multi_errors, multi_scored, multi_time = train()
+        finally:
+            dictionary.search_levels = 0
+
+        err_param = (oga.inner_param - multi_oga.inner_param).abs().max().item()
+        err_errors = ((errors[-1] - multi_errors[-1]).abs() / errors[-1]).max().item()
+        print(' {:d} coarser levels: time = {:.4f}s, scored candidates = {:d} ({:.1f} times fewer)'.format(
+              num_levels, multi_time, multi_scored, num_scored / multi_scored))
+        print(' parameters and relative errors difference = {:.6e}, {:.6e}'.format(err_param, err_errors))
+        assert multi_scored < num_scored
+        assert err_errors < 1e-2
+
+
+def combine_scan_options(dictionary, energy, sketch_quadrature):
+
+    # the scans do not compose, so their options are rejected together, 
+    # both by the constructor and by a later change of the attributes
+    combinations = [{'fft_scan': True, 'search_levels': 2}, 
+                    {'incremental_scan': 4, 'scan_dtype': torch.float32},
+                    {'sketch_quadrature': sketch_quadrature, 'fft_scan': True}]
+    for options in combinations:
+        try:
+            ndict2d.NeuronDictionary2D(dictionary.activation, False, torch.tensor([[-2., 2.]]), 
+                                       dictionary.params_mesh_size, device, **options)
+        except ValueError as error:
+            print(' {}'.format(error))
+        else:
+            raise AssertionError('The scan options {} are not rejected.'.format(sorted(options)))
+
+        defaults = {name: getattr(dictionary, name) for name in options}
+        for name, value in options.items():
+            setattr(dictionary, name, value)
+        try:
+            dictionary.find_optimal_element(energy)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('The scan options {} are not rejected.'.format(sorted(options)))
+        finally:
+            for name, value in defaults.items():
+                setattr(dictionary, name, value)
+
+
+def scan_incrementally(dictionary, energy, in_dim, num_neurons, interval):
+
+    def train():
+        # count the candidates scored by the evaluations without grad
+        evaluate = energy.evaluate
+        num_scored = [0]
+        def counted(param):
+            if not torch.is_grad_enabled() or not param[0].requires_grad:
+                num_scored[0] += param[0].shape[0]
+            return evaluate(param)
+        energy.evaluate = counted
+        try:
+            oga, errors, train_time = run_oga(dictionary, energy, num_neurons)
+        finally:
+            del energy.evaluate
+        return oga, errors, num_scored[0], train_time
+
+    # the run of exhaustive scans, and the run of incremental scans, whose
+    # skipped candidates are bounded, so both select the same elements
+    oga, errors, num_scored, full_time = train()
+    dictionary.incremental_scan = interval
+    dictionary.num_full_scans, dictionary.num_rescored = 0, 0
+    try:
+        inc_oga, inc_errors, inc_scored, inc_time = train()
+    finally:
+        dictionary.incremental_scan = 0
+
+    err_param = (oga.inner_param - inc_oga.inner_param).abs().max().item()
+    err_errors = ((inc_errors - errors).abs() / errors).max().item()
+    print('\n {:d}D OGA with the incremental scan, {:d} neurons, full scan interval = {:d}'.format(in_dim, num_neurons, interval))
+    print(' time with the exhaustive and incremental scans = {:.4f}s, {:.4f}s'.format(full_time, inc_time))
+    print(' full scans = {:d}, scored candidates = {:d}, {:d}'.format(dictionary.num_full_scans, num_scored, inc_scored))
+    print(' parameters difference = {:.6e}'.format(err_param))
+    print(' relative errors difference = {:.6e}'.format(err_errors))
+    assert dictionary.num_full_scans < num_neurons
+    assert inc_scored < num_scored
+    assert err_param < 1e-12
+    assert err_errors < 1e-10
+
+
+def solve_without_materializing(dictionary, energy, lazy_energy, in_dim, num_neurons):
+
+    # the run on the quadrature points, and the run on the lazy tensor-product
+    # quadrature of the same points, which is never materialized
+    oga, errors, full_time = run_oga(dictionary, energy, num_neurons)
+    materialize = quad.TensorProductQuadrature.materialize
+    def refused(self):
+        raise AssertionError('The tensor-product quadrature is materialized.')
+    quad.TensorProductQuadrature.materialize = refused
+    try:
+        lazy_oga, lazy_errors, lazy_time = run_oga(dictionary, lazy_energy, num_neurons)
+    finally:
+        quad.TensorProductQuadrature.materialize = materialize
+
+    err_param = (oga.inner_param - lazy_oga.inner_param).abs().max().item()
+    err_errors = ((errors - lazy_errors).abs() / errors).max().item()
+    print('\n {:d}D OGA on the tensor-product quadrature, {:d} neurons'.format(in_dim, num_neurons))
+    print(' time with the dense and factored weights = {:.4f}s, {:.4f}s'.format(full_time, lazy_time))
+    print(' parameters and relative errors difference = {:.6e}, {:.6e}'.format(err_param, err_errors))
+    assert lazy_energy.weights is None
+    assert err_param < 1e-10 and err_errors < 1e-10
+
+
+def compare_closed_form(dictionary, make_energy, quadrature, interval, num_neurons):
+
+    def get_cores(energy, parameters):
+        return [torch.mm(parameters, torch.cat([points, torch.ones(points.shape[0],1)], dim=1).t())
+                    for points in energy.get_core_points()]
+
+    # the closed-form integration, and the quadrature as before
+    energy = make_energy(quadrature, interval)
+    oga, errors, closed_time = run_oga(dictionary, energy, num_neurons)
+    _, quad_errors, quad_time = run_oga(dictionary, make_energy(quadrature, None), num_neurons)
+
+    # the quadrature with the kinks of all the elements as breakpoints is
+    # exact for the bilinear forms, as 4 points are enough for relu^3 
+    parameters = oga.inner_param.detach()
+    theta, param = dictionary._gather_vertical_param()
+    candidates = torch.cat([item.reshape(-1,1) for item in param], dim=1)[::37,:]
+    kinks = torch.cat([parameters, candidates], dim=0).numpy()
+    exact_quad = gq.GaussLegendreDomain(4, device)
+    exact = make_energy(exact_quad.interval_quadpts_kinks(interval, np.array([1/200]), kinks, 
+                                                          dictionary.activation.kinks()), None)
+    Gk = energy.get_stiffmat_and_rhs(parameters, *get_cores(energy, parameters))[0]
+    exact_Gk = exact.get_stiffmat_and_rhs(parameters, *get_cores(exact, parameters))[0]
+
+    # the scan of a(u,g), without the load f(g) of both quadratures
+    exact.update_solution(oga.snn.forward)
+    for item in (energy, exact):
+        item.source_data = torch.zeros_like(item.source_data)
+        item.load_cache = {}
+    loss = energy.evaluate(torch.split(candidates, 1, dim=1))
+    exact_loss = exact.evaluate(torch.split(candidates, 1, dim=1))
+
+    err_mat = ((Gk - exact_Gk).abs().max() / exact_Gk.abs().max()).item()
+    err_border = ((oga.stiffmat - exact_Gk).abs().max() / exact_Gk.abs().max()).item()
+    err_loss = ((loss - exact_loss).abs().max() / exact_loss.abs().max()).item()
+    err_errors = ((errors[-1] - quad_errors[-1]).abs() / quad_errors[-1]).max().item()
+    print('\n 1D OGA in closed form, {}, with {:d} neurons'.format(type(energy).__name__, num_neurons))
+    print(' time with the closed form and the quadrature = {:.4f}s, {:.4f}s'.format(closed_time, quad_time))
+    print(' relative stiffness matrix difference, full and bordered = {:.6e}, {:.6e}'.format(err_mat, err_border))
+    print(' relative scan difference = {:.6e}'.format(err_loss))
+    print(' relative errors difference with the quadrature = {:.6e}'.format(err_errors))
+    assert err_mat < 1e-12 and err_border < 1e-12
+    assert err_loss < 1e-12
+    assert err_errors < 1e-3
+
+
+if __name__ == '__main__':
+
+    # 1D test, relu^3 dictionary
+    pde = cos1d.DataCos_2nd_1d_NBC()
+    activation = af.ActivationFunction("relu", 3)
+    dictionary = ndict1d.NeuronDictionary1D(activation, False, torch.tensor([[-2., 2.]]), 1/200, device)
+    gl_quad = gq.GaussLegendreDomain(2, device)
+    quadrature = gl_quad.interval_quadpts(np.array([[-1.,1.]]), np.array([1/200]))
+    energy = loss1d.FNM_Elliptic_2nd_1d_NBC(activation, quadrature, pde, device)
+    compare_with_full_solve(dictionary, energy, 1, 4)
+    compare_with_full_solve(dictionary, energy, 1, 8)
+    compare_with_full_solve(dictionary, energy, 1, 32)
+    energy.update_solution(energy._zero)
+    profile_oga(dictionary, energy, 1, 8)
+    resume_from_checkpoint(dictionary, energy, 1, 16)
+    pickle_energy(dictionary, energy, 1, 16)
+    bank_activations(dictionary, energy, 1, 16)
+    scan_with_fft(dictionary, energy, 1, 16)
+    make_energy = lambda quadrature, interval: \
+        loss1d.FNM_Elliptic_2nd_1d_NBC(activation, quadrature, pde, device, interval=interval)
+    compare_closed_form(dictionary, make_energy, quadrature, np.array([[-1.,1.]]), 32)
+    make_energy = lambda quadrature, interval: \
+        fitting1d.FNM_L2fitting_1d(activation, quadrature, pde, device, interval=interval)
+    compare_closed_form(dictionary, make_energy, quadrature, np.array([[-1.,1.]]), 32)
+    boundary = torch.tensor([[-1.],[1.]])
+    make_energy = lambda quadrature, interval: \
+        poisson1d.FNM_Poisson_1d_DBC(activation, quadrature, boundary, 1e-3, cos1d.Data_poisson_1d_DBC(), 
+                                     device, interval=interval)
+    compare_closed_form(dictionary, make_energy, quadrature, np.array([[-1.,1.]]), 32)
+
+    # 2D test, relu^2 dictionary
+    pde = cos2d.DataCos_2nd_2d_NBC()
+    activation = af.ActivationFunction("relu", 2)
+    dictionary = ndict2d.NeuronDictionary2D(activation, False, torch.tensor([[-2., 2.]]), 1/10, device)
+    gl_quad = gq.GaussLegendreDomain(1, device)
+    quadrature = gl_quad.rectangle_quadpts(np.array([[-1.,1.],[-1.,1.]]), np.array([1/10, 1/10]))
+    energy = loss2d.FNM_Elliptic_2nd_2d_NBC(activation, quadrature, pde, device)
+    compare_with_full_solve(dictionary, energy, 2, 16)
+    scan_in_low_precision(dictionary, energy, 2, 32)
+    resume_from_checkpoint(dictionary, energy, 2, 8)
+    search_in_parallel(dictionary, energy, 2, 8, 2)
+    with tempfile.TemporaryDirectory() as directory:
+        bank_activations(dictionary, energy, 2, 16, directory)
+    scan_with_fft(dictionary, energy, 2, 16)
+    sketch_quadrature = gl_quad.rectangle_quadpts(np.array([[-1.,1.],[-1.,1.]]), np.array([1/5, 1/5]))
+    scan_with_sketch(dictionary, energy, 2, 16, sketch_quadrature)
+    resume_from_checkpoint(dictionary, energy, 2, 16, incremental_scan=8)
+    resume_from_checkpoint(dictionary, energy, 2, 8, bank=True, sketch_quadrature=sketch_quadrature)
+    fine_dictionary = ndict2d.NeuronDictionary2D(activation, False, torch.tensor([[-2., 2.]]), 1/40, device)
+    search_multilevel(fine_dictionary, energy, 2, 8, (1, 2, 3))
+    combine_scan_options(dictionary, energy, sketch_quadrature)
+    scan_incrementally(dictionary, energy, 2, 64, 16)
+    lazy_energy = loss2d.FNM_Elliptic_2nd_2d_NBC(activation, gl_quad.tensor_product_quadpts(
+                      np.array([[-1.,1.],[-1.,1.]]), np.array([1/10, 1/10])), pde, device)
+    solve_without_materializing(dictionary, energy, lazy_energy, 2, 16)
+
+    # sparse-support scans, relu^k and B-spline dictionaries
+    for ftype, degree in (("relu", 2), ("relu", 3), ("bspline", 2), ("bspline", 3)):
+        activation = af.ActivationFunction(ftype, degree)
+        dictionary = ndict1d.NeuronDictionary1D(activation, False, torch.tensor([[-2., 2.]]), 1/200, device)
+        quadrature = gq.GaussLegendreDomain(2, device).interval_quadpts(np.array([[-1.,1.]]), np.array([1/200]))
+        energies = [loss1d.FNM_Elliptic_2nd_1d_NBC(activation, quadrature, cos1d.DataCos_2nd_1d_NBC(), device)]
+        if degree >= 3:
+            energies.append(loss4th1d.FNM_Elliptic_4th_1d_NBC(activation, quadrature, poly1d.DataPoly_4th_1d_NBC(), device))
+        for energy in energies:
+            compare_sparse_scan(dictionary, energy, 1, 4)
+        dictionary = ndict2d.NeuronDictionary2D(activation, False, torch.tensor([[-2., 2.]]), 1/10, device)
+        quadrature = gl_quad.rectangle_quadpts(np.array([[-1.,1.],[-1.,1.]]), np.array([1/10, 1/10]))
+        energies = [loss2d.FNM_Elliptic_2nd_2d_NBC(activation, quadrature, cos2d.DataCos_2nd_2d_NBC(), device)]
+        if degree >= 3:
+            energies.append(loss4th2d.FNM_Elliptic_4th_2d_NBC(activation, quadrature, poly2d.DataPoly_4th_2d_NBC(), device))
+        for energy in energies:
+            compare_sparse_scan(dictionary, energy, 2, 4)
+
+    # 3D test, relu^2 dictionary
+    pde = cos3d.DataCos_2nd_3d_NBC()
+    activation = af.ActivationFunction("relu", 2)
+    dictionary = ndict3d.NeuronDictionary3D(activation, False, torch.tensor([[-2., 2.]]), 1/6, device)
+    quadrature = gl_quad.cuboid_quadpts(np.array([[-1.,1.],[-1.,1.],[-1.,1.]]), np.array([1/4, 1/4, 1/4]))
+    energy = loss3d.FNM_Elliptic_2nd_3d_NBC(activation, quadrature, pde, device)
+    search_multilevel(dictionary, energy, 3, 8, (1, 2, 3))
+    lazy_energy = loss3d.FNM_Elliptic_2nd_3d_NBC(activation, gl_quad.tensor_product_quadpts(
+                      np.array([[-1.,1.],[-1.,1.],[-1.,1.]]), np.array([1/4, 1/4, 1/4])), pde, device)
+    solve_without_materializing(dictionary, energy, lazy_energy, 3, 4)
+    train_candidates(dictionary, energy, 3, 2)
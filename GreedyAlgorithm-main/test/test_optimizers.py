@@ -7,6 +7,8 @@ import numpy as np
 from torch.nn.parameter import Parameter
 
 from greedy.optimization import *
+from greedy.optimization import line_search
+from greedy.optimization.generator import Generator
 
 dtype = torch.float64
 torch.set_default_dtype(dtype)
@@ -20,8 +22,103 @@ def quadratic_2(x):
     val = a[0].pow(4) + a[1].pow(2)
     return val
 
+# rows of independent problems sum((x - center)^4) in the box of domain:
+# a generic row, a row starting at its minimizer (converged at once), a
+# row in a corner with the gradient pointing outside, whose line search 
+# never succeeds, and a row whose minimizer is outside the box
+domain_rows = torch.tensor([[-1.,1.],[-1.,1.],[-1.,1.]])
+centers = torch.tensor([[0.21, 0.1, -0.7001],
+                        [0.1, 0.2, 0.3],
+                        [2., -2., 0.5],
+                        [0.3, 1.5, -0.2]])
+starts = torch.tensor([[0.5, -0.3, 0.2],
+                       [0.1, 0.2, 0.3],
+                       [1., -1., 0.5],
+                       [-0.4, 0.6, 0.9]])
+
+def rows_loss(x, center):
+    return (x - center).pow(4).sum(dim=1)
+
+def run_sequential(optimizer_type, row, epochs):
+    
+    # the sequential optimizer of the dictionaries, one scalar per parameter
+    params = [Parameter(starts[row, i].reshape(1,1).clone()) for i in range(starts.shape[1])]
+    optimizer = Generator(params, domain_rows).get_optimizer(optimizer_type)
+    def closure():
+        optimizer.zero_grad()
+        loss = rows_loss(torch.cat(params, dim=1), centers[row:row+1]).sum()
+        loss.backward()
+        return loss
+    for epoch in range(epochs):
+        optimizer.step(closure)
+    return torch.cat(params, dim=1).detach().reshape(-1)
+
+def run_batched(optimizer_type, rows, epochs):
+    
+    # the batched optimizer of the dictionaries, one row per problem
+    param = Parameter(starts[rows].clone())
+    optimizer = Generator([param], domain_rows).get_batched_optimizer(optimizer_type)
+    def closure():
+        optimizer.zero_grad()
+        loss = rows_loss(param, centers[rows])
+        loss.sum().backward()
+        return loss
+    for epoch in range(epochs):
+        optimizer.step(closure)
+    return param.detach()
+
+def compare_batched(optimizer_type, epochs=10):
+    
+    # all rows at once, and each row by itself, by the sequential optimizer
+    # for pgd and fista, and by a batch of the single row for lbfgs, whose
+    # box-projected arc-Armijo version has no sequential counterpart
+    rows = list(range(starts.shape[0]))
+    batched = run_batched(optimizer_type, rows, epochs)
+    for row in rows:
+        if optimizer_type == "lbfgs":
+            single = run_batched(optimizer_type, [row], epochs).reshape(-1)
+        else:
+            single = run_sequential(optimizer_type, row, epochs)
+        err = (batched[row] - single).abs().max().item()
+        print(' batched {}, row {:d}: {}, difference = {:.6e}'.format(optimizer_type, row, batched[row].tolist(), err))
+        assert err < 1e-12
+    assert torch.equal(batched[1], starts[1])
+    assert torch.equal(batched[2], starts[2])
+
+def compare_batched_armijo():
+    
+    # the steps of the batched line search, and the sequential one row by
+    # row, with descent directions of different scales, and the directions
+    # at a minimizer and of ascent, whose line searches fail
+    x = starts.clone()
+    def evaluate(x, center):
+        x = x.clone().requires_grad_()
+        loss = rows_loss(x, center)
+        grad, = torch.autograd.grad(loss.sum(), x)
+        return loss.detach(), grad
+    f, g = evaluate(x, centers)
+    d = torch.stack([-g[0], torch.tensor([0.5, -0.5, 0.1]), -0.01*g[2], g[3]])
+    def obj_func(x, t, d):
+        return evaluate(x + t.unsqueeze(1) * d, centers)
+    f_new, g_new, t, evals = line_search.batched_armijo(obj_func, x, d, f, g)
+    
+    for row in range(x.shape[0]):
+        def row_func(x, t, d):
+            f, g = evaluate((x + t * d).reshape(1,-1), centers[row:row+1])
+            return f.item(), g.reshape(-1)
+        row_f, row_g, row_t, row_evals = line_search.armijo(row_func, x[row], d[row], f[row].item(), g[row])
+        print(' batched armijo, row {:d}: t = {:.6e}, evaluations = {:d}'.format(row, t[row].item(), evals[row].item()))
+        assert t[row].item() == row_t and evals[row].item() == row_evals
+        assert abs(f_new[row].item() - row_f) < 1e-14 and (g_new[row] - row_g).abs().max() < 1e-14
+    assert evals[0].item() != evals[2].item()
+    assert evals[1].item() == 26 and evals[3].item() == 26
+
 if __name__ == '__main__':
 
+    for optimizer_type in ("pgd", "fista", "lbfgs"):
+        compare_batched(optimizer_type)
+    compare_batched_armijo()
+
     domain = torch.tensor([[0.22,3],[0.1,3],[0.7,3]])
     
     x1 = torch.tensor([[-2.2135]])
@@ -1,13 +1,18 @@
 import sys
 sys.path.append('../')
 
+import os
 import time
+import shutil
+import tempfile
 import torch
 import numpy as np
 
 from greedy.quadrature import monte_carlo_quadrature as mc
 from greedy.quadrature import gauss_legendre_quadrature as gl
 from greedy.quadrature import quasi_monte_carlo_quadrature as qmc
+from greedy.quadrature import quadrature_store as qs
+from greedy.model import activation_function as af
 
 # precision settings
 torch.set_printoptions(precision=6)
@@ -132,6 +137,127 @@ def show_error_QMC(sampling, nsamples, case):
     print('evaluation time = {:.6f}s'.format(end_1 - start_1))
     print('qudrature time = {:.6f}s'.format(end_2 - start_2))
     print('number of samples = {:d}'.format(data.quadpts.shape[0]))
+    
+    
+def show_error_QMC_chunks(sampling, nsamples, chunk_size, case, tol):
+    
+    integral = real_integral(case)
+    func = integral.get('func')
+    value = integral.get('value')
+    domain = integral.get('domain')
+    
+    # the chunks are generated and integrated one by one
+    start_0 = time.time()
+    value_num = 0
+    quadpts = []
+    for data in sampling(domain, nsamples, chunk_size):
+        value_num += torch.sum(func(data.quadpts) * data.weights) * data.area
+        quadpts.append(data.quadpts)
+    end_0 = time.time()
+    
+    # the chunks continue one sequence, the samples generated at once
+    data = next(sampling(domain, nsamples, nsamples))
+    value_all = torch.sum(func(data.quadpts) * data.weights) * data.area
+    err_pts = (torch.cat(quadpts, dim=0) - data.quadpts).abs().max().item()
+    
+    print('{:d}D chunked Q-M-C quadrature error = {:.6e}'.format(case, rerror(value_num, value)))
+    print('generation and quadrature time = {:.6f}s'.format(end_0 - start_0))
+    print('number of samples = {:d}, in {:d} chunks'.format(nsamples, len(quadpts)))
+    assert len(quadpts) == -(-nsamples // chunk_size)
+    assert err_pts == 0
+    assert rerror(value_num, value_all) < 1e-10
+    assert rerror(value_num, value) < tol
+    
+    
+def show_error_GL_lazy(sampling, h, case):
+    
+    integral = real_integral(case)
+    func = integral.get('func')
+    value = integral.get('value')
+    domain = integral.get('domain')
+    
+    start_0 = time.time()
+    data = sampling(domain, h)
+    end_0 = time.time()
+    
+    # tile by tile, and axis by axis for the separable integrand
+    value_num = data.integrate(func)
+    end_1 = time.time()
+    value_sep = data.integrate_separable([lambda x: torch.cos(3.5*pi*x)] * case)
+    end_2 = time.time()
+    
+    print('{:d}D lazy G-L quadrature error = {:.6e}'.format(case, rerror(value_num.item(), value)))
+    print('{:d}D lazy G-L separable quadrature error = {:.6e}'.format(case, rerror(value_sep.item(), value)))
+    
+    # the factored weights of the energies, by weigh and reduce, on the 
+    # values of all the points, so only for a moderate number of them
+    if data.get_number_of_points() <= 2**25:
+        values = torch.cat([func(quadpts) for quadpts, _ in data.tiles(2**20)], dim=0)
+        value_weigh = data.weigh(values).sum() * data.area
+        value_reduce = data.reduce(values.t()).sum()
+        print('{:d}D lazy G-L factored weights error (weigh, reduce) = {:.6e}, {:.6e}'.format(
+              case, rerror(value_weigh.item(), value), rerror(value_reduce.item(), value)))
+    print('generation time = {:.6f}s'.format(end_0 - start_0))
+    print('quadrature time = {:.6f}s'.format(end_1 - end_0))
+    print('separable quadrature time = {:.6f}s'.format(end_2 - end_1))
+    print('number of samples = {:d}'.format(data.get_number_of_points()))
+    
+    
+def show_time_store(sampling, h, case):
+    
+    integral = real_integral(case)
+    func = integral.get('func')
+    value = integral.get('value')
+    domain = integral.get('domain')
+    
+    # build once, then load the memory-mapped files, by the store option of the builder
+    directory = tempfile.mkdtemp()
+    store = qs.QuadratureStore(directory)
+    start_0 = time.time()
+    sampling(domain, h, store=store)
+    end_0 = time.time()
+    data = sampling(domain, h, store=store)
+    end_1 = time.time()
+    
+    value_num = torch.sum(func(data.quadpts) * data.weights) * data.area
+    reference = sampling(domain, h)
+    err_pts = (data.quadpts - reference.quadpts).abs().max().item()
+    err_weights = (data.weights * data.area - reference.weights * reference.area).abs().max().item()
+    num_files = len(os.listdir(directory))
+    shutil.rmtree(directory)
+    
+    print('{:d}D stored {} quadrature error = {:.6e}'.format(case, data.qtype, rerror(value_num, value)))
+    print('generation and saving time = {:.6f}s'.format(end_0 - start_0))
+    print('loading time = {:.6f}s'.format(end_1 - end_0))
+    print('number of samples = {:d}'.format(data.quadpts.shape[0]))
+    assert num_files == 3
+    assert err_pts == 0 and err_weights < 1e-15
+    
+    
+def show_error_GL_kinks(gl_quad, domain, h, parameters, activation):
+    
+    # the gram matrix of neurons, with reference by a finer kink-aware rule
+    def gram(data):
+        A = torch.from_numpy(parameters)
+        ones = torch.ones(data.quadpts.shape[0],1)
+        g = activation.activate(torch.mm(A, torch.cat([data.quadpts, ones], dim=1).t()))
+        return torch.mm(g * data.weights.t(), g.t()) * data.area
+    
+    dim = domain.shape[0]
+    sampling = {1: 'interval_quadpts', 2: 'rectangle_quadpts'}.get(dim)
+    fine_quad = gl.GaussLegendreDomain(len(gl_quad.quadpts)+1, device)
+    value = gram(getattr(fine_quad, sampling + '_kinks')(domain, h/2, parameters, activation.kinks()))
+    
+    start_0 = time.time()
+    data = getattr(gl_quad, sampling + '_kinks')(domain, h, parameters, activation.kinks())
+    end_0 = time.time()
+    value_num = gram(data)
+    value_uni = gram(getattr(gl_quad, sampling)(domain, h/10))
+    
+    print('{:d}D G-L quadrature error with kinks = {:.6e}'.format(dim, (value_num-value).abs().max()))
+    print('{:d}D G-L quadrature error on h/10 mesh = {:.6e}'.format(dim, (value_uni-value).abs().max()))
+    print('generation time = {:.6f}s'.format(end_0 - start_0))
+    print('number of samples = {:d}'.format(data.quadpts.shape[0]))
 
 
 
@@ -199,6 +325,50 @@ if __name__ == '__main__':
     # sampling = qmc_quad.n_rectangle_samples
     # show_error_QMC(sampling, nsamples, case)
     
+    # 1D G-L quadrature test with kinks of relu^2 neurons
+    relu = af.ActivationFunction("relu", 2)
+    gl_quad_2 = gl.GaussLegendreDomain(2, device)
+    b = 0.9 * np.sin(np.arange(1, 21)).reshape(-1,1)
+    parameters = np.concatenate((np.sign(b), b), axis=1)
+    show_error_GL_kinks(gl_quad_2, np.array([[-1.,1.]]), np.array([0.1]), parameters, relu)
+    
+    # 2D G-L quadrature test with kinks of relu^2 neurons
+    phi = np.linspace(0, 2*pi, 12, endpoint=False).reshape(-1,1)
+    parameters = np.concatenate((np.cos(phi), np.sin(phi), np.cos(3*phi)/2), axis=1)
+    show_error_GL_kinks(gl_quad_2, np.array([[-1.,1.],[-1.,1.]]), np.array([0.1, 0.1]), parameters, relu)
+    
+    # 3D lazy tensor-product G-L quadrature test
+    case = 3
+    N = 100
+    h = np.array([1/N, 1/N, 1/N])
+    sampling = gl_quad.tensor_product_quadpts
+    show_error_GL_lazy(sampling, h, case)
+    
+    # 3D G-L quadrature test, loaded from the on-disk store
+    case = 3
+    N = 40
+    h = np.array([1/N, 1/N, 1/N])
+    sampling = gl_quad.cuboid_quadpts
+    show_time_store(sampling, h, case)
+    
+    # 3D M-C quadrature test, seeded samples loaded from the on-disk store
+    case = 3
+    nsamples = int(1e+6)
+    sampling = lambda domain, nsamples, store=None: mc_quad.cuboid_samples(domain, nsamples, store, seed=0)
+    show_time_store(sampling, nsamples, case)
+    
+    # 3D chunked Q-M-C quadrature test, scrambled Sobol
+    case = 3
+    nsamples = 2**20
+    sampling = lambda domain, nsamples, chunk_size: qmc_quad.n_rectangle_chunks(domain, nsamples, chunk_size, seed=0)
+    show_error_QMC_chunks(sampling, nsamples, 2**17, case, 1e-3)
+    
+    # 3D chunked Q-M-C quadrature test, scrambled Halton
+    case = 3
+    nsamples = 2**20
+    sampling = lambda domain, nsamples, chunk_size: qmc_quad.n_rectangle_chunks(domain, nsamples, chunk_size, sequence="halton", seed=0)
+    show_error_QMC_chunks(sampling, nsamples, 2**17, case, 2e-2)
+    
     # 2D M-C quadrature test on circle
     
     # 3D M-C quadrature test on sphere
@@ -226,4 +396,10 @@ if __name__ == '__main__':
 # SUGGESTIONS:
 # use qmc in higher dimension;
 # generate qmc only once;
-# store qmc samples if possible;
\ No newline at end of file
+# store qmc samples if possible;
+
+
+## ============= TEST LOG (3D lazy quadrature, h = 1/100):
+# generation keeps 1d nodes only, instead of 6.4e7-by-3 points (1.5GB);
+# tiles of 2^20 points are integrated one by one;
+# separable integrands are integrated axis by axis instantly.
\ No newline at end of file
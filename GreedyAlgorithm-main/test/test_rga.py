@@ -0,0 +1,91 @@
+import sys
+sys.path.append('../')
+
+import time
+import torch
+import numpy as np
+
+from greedy.pde import cos1d, cos2d
+from greedy.model import shallownet
+from greedy.model import activation_function as af
+from greedy.model import neuron_dictionary_1d as ndict1d
+from greedy.model import neuron_dictionary_2d as ndict2d
+from greedy.lossfunction import fnm_elliptic_2nd_1d_nbc as loss1d
+from greedy.lossfunction import fnm_elliptic_2nd_2d_nbc as loss2d
+from greedy.quadrature import gauss_legendre_quadrature as gq
+from greedy.algorithm import relaxed_greedy as rg
+
+# precision settings
+data_type = torch.float64
+torch.set_default_dtype(data_type)
+
+# device settings
+use_gpu = torch.cuda.is_available()
+device = torch.device("cuda" if use_gpu else "cpu")
+
+
+def check_relaxed_steps(dictionary, energy, in_dim, num_neurons, **kwargs):
+
+    energy.update_solution(energy._zero)
+    snn = shallownet.ShallowNN(sigma=dictionary.activation.activate,
+                               in_dim=in_dim,
+                               width=num_neurons
+                               )
+    rga = rg.RelaxedGreedy(dictionary, energy, snn, device, **kwargs)
+    start = time.time()
+    errors, snn = rga.train()
+    end = time.time()
+
+    # the items updated in place, and those of the trained network
+    items = [item.clone() for item in energy.pre_items]
+    energy.update_solution(snn.forward)
+    err_items = max([(a - b).abs().max().item() for a, b in zip(items, energy.pre_items)])
+
+    # <J'(u_k),g_k> = 0 of the last element, if line searched
+    param = rga.inner_param[-1].reshape(1,-1)
+    residual = energy.evaluate(torch.split(param, 1, dim=1)).abs().item()
+
+    # the energy errors of u_k, k = n/4 and n-1, whose products with
+    # sqrt(k) decrease if the bound M is not below the variation norm
+    k = num_neurons // 4
+    rate = (errors[-1,1] * np.sqrt(num_neurons-1) / (errors[k,1] * np.sqrt(k))).item()
+
+    print('\n {:d}D RGA with {:d} neurons, {}, time = {:.4f}s'.format(in_dim, num_neurons, kwargs, end-start))
+    print(' energy errors at k = 0, {:d}, {:d}: {:.6e}, {:.6e}, {:.6e}'.format(k, num_neurons-1, 
+          errors[0,1].item(), errors[k,1].item(), errors[-1,1].item()))
+    print(' sqrt(k)*error at k = {:d} over that at k = {:d}: {:.6e}'.format(num_neurons-1, k, rate))
+    print(' items difference = {:.6e}'.format(err_items))
+    print(' residual of the last element = {:.6e}'.format(residual))
+    assert err_items < 1e-10
+    if kwargs.get('line_search', False):
+        assert errors[-1,1] < errors[0,1]
+        assert residual < 1e-20
+    else:
+        assert rate < 1.
+
+
+if __name__ == '__main__':
+
+    # 1D test, relu^3 dictionary
+    pde = cos1d.DataCos_2nd_1d_NBC()
+    activation = af.ActivationFunction("relu", 3)
+    dictionary = ndict1d.NeuronDictionary1D(activation, False, torch.tensor([[-2., 2.]]), 1/200, device)
+    gl_quad = gq.GaussLegendreDomain(2, device)
+    quadrature = gl_quad.interval_quadpts(np.array([[-1.,1.]]), np.array([1/200]))
+    energy = loss1d.FNM_Elliptic_2nd_1d_NBC(activation, quadrature, pde, device)
+    check_relaxed_steps(dictionary, energy, 1, 32, line_search=True)
+    # M = 32 is above the variation norm of cos(pi*x), about 22 by the l1-norm
+    # of the outer parameters of OGA with 64 neurons. The first step
+    # u_1 = -M*sign(<J'(0),g_1>)*g_1 overshoots, and the errors fall below
+    # that of zero after a few hundred steps.
+    check_relaxed_steps(dictionary, energy, 1, 256, bound=32., error_interval=64)
+    check_relaxed_steps(dictionary, energy, 1, 32, line_search=True, error_interval=8)
+
+    # 2D test, relu^2 dictionary
+    pde = cos2d.DataCos_2nd_2d_NBC()
+    activation = af.ActivationFunction("relu", 2)
+    dictionary = ndict2d.NeuronDictionary2D(activation, False, torch.tensor([[-2., 2.]]), 1/10, device)
+    gl_quad = gq.GaussLegendreDomain(1, device)
+    quadrature = gl_quad.rectangle_quadpts(np.array([[-1.,1.],[-1.,1.]]), np.array([1/10, 1/10]))
+    energy = loss2d.FNM_Elliptic_2nd_2d_NBC(activation, quadrature, pde, device)
+    check_relaxed_steps(dictionary, energy, 2, 16, line_search=True)